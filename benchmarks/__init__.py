@@ -0,0 +1,4 @@
+"""
+Benchmarks for ipv6ddns. Not part of the test suite, run the individual
+modules with `python -m benchmarks.<name>`.
+"""
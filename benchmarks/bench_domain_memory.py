@@ -0,0 +1,73 @@
+"""
+Memory benchmark for the domain entities. Builds a million zone records and
+firewall entries, each with its own address string as read from a provider,
+and reports the memory held per object by the slotted value types against
+the dict backed classes they replaced.
+
+    python -m benchmarks.bench_domain_memory [count]
+"""
+import gc
+import sys
+import tracemalloc
+from ipv6ddns.domain import FirewallEntry, Protocol, ZoneRecord
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class DictZoneRecord:
+    """Previous, dict backed, ZoneRecord"""
+
+    def __init__(self, name, ip_addr, ttl):
+        self.name = name
+        self.ip_addr = ip_addr
+        self.ttl = ttl
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class DictFirewallEntry:
+    """Previous, dict backed, FirewallEntry"""
+
+    def __init__(self, entry_id, ip_addr, port, protocol):
+        self.entry_id = entry_id
+        self.ip_addr = ip_addr
+        self.port = port
+        self.protocol = protocol
+
+
+def address(i):
+    """Distinct address string for the i-th object"""
+    return f"2001:db8::{i >> 16:x}:{i & 0xffff:x}"
+
+
+def measure(build, count):
+    """Build `count` objects and return the memory they hold, in bytes per
+    object. The names and ids are built beforehand so only the objects and
+    their addresses are counted.
+    """
+    names = [f"host{i}.example.com" for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    objects = [build(i, name) for i, name in enumerate(names)]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current / count
+
+
+def main(count=1_000_000):
+    """Run the benchmark and print the results"""
+    cases = (
+        ("ZoneRecord, dict", lambda i, name: DictZoneRecord(name, address(i), 60)),
+        ("ZoneRecord, slots", lambda i, name: ZoneRecord(name, address(i), 60)),
+        ("FirewallEntry, dict", lambda i, name: DictFirewallEntry(
+            name, address(i), i & 0xffff, Protocol.TCP)),
+        ("FirewallEntry, slots", lambda i, name: FirewallEntry(
+            name, address(i), i & 0xffff, Protocol.TCP)),
+    )
+    print(f"objects: {count}")
+    for name, build in cases:
+        per_object = measure(build, count)
+        print(f"{name:<22} {per_object:>7.1f} bytes/object {per_object * count / 2**20:>8.1f} MiB")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,64 @@
+"""
+Microbenchmark for the procfs IPV6 resolver. Writes an if_inet6 file with
+thousands of addresses and reports the time of a resolve when the file has
+changed (read, parse and select) and when it has not (read and hash only).
+
+    python -m benchmarks.bench_procfs_resolver [addresses]
+"""
+import os
+import sys
+import tempfile
+import timeit
+from ipv6ddns.context import CommonContext, ResolverContext
+from ipv6ddns.resolver import procfs
+
+
+def build_if_inet6(count):
+    """Build if_inet6 contents with `count` addresses spread over 16 interfaces.
+    Every fourth address is temporary and every eighth is link-local.
+
+    Args:
+        count (int): number of addresses
+
+    Returns:
+        bytes: file contents
+    """
+    lines = []
+    for i in range(count):
+        ifindex = i % 16 + 1
+        if i % 8 == 0:
+            address, scope = f"fe80{0:012x}{i:016x}", 0x20
+        else:
+            address, scope = f"20010db8{ifindex:08x}{i:016x}", 0x00
+        flags = 0x01 if i % 4 == 1 else 0x00
+        lines.append(f"{address} {ifindex:02x} 40 {scope:02x} {flags:02x} {f'eth{ifindex}':>8}")
+    return ("\n".join(lines) + "\n").encode()
+
+
+def main(count=5000, number=200):
+    """Run the benchmark and print the results"""
+    data = build_if_inet6(count)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "if_inet6")
+        with open(path, "wb") as file:
+            file.write(data)
+        procfs.ProcfsResolverPlugin.PROC_PATH = path
+
+        ctx = ResolverContext()
+        ctx.interface = "eth3"
+        plugin = procfs.ProcfsResolverPlugin(CommonContext(), ctx)
+
+        def cold():
+            plugin._digest = None  # pylint: disable=protected-access
+            return plugin.resolve()
+
+        print(f"addresses: {count}, file size: {len(data)} bytes, selected: {plugin.resolve()}")
+        for name, func in (("parse only", lambda: procfs.parse_if_inet6(data)),
+                           ("resolve, file changed", cold),
+                           ("resolve, cached", plugin.resolve)):
+            seconds = min(timeit.repeat(func, number=number, repeat=5)) / number
+            print(f"{name:<24} {seconds * 1e6:>10.1f} us")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
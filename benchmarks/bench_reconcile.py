@@ -0,0 +1,86 @@
+"""
+Benchmark for the DNS and firewall reconciliation. Reconciles synthetic
+record sets of increasing size and reports the time per record, which should
+stay flat as the number of records grows.
+
+    python -m benchmarks.bench_reconcile [max_records]
+"""
+import sys
+import time
+from ipv6ddns.ddns import DDNSWorkflow
+from ipv6ddns.domain import ZoneRecord, FirewallEntry, Protocol
+from ipv6ddns.reconcile import fw_entry_id
+
+
+OLD_IP = "2001:db8::1"
+NEW_IP = "2001:db8::2"
+
+
+def build_dns(count):
+    """Build current and desired DNS records. A tenth of the records are
+    stale, the next tenth change ip and a tenth are new.
+
+    Args:
+        count (int): number of records
+
+    Returns:
+        tuple[list[ZoneRecord], list[ZoneRecord]]: current and desired records
+    """
+    tenth = max(count // 10, 1)
+    current = [
+        ZoneRecord(f"host{i}.example.com", OLD_IP if tenth <= i < 2 * tenth else NEW_IP, 60)
+        for i in range(count)
+    ]
+    desired = [
+        ZoneRecord(f"host{i}.example.com", NEW_IP, 60)
+        for i in range(tenth, count + tenth)
+    ]
+    return current, desired
+
+
+def build_fw(count):
+    """Build current and desired firewall entries, changing the same share of
+    entries as `build_dns`.
+
+    Args:
+        count (int): number of entries
+
+    Returns:
+        tuple[list[FirewallEntry], list[FirewallEntry]]: current and desired entries
+    """
+    tenth = max(count // 10, 1)
+    current = [
+        FirewallEntry(fw_entry_id("bench", Protocol.TCP, i),
+                      OLD_IP if tenth <= i < 2 * tenth else NEW_IP, i, Protocol.TCP)
+        for i in range(count)
+    ]
+    desired = [
+        FirewallEntry(fw_entry_id("bench", Protocol.TCP, i), NEW_IP, i, Protocol.TCP)
+        for i in range(tenth, count + tenth)
+    ]
+    return current, desired
+
+
+def measure(func, current, desired):
+    """Return the wall time in seconds of a single diff call"""
+    start = time.perf_counter()
+    func(current, desired)
+    return time.perf_counter() - start
+
+
+def main(max_records=1_000_000):
+    """Run the benchmark for 10 records up to `max_records` and print the
+    results.
+    """
+    print(f"{'records':>10} {'dns (s)':>10} {'ns/rec':>8} {'fw (s)':>10} {'ns/rec':>8}")
+    count = 10
+    while count <= max_records:
+        dns_time = measure(DDNSWorkflow.get_dns_diff, *build_dns(count))
+        fw_time = measure(DDNSWorkflow.get_fw_diff, *build_fw(count))
+        print(f"{count:>10} {dns_time:>10.4f} {dns_time * 1e9 / count:>8.0f}"
+              f" {fw_time:>10.4f} {fw_time * 1e9 / count:>8.0f}")
+        count *= 10
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
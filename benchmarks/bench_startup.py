@@ -0,0 +1,92 @@
+"""
+Benchmark of the cold start of the command line. Spawns a new interpreter
+for each run of `--help` and of a run that finds nothing changed, reports
+the median wall time, and the slowest imports of the last run as reported
+by `python -X importtime`.
+
+    python -m benchmarks.bench_startup [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# runs resolve a fixed address, like a real resolver would, so the address is
+# parsed and recorded in the state file as in production
+ENTRY = "import sys; from ipv6ddns.main import main;"\
+    " from ipv6ddns.plugin import IPResolverPlugin;"\
+    " IPResolverPlugin.resolve = lambda self: '2001:db8::1'; main(sys.argv[1:])"
+
+
+def run_cli(args, env):
+    """Run the command line in a new interpreter
+
+    Args:
+        args (list[str]): command line arguments
+        env (dict): environment of the process
+
+    Raises:
+        RuntimeError: if the command line fails, so a failing run is never timed
+
+    Returns:
+        tuple[float, str]: wall time in seconds and the import time report
+    """
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", ENTRY, *args],
+                          env=env, capture_output=True, text=True, check=False)
+    seconds = time.perf_counter() - start
+    if proc.returncode != 0:
+        output = "\n".join(line for line in proc.stderr.splitlines()
+                           if not line.startswith("import time:"))
+        raise RuntimeError(f"ipv6ddns {' '.join(args)} exited with {proc.returncode}:\n{output}")
+    return seconds, proc.stderr
+
+
+def slowest_imports(report, count=10):
+    """Parse an import time report and return the slowest top level imports
+
+    Args:
+        report (str): stderr of `python -X importtime`
+        count (int, optional): number of imports to return. Defaults to 10.
+
+    Returns:
+        list[tuple[int, str]]: cumulative microseconds and module name
+    """
+    imports = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+
+def main(runs=15):
+    """Run the benchmark and print the results"""
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=tmp)
+        state_file = os.path.join(tmp, "state.json")
+        scenarios = (
+            ("--help", ["--help"]),
+            ("run, unchanged", ["--assume-yes", "--state-file", state_file]),
+        )
+        for _, args in scenarios:
+            # warm the plugin index and the state file
+            run_cli(args, env)
+        for name, args in scenarios:
+            times = []
+            for _ in range(runs):
+                seconds, report = run_cli(args, env)
+                times.append(seconds)
+            print(f"{name:<16} median {statistics.median(times) * 1e3:>7.1f} ms, "
+                  f"min {min(times) * 1e3:>7.1f} ms")
+            for cumulative, module in slowest_imports(report):
+                print(f"    {cumulative / 1e3:>7.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 15)
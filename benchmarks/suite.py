@@ -0,0 +1,387 @@
+"""
+Benchmark suite of the hot paths of ipv6ddns, on synthetic data of growing
+size: the record and entry diffs and the plan of DDNSWorkflow, the context
+parsers, the plugin discovery and the cold start of the command line.
+
+The results can be saved as a JSON baseline, and a later run compared to it.
+The comparison flags the cases slower than the baseline by more than the
+threshold, and exits with 1 when there is any.
+
+    python -m benchmarks.suite [--quick] [--save baseline.json]
+    python -m benchmarks.suite --compare baseline.json [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import timeit
+from ipv6ddns.context import ArgparseContextParser, FileContextParser
+from ipv6ddns.ddns import DDNSWorkflow
+from ipv6ddns.domain import ZoneRecord
+from ipv6ddns.events import TimingListener, add_listener, remove_listener
+from ipv6ddns.metrics import MetricsListener
+from ipv6ddns.plugin import IndexedPluginLookup, PluginManager, PluginType
+from ipv6ddns.plugin_index import PluginIndex
+from benchmarks.bench_reconcile import NEW_IP, OLD_IP, build_dns, build_fw
+from benchmarks.bench_startup import run_cli
+
+
+BASELINE_VERSION = 1
+
+# options of a plugin, as added by a plugin to the command line
+PLUGIN_OPTIONS = 20
+
+
+def sizes(start, stop):
+    """Powers of ten from `start` up to `stop`"""
+    size = start
+    while size <= stop:
+        yield size
+        size *= 10
+
+
+def create_namespace(**options):
+    """Command line of a run with the noop plugins, and PLUGIN_OPTIONS options
+    for each plugin
+    """
+    namespace = argparse.Namespace(
+        assume_yes=True, dry_run=False, force=False, dns="noop", domain=[],
+        firewall="noop", tcp_port=[443], udp_port=[], host_id="bench", resolver="noop",
+    )
+    for prefix in ("dns", "fw", "ipv6"):
+        for i in range(PLUGIN_OPTIONS):
+            setattr(namespace, f"{prefix}_option{i}", i)
+    for name, value in options.items():
+        setattr(namespace, name, value)
+    return namespace
+
+
+def workflow_cases(max_records):
+    """Runs of DDNSWorkflow without and with a timing listener and metrics,
+    its diffs, and its plan of a host with many domains
+    """
+    manager = PluginManager()
+    manager.discover()
+    ctx = ArgparseContextParser(manager, create_namespace(domain=["host.example.com"])).parse()[0]
+    ctx.common.sequential = True
+    workflow = DDNSWorkflow(ctx)
+    workflow.ipv6.resolve = lambda: NEW_IP
+    yield "workflow.run", 1, workflow.run
+    for name, listener in (("run_timed", TimingListener()), ("run_metrics", MetricsListener())):
+        add_listener(listener)
+        try:
+            yield f"workflow.{name}", 1, workflow.run
+        finally:
+            remove_listener(listener)
+
+    for count in sizes(10, max_records):
+        current, desired = build_dns(count)
+        yield f"workflow.dns_diff[{count}]", count, \
+            lambda: DDNSWorkflow.get_dns_diff(current, desired)
+        del current, desired
+
+        current, desired = build_fw(count)
+        yield f"workflow.fw_diff[{count}]", count, \
+            lambda: DDNSWorkflow.get_fw_diff(current, desired)
+        del current, desired
+
+        domains = [f"host{i}.example.com" for i in range(count)]
+        ctx = ArgparseContextParser(manager, create_namespace(domain=domains)).parse()[0]
+        workflow = DDNSWorkflow(ctx)
+        curr_dns = [ZoneRecord(domain, OLD_IP, 60) for domain in domains]
+        yield f"workflow.plan[{count}]", count, lambda: workflow.plan(NEW_IP, curr_dns, [])
+        del curr_dns, workflow
+
+
+def context_cases(max_contexts):
+    """Parse of the contexts of many hosts, from the command line and from a
+    host inventory
+    """
+    manager = PluginManager()
+    manager.discover()
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in sizes(1, max_contexts):
+            parser = ArgparseContextParser(manager, create_namespace())
+            yield f"context.argparse[{count}]", count, \
+                lambda: [parser.parse() for _ in range(count)]
+
+            path = os.path.join(tmp, f"hosts{count}.json")
+            options = {f"option{i}": i for i in range(PLUGIN_OPTIONS)}
+            with open(path, "w", encoding="utf-8") as file:
+                json.dump({
+                    "defaults": {"dns_options": options, "fw_options": options},
+                    "hosts": [
+                        {"host_id": f"host{i}", "domains": [f"host{i}.example.com"],
+                         "tcp_ports": [443], "dns_options": {"option0": i}}
+                        for i in range(count)
+                    ],
+                }, file)
+            yield f"context.file[{count}]", count, \
+                lambda: FileContextParser(manager, path).parse()
+
+
+def metrics_cases(max_contexts):
+    """Render of the metrics of many contexts"""
+    manager = PluginManager()
+    manager.discover()
+    ctx = ArgparseContextParser(manager, create_namespace()).parse()[0]
+    ctx.common.sequential = True
+    workflow = DDNSWorkflow(ctx)
+    workflow.ipv6.resolve = lambda: NEW_IP
+    listener = MetricsListener()
+    add_listener(listener)
+    try:
+        for count in sizes(1, max_contexts):
+            for i in range(count // 10 or 1, count + 1):
+                ctx.ctx_id = f"host{i}"
+                workflow.run()
+            yield f"metrics.render[{count}]", count, listener.registry.render
+    finally:
+        remove_listener(listener)
+
+
+def write_plugins(path, count):
+    """Write a distribution with `count` firewall plugins to an import path
+
+    Args:
+        path (str): directory of the import path
+        count (int): number of plugins
+
+    Returns:
+        str: name of the module of the plugins
+    """
+    module = f"ipv6ddns_bench_plugins{count}"
+    with open(os.path.join(path, f"{module}.py"), "w", encoding="utf-8") as file:
+        file.write(
+            "from ipv6ddns.plugin import FirewallPlugin\n"
+            "def _create(i):\n"
+            "    return type(f'Plugin{i}', (FirewallPlugin,),\n"
+            "                {'get_name': staticmethod(lambda: f'bench{i}')})\n"
+            f"for _i in range({count}):\n"
+            "    globals()[f'Plugin{_i}'] = _create(_i)\n"
+        )
+    dist_info = os.path.join(path, f"{module}-0.0.1.dist-info")
+    os.makedirs(dist_info)
+    with open(os.path.join(dist_info, "METADATA"), "w", encoding="utf-8") as file:
+        file.write(f"Metadata-Version: 2.1\nName: {module}\nVersion: 0.0.1\n")
+    with open(os.path.join(dist_info, "entry_points.txt"), "w", encoding="utf-8") as file:
+        file.write(f"[{PluginType.FIREWALL.value}]\n")
+        file.writelines(f"bench{i} = {module}:Plugin{i}\n" for i in range(count))
+    return module
+
+
+def discover(index_path, load=False):
+    """Discover the plugins with the index at `index_path`, and load them all"""
+    manager = PluginManager(IndexedPluginLookup(PluginIndex(index_path)))
+    manager.discover()
+    if load:
+        manager.firewall_plugins.load_all()
+    return manager
+
+
+def discovery_cases(max_plugins):
+    """Discovery of many installed plugins, without and with the plugin index,
+    and the load of all of them
+    """
+    for count in sizes(10, max_plugins):
+        with tempfile.TemporaryDirectory() as tmp:
+            module = write_plugins(tmp, count)
+            sys.path.insert(0, tmp)
+            index_path = os.path.join(tmp, "plugins.json")
+
+            def scan(index_path=index_path):
+                if os.path.exists(index_path):
+                    os.remove(index_path)
+                return discover(index_path)
+
+            def load(module=module, index_path=index_path):
+                sys.modules.pop(module, None)
+                return discover(index_path, load=True)
+
+            try:
+                yield f"plugin.discover_scan[{count}]", count, scan
+                discover(index_path)
+                yield f"plugin.discover_index[{count}]", count, lambda: discover(index_path)
+                yield f"plugin.load_all[{count}]", count, load
+            finally:
+                sys.path.remove(tmp)
+                sys.modules.pop(module, None)
+
+
+def startup_cases():
+    """Cold start of the command line, in a new interpreter. The runs resolve a
+    fixed address, and a run exiting with an error stops the suite instead of
+    being timed.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, XDG_CACHE_HOME=tmp)
+        state_file = os.path.join(tmp, "state.json")
+        for name, args in (("help", ["--help"]),
+                           ("unchanged", ["--assume-yes", "--state-file", state_file])):
+            # warm the plugin index and the state file
+            run_cli(args, env)
+            yield f"startup.{name}", 1, lambda args=args: run_cli(args, env)
+
+
+def iter_cases(max_records, max_contexts, max_plugins):
+    """Yield the name, number of units and function of each case. The data of
+    a case is built when the case is reached, and released after it ran.
+    """
+    yield from workflow_cases(max_records)
+    yield from context_cases(max_contexts)
+    yield from metrics_cases(max_contexts)
+    yield from discovery_cases(max_plugins)
+    yield from startup_cases()
+
+
+def measure(func, repeat, min_time=0.2):
+    """Time a function. It is called enough times per sample to last at least
+    `min_time`, and the best of `repeat` samples is kept.
+
+    Args:
+        func (Callable[[], Any]): function to time
+        repeat (int): number of samples
+        min_time (float, optional): seconds of a sample. Defaults to 0.2.
+
+    Returns:
+        float: seconds per call
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        seconds = timer.timeit(number)
+        if seconds >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(seconds, 1e-9)))
+    return min([seconds] + timer.repeat(repeat - 1, number)) / number
+
+
+def run_suite(cases, repeat=5, name_filter=None, min_time=0.2):
+    """Run the cases and print their results
+
+    Args:
+        cases (Iterable[tuple[str, int, Callable[[], Any]]]): cases to run
+        repeat (int, optional): samples of each case. Defaults to 5.
+        name_filter (str, optional): only run the cases with this text in their
+                                     name. Defaults to None.
+        min_time (float, optional): seconds of a sample. Defaults to 0.2.
+
+    Returns:
+        dict[str, dict]: case => seconds per call and number of units
+    """
+    results = {}
+    print(f"{'case':<36} {'time (s)':>12} {'ns/unit':>12}")
+    for name, units, func in cases:
+        if name_filter and name_filter not in name:
+            continue
+        seconds = measure(func, repeat, min_time)
+        results[name] = {"seconds": seconds, "units": units}
+        print(f"{name:<36} {seconds:>12.6f} {seconds * 1e9 / units:>12.0f}", flush=True)
+    return results
+
+
+def save_baseline(path, results):
+    """Write the results as a JSON baseline
+
+    Args:
+        path (str): path of the baseline
+        results (dict[str, dict]): case => seconds per call and number of units
+    """
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump({
+            "version": BASELINE_VERSION,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path):
+    """Read the results of a JSON baseline
+
+    Args:
+        path (str): path of the baseline
+
+    Raises:
+        ValueError: when the file is not a baseline of this suite
+
+    Returns:
+        dict[str, dict]: case => seconds per call and number of units
+    """
+    with open(path, encoding="utf-8") as file:
+        baseline = json.load(file)
+    if not isinstance(baseline, dict) or baseline.get("version") != BASELINE_VERSION:
+        raise ValueError(f"{path}: not a benchmark baseline")
+    return baseline["results"]
+
+
+def compare(baseline, results, threshold):
+    """Compare results to a baseline
+
+    Args:
+        baseline (dict[str, dict]): results of the baseline
+        results (dict[str, dict]): new results
+        threshold (float): accepted slow down, 0.2 for 20%
+
+    Returns:
+        list[tuple[str, float, bool]]: name, ratio of the new to the baseline time
+            and whether it is a regression, for the cases of both
+    """
+    rows = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        rows.append((name, ratio, ratio > 1 + threshold))
+    return rows
+
+
+def main(argv=None):
+    """Run the suite, save or compare its results
+
+    Returns:
+        int: 1 when a case regressed, 0 otherwise
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.suite",
+                                     description="Benchmark suite of ipv6ddns")
+    parser.add_argument("--quick", action="store_true",
+                        help="Small sizes only, for a run of a few seconds.")
+    parser.add_argument("--max-records", type=int, default=1_000_000)
+    parser.add_argument("--max-contexts", type=int, default=10_000)
+    parser.add_argument("--max-plugins", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--filter", help="Only run the cases with this text in their name.")
+    parser.add_argument("--save", metavar="PATH", help="Write the results as a baseline.")
+    parser.add_argument("--compare", metavar="PATH", help="Compare the results to a baseline.")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Slow down flagged as a regression. Defaults to 0.25 (25%%).")
+    args = parser.parse_args(argv)
+    args.min_time = 0.2
+
+    if args.quick:
+        args.max_records = min(args.max_records, 1000)
+        args.max_contexts = min(args.max_contexts, 100)
+        args.max_plugins = min(args.max_plugins, 100)
+        args.repeat = min(args.repeat, 3)
+        args.min_time = 0.05
+    baseline = load_baseline(args.compare) if args.compare else None
+
+    results = run_suite(iter_cases(args.max_records, args.max_contexts, args.max_plugins),
+                        args.repeat, args.filter, args.min_time)
+    if args.save:
+        save_baseline(args.save, results)
+
+    regressions = 0
+    if baseline is not None:
+        print(f"\n{'case':<36} {'vs baseline':>12}")
+        for name, ratio, regressed in compare(baseline, results, args.threshold):
+            regressions += regressed
+            print(f"{name:<36} {ratio:>11.2f}x{'  REGRESSION' if regressed else ''}")
+        print(f"{regressions} regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,243 @@
+"""
+asyncio based workflow engine. Runs the DDNS workflow for many contexts on a
+single event loop. Async plugins are awaited directly and blocking plugins
+are adapted by running their methods in a thread pool executor.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from ipv6ddns.ddns import DDNSWorkflow
+from ipv6ddns.events import count_records, start_run
+from ipv6ddns.ratelimit import get_plugin_bucket, limited_async
+from ipv6ddns.runner import ContextRun, LogCollector, current_run, EXIT_DEADLINE, EXIT_FAILED
+
+
+class AsyncPluginAdapter:
+    """Async view of a plugin. Coroutine methods are awaited as they are.
+    Blocking methods of thread-safe plugins run in the executor so they do not
+    block the event loop, and blocking methods of plugins which are not
+    thread-safe are called on the event loop thread.
+    """
+
+    def __init__(self, plugin, executor=None) -> None:
+        """Constructor
+
+        Args:
+            plugin (Plugin): the plugin instance
+            executor (concurrent.futures.Executor, optional): executor for blocking
+                methods. Defaults to None, the default executor of the loop.
+        """
+        self.plugin = plugin
+        self.executor = executor
+
+    async def call(self, name: str, *args):
+        """Call a plugin method
+
+        Args:
+            name (str): name of the method
+
+        Returns:
+            Any: value returned by the method
+        """
+        method = getattr(self.plugin, name)
+        if inspect.iscoroutinefunction(method):
+            return await method(*args)
+        if not self.plugin.is_thread_safe():
+            return method(*args)
+        loop = asyncio.get_running_loop()
+        # keep the context, so logs of the call are attributed to the right run
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, functools.partial(ctx.run, method, *args))
+
+
+class AsyncDDNSWorkflow(DDNSWorkflow):
+    """DDNS workflow whose plugin calls are awaited on the event loop"""
+
+    def __init__(self, context, executor=None) -> None:
+        super().__init__(context)
+        self.executor = executor
+        self.dns_async = AsyncPluginAdapter(self.dns, executor)
+        self.firewall_async = AsyncPluginAdapter(self.firewall, executor)
+        self.ipv6_async = AsyncPluginAdapter(self.ipv6, executor)
+
+    async def run_async(self):
+        """Run the workflow. The timings of the run are recorded when timing
+        listeners are registered.
+
+        Returns:
+            int: return code of the run
+        """
+        self.timings = start_run(self.ctx.ctx_id)
+        if self.timings is None:
+            return await self._run_async()
+        with self.timings:
+            self.timings.result = await self._run_async()
+        return self.timings.result
+
+    async def _run_async(self):
+        curr_ip = None
+        if self.state is not None and not self.ctx.common.force:
+            curr_ip = self.canonical_ip(await self._call(
+                "ipv6", "resolve", self.ipv6_async, timeout=self.ctx.common.timeout))
+            if self.is_unchanged(curr_ip):
+                return 0
+
+        plan = self.plan(*await self.fetch_async(curr_ip))
+
+        if self.ctx.common.assume_yes:
+            response = self.confirm(plan)
+        else:
+            loop = asyncio.get_running_loop()
+            response = await loop.run_in_executor(self.executor, self.confirm, plan)
+        if response is not None:
+            if response == 0:
+                self.save_state(plan.curr_ip)
+            return response
+
+        await self.update_async(*self.get_writes(plan))
+        self.save_state(plan.curr_ip)
+        return 0
+
+    async def fetch_async(self, curr_ip=None):
+        """Resolve the current ip address and fetch the current DNS records and
+        firewall entries, concurrently unless the context asks for sequential
+        execution. Each call is limited to the timeout of the context.
+
+        Args:
+            curr_ip (str, optional): ip address, when already resolved. Defaults to None.
+
+        Returns:
+            tuple[str, list[ZoneRecord], list[FirewallEntry]]: ip, DNS records and
+                                                               firewall entries
+        """
+        calls = [
+            ("dns", "get_aaaa_records", self.dns_async),
+            ("fw", "get_entries", self.firewall_async),
+        ]
+        if curr_ip is None:
+            calls.insert(0, ("ipv6", "resolve", self.ipv6_async))
+        timeout = self.ctx.common.timeout
+        with self.phase("fetch") as phase:
+            if self.ctx.common.sequential:
+                results = [await self._call(*call, timeout=timeout) for call in calls]
+            else:
+                results = await asyncio.gather(*(self._call(*call, timeout=timeout)
+                                                 for call in calls))
+            phase.count = len(results[-2]) + len(results[-1])
+        if curr_ip is None:
+            return (self.canonical_ip(results[0]), *results[1:])
+        return (curr_ip, *results)
+
+    async def update_async(self, dns_records, fw_entries, fw_deletes=()):
+        """Update the DNS and firewall entries, and delete the stale firewall
+        entries
+        """
+        with self.phase("update") as phase:
+            await self._call("dns", "upsert_records", self.dns_async, dns_records)
+            await self._call("fw", "apply_entries", self.firewall_async,
+                             fw_entries, list(fw_deletes))
+            phase.count = len(dns_records) + len(fw_entries) + len(fw_deletes)
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    async def _call(self, prefix, name, adapter, *args, timeout=None):
+        """Call a plugin method through its adapter, within the timeout, and
+        record the call in the timings of the run. The timeout covers the
+        retries of the call and the waits for its rate limit.
+        """
+        func = adapter.call
+        bucket = get_plugin_bucket(adapter.plugin)
+        if bucket is not None:
+            func = limited_async(bucket, f"{prefix}.{name}", adapter.call)
+        call = self.resilience.call_async(adapter.plugin, f"{prefix}.{name}", func, name, *args)
+        if self.timings is None:
+            return await self._wait(name, call, timeout)
+        with self.timings.measure(f"{prefix}.{name}", adapter.plugin.get_name()) as phase:
+            result = await self._wait(name, call, timeout)
+            phase.count = count_records(args if result is None else result)
+        return result
+
+    @staticmethod
+    async def _wait(name, call, timeout):
+        try:
+            return await asyncio.wait_for(call, timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"{name} did not complete within {timeout}s") from None
+
+
+class AsyncContextRunner:
+    """Runs the DDNS workflow for each context on one event loop, with up to
+    `jobs` contexts in flight at the same time. Like ContextRunner, the log
+    output of each context is written in the order of the contexts.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def __init__(self, jobs: int = 1, deadline: float = None, threads: int = 32,
+                 workflow=AsyncDDNSWorkflow) -> None:
+        """Constructor
+
+        Args:
+            jobs (int, optional): number of contexts in flight. Defaults to 1.
+            deadline (float, optional): seconds each context is given to complete.
+                                        Defaults to None, no limit.
+            threads (int, optional): size of the executor for blocking plugins.
+                                     Defaults to 32.
+            workflow (type, optional): workflow class. Defaults to AsyncDDNSWorkflow.
+        """
+        self.jobs = jobs
+        self.deadline = deadline
+        self.threads = threads
+        self.workflow = workflow
+
+    def run(self, contexts):
+        """Run the workflow for the contexts.
+
+        Args:
+            contexts (list[DDNSContext]): execution contexts
+
+        Returns:
+            list[int]: return code of each context, in the order of the contexts
+        """
+        return asyncio.run(self.run_async(contexts))
+
+    async def run_async(self, contexts):
+        """Coroutine version of `run()`"""
+        semaphore = asyncio.Semaphore(max(self.jobs, 1))
+        executor = ThreadPoolExecutor(max_workers=max(min(self.jobs, self.threads), 1))
+        collector = LogCollector(logging.getLogger().handlers[:])
+        collector.install()
+        try:
+            runs = [ContextRun(ctx) for ctx in contexts]
+            tasks = [asyncio.ensure_future(self._run(run, semaphore, executor)) for run in runs]
+            results = []
+            for run, task in zip(runs, tasks):
+                results.append(await task)
+                collector.flush_run(run)
+            return results
+        finally:
+            collector.uninstall()
+            executor.shutdown(wait=False)
+
+    async def _run(self, run, semaphore, executor):
+        async with semaphore:
+            current_run.set(run)
+            workflow = None
+            try:
+                workflow = self.workflow(run.ctx, executor)
+                task = asyncio.ensure_future(workflow.run_async())
+                done, _ = await asyncio.wait({task}, timeout=self.deadline)
+                if not done:
+                    task.cancel()
+                    logging.error("Run of %s did not complete within %ss",
+                                  run.ctx.ctx_id, self.deadline)
+                    return EXIT_DEADLINE
+                return task.result()
+            # pylint: disable=locally-disabled, broad-exception-caught
+            except Exception as err:
+                logging.error("Run of %s failed", run.ctx.ctx_id, exc_info=err)
+                return EXIT_FAILED
+            finally:
+                if workflow is not None:
+                    workflow.close()
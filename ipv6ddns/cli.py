@@ -1,18 +1,24 @@
 """Command line interface for ipv6ddns
 """
 import argparse
+import functools
 import logging
 import sys
-from ipv6ddns.context import ArgparseContextParser
+from ipv6ddns.context import ArgparseContextParser, ConfigError, FileContextParser
 from ipv6ddns.ddns import DDNSWorkflow
 from ipv6ddns.domain import ValidationError
+from ipv6ddns.events import LogTimingListener, add_listener, remove_listener
 from ipv6ddns.plugin import PluginManager, PluginType
+from ipv6ddns.runner import ContextRunner
 
 
 class Cli:
     """Command line interface entry for ipv6ddns
     """
 
+    COMMAND_RUN = "run"
+    COMMAND_WATCH = "watch"
+
     def __init__(self, cli_args=None) -> None:
         self.cli_args = cli_args
         self.args = {}
@@ -25,7 +31,12 @@ class Cli:
         Args:
             arg_list (list, optional): List of command line arguments. Defaults to None.
         """
-        contexts = self.get_contexts()
+        try:
+            contexts = self.get_contexts()
+        except ConfigError as err:
+            logging.error("%s", err)
+            sys.exit(3)
+
         has_errors = False
         for ctx in contexts:
             errors = self.validate_ctx(ctx)
@@ -36,21 +47,108 @@ class Cli:
         if has_errors:
             sys.exit(3)
 
+        listeners = [LogTimingListener()] if self.args.timings else []
+        metrics = self.get_metrics_listener()
+        if metrics is not None:
+            listeners.append(metrics)
+        for listener in listeners:
+            add_listener(listener)
+        server = None
+        try:
+            if self.args.metrics_port is not None:
+                # pylint: disable=locally-disabled, import-outside-toplevel
+                from ipv6ddns.metrics import start_server
+                server = start_server(metrics.registry, self.args.metrics_port,
+                                      self.args.metrics_address)
+            if self.args.command == Cli.COMMAND_WATCH:
+                sys.exit(self.watch(contexts))
+            sys.exit(self.run(contexts))
+        except ValidationError as err:
+            logging.error("%s", err)
+            sys.exit(3)
+        finally:
+            if server is not None:
+                server.shutdown()
+                server.server_close()
+            for listener in listeners:
+                remove_listener(listener)
+
+    def get_metrics_listener(self):
+        """Return the listener feeding the Prometheus metrics, when they are
+        served or written to a file
+
+        Returns:
+            MetricsListener | None: the listener, None when metrics are not asked for
+        """
+        if self.args.metrics_port is None and not self.args.metrics_textfile:
+            return None
+        # metrics are optional, only imported when asked for
+        # pylint: disable=locally-disabled, import-outside-toplevel
+        from ipv6ddns.metrics import MetricsListener
+        return MetricsListener(textfile=self.args.metrics_textfile)
+
+    def run(self, contexts):
+        """Run the workflow once for each context
+
+        Args:
+            contexts (list[DDNSContext]): execution contexts
+
+        Returns:
+            int: exit code, the last non zero return code of the contexts
+        """
         ret_val = 0
-        for ctx in contexts:
-            workflow = DDNSWorkflow(ctx)
-            response = workflow.run()
+        if self.args.asyncio:
+            # asyncio is the slowest import of the package, only paid when used
+            # pylint: disable=locally-disabled, import-outside-toplevel
+            from ipv6ddns.aio import AsyncContextRunner
+            runner = AsyncContextRunner(self.args.jobs, self.args.deadline)
+        else:
+            runner = ContextRunner(self.args.jobs, self.args.deadline)
+        for response in runner.run(contexts):
             if response:
                 ret_val = response
+        return ret_val
+
+    def watch(self, contexts):
+        """Keep running the workflow for each context on its interval, until
+        the process is asked to stop. The plugins are created once and reused
+        across the runs.
 
-        sys.exit(ret_val)
+        Args:
+            contexts (list[DDNSContext]): execution contexts
+
+        Returns:
+            int: exit code
+        """
+        # pylint: disable=locally-disabled, import-outside-toplevel
+        from ipv6ddns.scheduler import Job, Scheduler
+        scheduler = Scheduler(jitter=self.args.jitter, max_backoff=self.args.max_backoff)
+        workflows = []
+        try:
+            for ctx in contexts:
+                workflow = DDNSWorkflow(ctx)
+                workflows.append(workflow)
+                job = Job(ctx.ctx_id, workflow.run, ctx.common.interval)
+                scheduler.add(job)
+                if workflow.ipv6.subscribe(functools.partial(scheduler.trigger, job)):
+                    logging.info("Address changes of %s trigger an update", ctx.ctx_id)
+            self._stop_on_signal(scheduler)
+            logging.info("Watching %d context(s)", len(contexts))
+            scheduler.run()
+        finally:
+            for workflow in workflows:
+                workflow.close()
+        return 0
 
     def get_contexts(self):
-        """Parse the cli_args and return the DDNS execution contexts. More
-        than one context may be returned in future.
+        """Parse the cli_args and return the DDNS execution contexts. With
+        --config, one context is returned for each host in the file.
         """
-        args = self.parse_args()
-        ctx_parser = ArgparseContextParser(self.plugin_manager, args)
+        self.args = self.parse_args()
+        if self.args.config:
+            ctx_parser = FileContextParser(self.plugin_manager, self.args.config, self.args)
+        else:
+            ctx_parser = ArgparseContextParser(self.plugin_manager, self.args)
         return ctx_parser.parse()
 
     def validate_ctx(self, ctx):
@@ -65,6 +163,12 @@ class Cli:
         errors = []
         if ctx.common.force and ctx.common.dry_run:
             errors.append(ValidationError("main", "Cannot use --dry-run and --force together."))
+        if getattr(self.args, "command", None) == Cli.COMMAND_WATCH\
+                and not ctx.common.assume_yes and not ctx.common.dry_run:
+            errors.append(ValidationError("main", "Cannot use watch without --assume-yes."))
+        if getattr(self.args, "jobs", 1) > 1\
+                and not ctx.common.assume_yes and not ctx.common.dry_run:
+            errors.append(ValidationError("main", "Cannot use --jobs without --assume-yes."))
         errors = errors + ctx.dns.plugin.validate(ctx)
         errors = errors + ctx.firewall.plugin.validate(ctx)
         errors = errors + ctx.ipv6.plugin.validate(ctx)
@@ -76,17 +180,19 @@ class Cli:
         parser = self._get_root_parser()
         args = parser.parse_args(self.cli_args)
 
+        for plugin_type, name in ((PluginType.DNS, args.dns),
+                                  (PluginType.FIREWALL, args.firewall),
+                                  (PluginType.IPV6, args.resolver)):
+            try:
+                plugin = self.plugin_manager.get_plugin(plugin_type, name)
+            except KeyError:
+                parser.error(f"the {plugin_type.name} plugin '{name}' could not be loaded")
+            self._add_group(parser, plugin)
+
         if args.help:
-            self._add_group(parser, self.plugin_manager.dns_plugins[args.dns])
-            self._add_group(parser, self.plugin_manager.firewall_plugins[args.firewall])
-            self._add_group(parser, self.plugin_manager.ipv6_plugins[args.resolver])
             parser.print_help()
             sys.exit(0)
 
-        self._add_group(parser, self.plugin_manager.dns_plugins[args.dns])
-        self._add_group(parser, self.plugin_manager.firewall_plugins[args.firewall])
-        self._add_group(parser, self.plugin_manager.ipv6_plugins[args.resolver])
-
         args = parser.parse_args(self.cli_args)
 
         return args
@@ -100,6 +206,23 @@ class Cli:
         for error in errors:
             logging.error("[%s] %s", error.plugin_name, error.message)
 
+    @staticmethod
+    def _stop_on_signal(scheduler):
+        """Stop the scheduler on SIGINT and SIGTERM. Signal handlers can only
+        be installed from the main thread.
+        """
+        import signal  # pylint: disable=locally-disabled, import-outside-toplevel
+        import threading  # pylint: disable=locally-disabled, import-outside-toplevel
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        def _handler(signum, _frame):
+            logging.info("Received signal %s, stopping.", signum)
+            scheduler.stop()
+
+        signal.signal(signal.SIGINT, _handler)
+        signal.signal(signal.SIGTERM, _handler)
+
     def _add_group(self, parser, plugin):
         group = parser.add_argument_group(plugin.get_title(), plugin.get_description())
         prefix = ArgparseContextParser.get_arg_prefix(plugin)
@@ -114,6 +237,15 @@ class Cli:
             add_help=False
         )
 
+        parser.add_argument(
+            "command",
+            nargs="?",
+            default=Cli.COMMAND_RUN,
+            choices=[Cli.COMMAND_RUN, Cli.COMMAND_WATCH],
+            help="'run' updates DNS and firewall once and exits. 'watch' keeps running and"\
+                " updates on every --interval. Default is run."
+        )
+
         #
         # Common Options
         #
@@ -138,7 +270,8 @@ class Cli:
             "--force",
             action='store_true',
             required=False,
-            help="Force update even if nothing has changed."
+            help="Force update even if nothing has changed. Writes all the DNS records and"\
+                " firewall entries instead of only the ones that changed."
         )
 
         parser.add_argument(
@@ -149,6 +282,201 @@ class Cli:
                 " Don't update anything."
         )
 
+        parser.add_argument(
+            "-c",
+            "--config",
+            action='store',
+            type=str,
+            required=False,
+            help="TOML or JSON file with the hosts to update. When given, the DNS, firewall"\
+                " and resolver options are read from the file instead of the command line."
+        )
+
+        parser.add_argument(
+            "--sequential",
+            action='store_true',
+            required=False,
+            help="Call the plugins one after another instead of concurrently. Use with"\
+                " plugins that can not be called from multiple threads."
+        )
+
+        parser.add_argument(
+            "--timeout",
+            action='store',
+            default=60,
+            type=float,
+            required=False,
+            help="Seconds each plugin is given to resolve the ip address or fetch the"\
+                " current DNS records and firewall entries. Not applied with"\
+                " --sequential. Default is 60."
+        )
+
+        parser.add_argument(
+            "-j",
+            "--jobs",
+            action='store',
+            default=1,
+            type=int,
+            required=False,
+            help="Number of contexts to update at the same time. Default is 1."
+        )
+
+        parser.add_argument(
+            "--asyncio",
+            action='store_true',
+            required=False,
+            help="Run the contexts on a single asyncio event loop instead of a thread per"\
+                " job. Suited for large --jobs values and async plugins."
+        )
+
+        parser.add_argument(
+            "--deadline",
+            action='store',
+            type=float,
+            required=False,
+            help="Seconds each context is given to complete. A context that takes"\
+                " longer fails with exit code 5. Default is no deadline."
+        )
+
+        parser.add_argument(
+            "--state-file",
+            action='store',
+            type=str,
+            required=False,
+            help="File to record the last successfully applied state of each host in. When"\
+                " the resolved ip address and the configuration match the recorded state,"\
+                " the DNS and firewall are not read or written. Default is no state file."
+        )
+
+        parser.add_argument(
+            "--state-max-age",
+            action='store',
+            default=3600,
+            type=float,
+            required=False,
+            help="Seconds after which the DNS and firewall are checked again even if the"\
+                " recorded state matches. 0 always checks them. Default is 3600."
+        )
+
+        parser.add_argument(
+            "--retries",
+            action='store',
+            default=2,
+            type=int,
+            required=False,
+            help="Times a plugin call failing with a transient error, like a timeout or a"\
+                " throttled request, is retried. 0 disables the retries. Default is 2."
+        )
+
+        parser.add_argument(
+            "--retry-delay",
+            action='store',
+            default=1.0,
+            type=float,
+            required=False,
+            help="Seconds of backoff before the first retry, doubled for each further retry"\
+                " and randomized. Default is 1."
+        )
+
+        parser.add_argument(
+            "--retry-max-delay",
+            action='store',
+            default=30.0,
+            type=float,
+            required=False,
+            help="Upper limit of the backoff between retries, in seconds. Default is 30."
+        )
+
+        parser.add_argument(
+            "--breaker-threshold",
+            action='store',
+            default=5,
+            type=int,
+            required=False,
+            help="Consecutive transient failures of a plugin endpoint after which its calls"\
+                " fail at once, for all the hosts, until --breaker-reset seconds have"\
+                " passed. 0 disables the circuit breakers. Default is 5."
+        )
+
+        parser.add_argument(
+            "--breaker-reset",
+            action='store',
+            default=60.0,
+            type=float,
+            required=False,
+            help="Seconds the calls to a failing plugin endpoint are suspended before it is"\
+                " tried again. Default is 60."
+        )
+
+        parser.add_argument(
+            "--timings",
+            action='store_true',
+            required=False,
+            help="Log the time spent in each phase and plugin call of every run, as one"\
+                " JSON line per run."
+        )
+
+        parser.add_argument(
+            "--metrics-port",
+            action='store',
+            type=int,
+            required=False,
+            help="Serve Prometheus metrics of the runs on http://ADDRESS:PORT/metrics,"\
+                " for watch mode. Default is no server."
+        )
+
+        parser.add_argument(
+            "--metrics-address",
+            action='store',
+            default="127.0.0.1",
+            type=str,
+            required=False,
+            help="Address the metrics server listens on. Default is 127.0.0.1."
+        )
+
+        parser.add_argument(
+            "--metrics-textfile",
+            action='store',
+            type=str,
+            required=False,
+            help="File to write the Prometheus metrics to after every run, for the"\
+                " textfile collector of the node exporter. Use a .prom extension."\
+                " Default is no file."
+        )
+
+        #
+        # Watch Options
+        #
+        parser.add_argument(
+            "--interval",
+            action='store',
+            default=300,
+            type=float,
+            required=False,
+            help="Seconds between two runs in watch mode. Default is 300."
+        )
+
+        parser.add_argument(
+            "--jitter",
+            action='store',
+            default=0.1,
+            type=float,
+            required=False,
+            help="Random delay added to the interval in watch mode, as a fraction of"\
+                " the interval. Default is 0.1."
+        )
+
+        parser.add_argument(
+            "--max-backoff",
+            action='store',
+            default=3600,
+            type=float,
+            required=False,
+            help="Upper limit in seconds for the delay between retries when runs fail"\
+                " in watch mode. The delay doubles with every consecutive failure."\
+                " Default is 3600."
+        )
+
         #
         # DNS Options
         #
@@ -1,10 +1,35 @@
 """
 Classes for execution context
 """
-import socket
+import argparse
+import json
+import os
+import sys
 from ipv6ddns.plugin import PluginManager, PluginType
 
 
+def get_toml_parser():
+    """Return the TOML parser, imported on first use: tomllib on Python 3.11+,
+    otherwise the tomli package when installed.
+
+    Returns:
+        module | None: the parser module, None if no parser is available
+    """
+    if sys.version_info >= (3, 11):
+        import tomllib  # pylint: disable=locally-disabled, import-outside-toplevel
+        return tomllib
+    try:
+        # pylint: disable=locally-disabled, import-error, import-outside-toplevel
+        import tomli
+        return tomli
+    except ImportError:
+        return None
+
+
+class ConfigError(Exception):
+    """Raised when a configuration file can not be parsed into contexts"""
+
+
 # pylint: disable=locally-disabled, too-few-public-methods,
 class CommonContext:
     """Context common to all operations"""
@@ -14,6 +39,16 @@ class CommonContext:
         self.dry_run = False
         self.args = None
         self.force = False
+        self.interval = 300
+        self.sequential = False
+        self.timeout = None
+        self.state_file = None
+        self.state_max_age = 3600
+        self.retries = 2
+        self.retry_delay = 1.0
+        self.retry_max_delay = 30.0
+        self.breaker_threshold = 5
+        self.breaker_reset = 60.0
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -21,15 +56,39 @@ class CommonContext:
     def __repr__(self) -> str:
         return f"CommonContext(assume_yes={self.assume_yes},"\
             f" dry_run={self.dry_run}, args={self.args},"\
-            f" force={self.force})"
+            f" force={self.force}, interval={self.interval},"\
+            f" sequential={self.sequential}, timeout={self.timeout},"\
+            f" state_file={self.state_file}, state_max_age={self.state_max_age},"\
+            f" retries={self.retries}, retry_delay={self.retry_delay},"\
+            f" retry_max_delay={self.retry_max_delay},"\
+            f" breaker_threshold={self.breaker_threshold},"\
+            f" breaker_reset={self.breaker_reset})"
 
 
 # pylint: disable=locally-disabled, too-few-public-methods,
-class DNSContext:
-    """Context specific to DNS operations"""
+class PluginContext:
+    """Base class of the plugin specific contexts. Plugin options which are
+    not set on the context itself are looked up in `defaults`, a dictionary
+    which can be shared between many contexts.
+    """
 
     def __init__(self) -> None:
         self.plugin = None
+        self.defaults = None
+
+    def __getattr__(self, name):
+        defaults = self.__dict__.get("defaults")
+        if defaults is not None and name in defaults:
+            return defaults[name]
+        raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+
+
+# pylint: disable=locally-disabled, too-few-public-methods,
+class DNSContext(PluginContext):
+    """Context specific to DNS operations"""
+
+    def __init__(self) -> None:
+        super().__init__()
         self.fqdns = []
 
     def __str__(self) -> str:
@@ -40,11 +99,11 @@ class DNSContext:
 
 
 # pylint: disable=locally-disabled, too-few-public-methods,
-class FirewallContext:
+class FirewallContext(PluginContext):
     """Context specific to Firewall operations"""
 
     def __init__(self) -> None:
-        self.plugin = None
+        super().__init__()
         self.tcp_ports = []
         self.udp_ports = []
         self.host_id = None
@@ -58,11 +117,11 @@ class FirewallContext:
 
 
 # pylint: disable=locally-disabled, too-few-public-methods,
-class ResolverContext:
+class ResolverContext(PluginContext):
     """Context specific to IPV6 resolution operations"""
 
     def __init__(self) -> None:
-        self.plugin = None
+        super().__init__()
 
     def __str__(self) -> str:
         return self.__repr__()
@@ -137,6 +196,14 @@ class ArgparseContextParser(ContextParser):
         ctx.assume_yes = args.assume_yes
         ctx.dry_run = args.dry_run
         ctx.force = args.force
+        ctx.interval = getattr(args, "interval", ctx.interval)
+        ctx.sequential = getattr(args, "sequential", ctx.sequential)
+        ctx.timeout = getattr(args, "timeout", ctx.timeout)
+        ctx.state_file = getattr(args, "state_file", ctx.state_file)
+        ctx.state_max_age = getattr(args, "state_max_age", ctx.state_max_age)
+        for key in ("retries", "retry_delay", "retry_max_delay", "breaker_threshold",
+                    "breaker_reset"):
+            setattr(ctx, key, getattr(args, key, getattr(ctx, key)))
         ctx.args = self.args
         return ctx
 
@@ -144,7 +211,7 @@ class ArgparseContextParser(ContextParser):
         """Parse DNSContext from namespace"""
         args = self.args
         ctx = DNSContext()
-        ctx.plugin = self.plugin_manager.dns_plugins[args.dns]
+        ctx.plugin = self.plugin_manager.get_plugin(PluginType.DNS, args.dns)
         ctx.fqdns = args.domain
         self.parse_plugin_args(ctx)
         return ctx
@@ -153,7 +220,7 @@ class ArgparseContextParser(ContextParser):
         """Parse FirewallContext from namespace"""
         args = self.args
         ctx = FirewallContext()
-        ctx.plugin = self.plugin_manager.firewall_plugins[args.firewall]
+        ctx.plugin = self.plugin_manager.get_plugin(PluginType.FIREWALL, args.firewall)
         ctx.tcp_ports = args.tcp_port
         ctx.udp_ports = args.udp_port
         ctx.host_id = self._get_host_id() # type: ignore
@@ -164,7 +231,7 @@ class ArgparseContextParser(ContextParser):
         """Parse DNSContext from namespace"""
         args = self.args
         ctx = ResolverContext()
-        ctx.plugin = self.plugin_manager.ipv6_plugins[args.resolver]
+        ctx.plugin = self.plugin_manager.get_plugin(PluginType.IPV6, args.resolver)
         self.parse_plugin_args(ctx)
         return ctx
 
@@ -183,6 +250,7 @@ class ArgparseContextParser(ContextParser):
     def _get_host_id(self):
         if self.args.host_id:
             return self.args.host_id
+        import socket  # pylint: disable=locally-disabled, import-outside-toplevel
         return socket.gethostname()
 
     @staticmethod
@@ -203,3 +271,209 @@ class ArgparseContextParser(ContextParser):
         elif plugin.get_type() == PluginType.IPV6:
             prefix = "ipv6"
         return prefix
+
+
+class FileContextParser(ContextParser):
+    """Context parser which reads the contexts for many hosts from a TOML
+    (.toml) or JSON file. Settings under `defaults` apply to every host and
+    each entry of `hosts` becomes one DDNSContext:
+
+        [defaults]
+        dns = "route53"
+        interval = 300
+        dns_options = { ttl = 60 }
+
+        [[hosts]]
+        host_id = "nas"
+        domains = ["nas.example.com"]
+        tcp_ports = [443]
+        ipv6_options = { interface = "eth0" }
+
+    The CommonContext and the plugin option defaults are parsed once and
+    shared between the contexts, only per host settings are stored per
+    context. The command line flags (--dry-run, --force, --assume-yes) apply
+    to every host.
+    """
+
+    PLUGIN_KEYS = {
+        PluginType.DNS: "dns",
+        PluginType.FIREWALL: "firewall",
+        PluginType.IPV6: "resolver",
+    }
+
+    COMMON_KEYS = ("interval", "sequential", "timeout", "state_file", "state_max_age", "retries",
+                   "retry_delay", "retry_max_delay", "breaker_threshold", "breaker_reset")
+
+    def __init__(self, plugin_manager: PluginManager, path: str, args=None) -> None:
+        super().__init__(plugin_manager)
+        self.path = path
+        self.args = args
+        self._plugin_defaults = {}
+
+    def parse(self):
+        return list(self.iter_contexts())
+
+    def iter_contexts(self):
+        """Parse the file and yield a context for each host
+
+        Raises:
+            ConfigError: when the file or one of the hosts is invalid
+
+        Yields:
+            DDNSContext: execution context of a host
+        """
+        config = self.load()
+        defaults = config.get("defaults", {})
+        hosts = config.get("hosts", [])
+        if not isinstance(defaults, dict) or not isinstance(hosts, list):
+            raise ConfigError(f"{self.path}: 'defaults' must be a table and 'hosts' a list")
+
+        common = self.parse_common_ctx(defaults)
+        for index, host in enumerate(hosts):
+            yield self.parse_host(host, defaults, common, f"hosts[{index}]")
+
+    def load(self):
+        """Load the file
+
+        Raises:
+            ConfigError: when the file can not be read or parsed
+
+        Returns:
+            dict: contents of the file
+        """
+        is_toml = os.path.splitext(self.path)[1].lower() == ".toml"
+        toml = get_toml_parser() if is_toml else None
+        if is_toml and toml is None:
+            raise ConfigError(f"{self.path}: TOML needs Python 3.11 or the tomli package")
+        try:
+            if is_toml:
+                with open(self.path, "rb") as file:
+                    config = toml.load(file)
+            else:
+                with open(self.path, encoding="utf-8") as file:
+                    config = json.load(file)
+        except (OSError, ValueError) as err:
+            raise ConfigError(f"{self.path}: {err}") from err
+        if not isinstance(config, dict):
+            raise ConfigError(f"{self.path}: expected a table at the top level")
+        return config
+
+    def parse_common_ctx(self, defaults):
+        """Parse the CommonContext shared by all the hosts
+
+        Args:
+            defaults (dict): settings shared by all the hosts
+
+        Returns:
+            CommonContext: common context
+        """
+        ctx = CommonContext()
+        if self.args is not None:
+            ctx = ArgparseContextParser(self.plugin_manager, self.args).parse_common_ctx()
+        for key in self.COMMON_KEYS:
+            if key in defaults:
+                setattr(ctx, key, defaults[key])
+        return ctx
+
+    def parse_host(self, host, defaults, common, name):
+        """Parse the context of a single host
+
+        Args:
+            host (dict): settings of the host
+            defaults (dict): settings shared by all the hosts
+            common (CommonContext): shared common context
+            name (str): name of the host entry, used in errors
+
+        Raises:
+            ConfigError: when the host entry is invalid
+
+        Returns:
+            DDNSContext: execution context of the host
+        """
+        if not isinstance(host, dict):
+            raise ConfigError(f"{self.path}: {name} must be a table")
+        host_id = host.get("host_id")
+        if not host_id:
+            raise ConfigError(f"{self.path}: {name} has no host_id")
+
+        ctx = DDNSContext()
+        ctx.ctx_id = host_id
+        ctx.common = common
+
+        ctx.dns = self._parse_plugin_ctx(DNSContext(), PluginType.DNS, host, defaults, name)
+        ctx.dns.fqdns = self._get_list(host, defaults, "domains", str, name)
+
+        ctx.firewall = self._parse_plugin_ctx(
+            FirewallContext(), PluginType.FIREWALL, host, defaults, name)
+        ctx.firewall.tcp_ports = self._get_list(host, defaults, "tcp_ports", int, name)
+        ctx.firewall.udp_ports = self._get_list(host, defaults, "udp_ports", int, name)
+        ctx.firewall.host_id = host_id
+
+        ctx.ipv6 = self._parse_plugin_ctx(ResolverContext(), PluginType.IPV6, host, defaults, name)
+        return ctx
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def _parse_plugin_ctx(self, ctx, plugin_type, host, defaults, name):
+        """Set the plugin of the context, point it to the shared option defaults
+        and set the options specific to the host. The options under `defaults`
+        belong to the plugin named under `defaults`, a host using another
+        plugin only gets the defaults of its command line arguments.
+        """
+        plugin_key = self.PLUGIN_KEYS[plugin_type]
+        default_name = defaults.get(plugin_key, PluginManager.PLUGIN_NAME_NOOP)
+        plugin_name = host.get(plugin_key, default_name)
+        try:
+            ctx.plugin = self.plugin_manager.get_plugin(plugin_type, plugin_name)
+        except KeyError:
+            raise ConfigError(f"{self.path}: {name} uses unknown"
+                              f" {plugin_key} plugin '{plugin_name}'") from None
+
+        options_key = f"{ArgparseContextParser.get_arg_prefix(ctx.plugin)}_options"
+        options = defaults.get(options_key, {}) if plugin_name == default_name else {}
+        ctx.defaults = self._get_plugin_defaults(ctx.plugin, options)
+        for key, value in host.get(options_key, {}).items():
+            setattr(ctx, key, value)
+        return ctx
+
+    def _get_plugin_defaults(self, plugin, options):
+        """Return the option defaults of a plugin: the defaults of its command
+        line arguments, overridden by the options under `defaults`. Built once
+        per plugin name and shared by all the contexts using the plugin.
+        """
+        plugin_name = plugin.get_name()
+        if plugin_name in self._plugin_defaults:
+            return self._plugin_defaults[plugin_name]
+
+        prefix = ArgparseContextParser.get_arg_prefix(plugin)
+        parser = argparse.ArgumentParser(add_help=False)
+        plugin.add_args(parser.add_argument_group(), prefix)
+        plugin_defaults = {}
+        # pylint: disable=locally-disabled, protected-access
+        for action in parser._actions:
+            if action.dest.startswith(f"{prefix}_"):
+                plugin_defaults[action.dest[len(prefix) + 1:]] = action.default
+        plugin_defaults.update(options)
+
+        self._plugin_defaults[plugin_name] = plugin_defaults
+        return plugin_defaults
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def _get_list(self, host, defaults, key, item_type, name):
+        """Return a list setting of the host, checking the type of its items
+
+        Raises:
+            ConfigError: when the setting is not a list of `item_type`
+        """
+        value = self._get(host, defaults, key, [])
+        # bool is a subclass of int, but true is not a port
+        if not isinstance(value, list) or any(
+                not isinstance(item, item_type) or isinstance(item, bool) for item in value):
+            raise ConfigError(f"{self.path}: {name} {key} must be a list of"
+                              f" {item_type.__name__}")
+        return value
+
+    @staticmethod
+    def _get(host, defaults, key, default):
+        if key in host:
+            return host[key]
+        return defaults.get(key, default)
@@ -1,8 +1,58 @@
 """
 DDNS operations and core logic
 """
+import functools
 import logging
-from ipv6ddns.domain import ZoneRecord, FirewallEntry, Protocol
+from ipv6ddns.domain import ZoneRecord, FirewallEntry, Protocol, ValidationError, canonical_address
+from ipv6ddns.events import NULL_PHASE, count_records, start_run
+from ipv6ddns.plugin import Plugin
+from ipv6ddns.reconcile import (
+    reconcile, dns_record_key, fw_entry_key, fw_entry_id, ip_changed, owns_fw_entry
+)
+from ipv6ddns.ratelimit import get_plugin_bucket, limited
+from ipv6ddns.resilience import Resilience
+from ipv6ddns.state import StateStore, fingerprint
+from ipv6ddns.tasks import gather, invoke
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class Plan:
+    """Changes planned by a run of the workflow: the expected records and
+    entries, and their diff against the current ones.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def __init__(self, curr_ip, new_dns, new_fw, dns_diff, fw_diff) -> None:
+        self.curr_ip = curr_ip
+        self.new_dns = new_dns
+        self.new_fw = new_fw
+        self.dns_diff = dns_diff
+        self.fw_diff = fw_diff
+
+    @property
+    def has_changes(self) -> bool:
+        """True if records or entries need to be written"""
+        return bool(self.dns_diff.adds or self.dns_diff.updates or self.fw_diff)
+
+    def get_writes(self, force: bool = False):
+        """Return the records and entries to write, and the stale entries to
+        delete. Only the records and entries that are new or have changed are
+        written, unless `force` asks for a full resync of all the expected
+        records and entries.
+
+        Args:
+            force (bool, optional): write all the expected records and entries.
+                                    Defaults to False.
+
+        Returns:
+            tuple[list[ZoneRecord], list[FirewallEntry], list[FirewallEntry]]: records
+                and entries to write, and entries to delete
+        """
+        fw_deletes = list(self.fw_diff.deletes.values())
+        if force:
+            return self.new_dns, self.new_fw, fw_deletes
+        return [new for _, new in self.dns_diff.changes()], \
+            [new for _, new in self.fw_diff.changes()], fw_deletes
 
 
 class DDNSWorkflow:
@@ -14,34 +64,224 @@ class DDNSWorkflow:
         self.dns = context.dns.plugin(context.common, context.dns)
         self.firewall = context.firewall.plugin(context.common, context.firewall)
         self.ipv6 = context.ipv6.plugin(context.common, context.ipv6)
+        self.state = None
+        if context.common.state_file:
+            self.state = StateStore(context.common.state_file)
+        self.resilience = Resilience.from_context(context.common)
+        self.timings = None
 
     def run(self):
-        """Run the workflow
+        """Run the workflow. The timings of the run are recorded when timing
+        listeners are registered.
+
+        Returns:
+            int: return code of the run
+        """
+        self.timings = start_run(self.ctx.ctx_id)
+        if self.timings is None:
+            return self._run()
+        with self.timings:
+            self.timings.result = self._run()
+        return self.timings.result
+
+    def _run(self):
+        curr_ip = None
+        if self.state is not None and not self.ctx.common.force:
+            curr_ip = self.resolve()
+            if self.is_unchanged(curr_ip):
+                return 0
+
+        plan = self.plan(*self.fetch(curr_ip))
+
+        response = self.confirm(plan)
+        if response is not None:
+            if response == 0:
+                self.save_state(plan.curr_ip)
+            return response
+
+        self.update(*self.get_writes(plan))
+        self.save_state(plan.curr_ip)
+        return 0
+
+    def is_unchanged(self, curr_ip) -> bool:
+        """Whether the last successful run applied the same ip address and
+        configuration, recently enough to skip the remote reads and writes.
+
+        Args:
+            curr_ip (str): current ip address
+
+        Returns:
+            bool: True if the run can be skipped
         """
-        curr_ip = self.ipv6.resolve()
-        curr_dns = self.dns.get_aaaa_records()
-        curr_fw = self.firewall.get_entries()
+        if self.state is None or self.ctx.common.force:
+            return False
+        digest = fingerprint(self.ctx, curr_ip)
+        if not self.state.is_current(self.ctx.ctx_id, digest, self.ctx.common.state_max_age):
+            return False
+        logging.info("Current IP of the host is %s", curr_ip)
+        logging.info("Nothing changed since the last run, skipping the DNS and firewall checks.")
+        return True
 
-        new_dns = self.get_expected_dns_records(curr_ip)
-        new_fw = self.get_expected_fw_entries(curr_ip)
+    def save_state(self, curr_ip):
+        """Record the state applied by a successful run
 
-        dns_diff = self.get_dns_diff(curr_dns, new_dns)
-        fw_diff = self.get_fw_diff(curr_fw, new_fw)
+        Args:
+            curr_ip (str): ip address that was applied
+        """
+        if self.state is not None and not self.ctx.common.dry_run:
+            self.state.save(self.ctx.ctx_id, fingerprint(self.ctx, curr_ip))
+
+    def plan(self, curr_ip, curr_dns, curr_fw):
+        """Compute the expected records and entries for the current ip address,
+        diff them against the current ones and print the diff.
+
+        Args:
+            curr_ip (str): current ip address
+            curr_dns (list[ZoneRecord]): current DNS records
+            curr_fw (list[FirewallEntry]): current firewall entries
+
+        Returns:
+            Plan: the planned changes
+        """
+        with self.phase("plan") as phase:
+            new_dns = self.get_expected_dns_records(curr_ip)
+            new_fw = self.get_expected_fw_entries(curr_ip)
+
+            host_id = self.ctx.firewall.host_id
+            owned_fw = [entry for entry in curr_fw if owns_fw_entry(host_id, entry)]
+            if len(owned_fw) < len(curr_fw):
+                logging.debug("Ignoring %d firewall entries not managed for %s",
+                              len(curr_fw) - len(owned_fw), host_id)
+
+            dns_diff = self.get_dns_diff(curr_dns, new_dns)
+            fw_diff = self.get_fw_diff(owned_fw, new_fw)
+            phase.count = len(new_dns) + len(new_fw)
 
         self.print_diff(curr_ip, dns_diff, fw_diff)
+        return Plan(curr_ip, new_dns, new_fw, dns_diff, fw_diff)
+
+    def confirm(self, plan):
+        """Decide whether the planned changes should be applied. Dry runs stop
+        after printing the changes. Otherwise asks the user unless running in
+        non-interactive mode.
 
-        if not dns_diff and not fw_diff and not self.ctx.common.force:
+        Args:
+            plan (Plan): the planned changes
+
+        Returns:
+            int | None: None to apply the changes, otherwise the return code of the run
+        """
+        if not plan.has_changes and not self.ctx.common.force:
             logging.info("No updates to make. Exiting!")
             return 0
 
+        if self.ctx.common.dry_run:
+            logging.info("Dry run, not applying the changes.")
+            return 0
+
         if not self.ctx.common.assume_yes:
             response = input("Continue? [y|N]: ").lower()
             if not response or response[0] == "n":
                 logging.info("Aborting.")
                 return 4
 
-        self.update(new_dns, new_fw)
-        return 0
+        return None
+
+    def get_writes(self, plan):
+        """Return the records and entries to write for the plan and report
+        the number of writes avoided by writing only the changes.
+
+        Args:
+            plan (Plan): the planned changes
+
+        Returns:
+            tuple[list[ZoneRecord], list[FirewallEntry], list[FirewallEntry]]: records
+                and entries to write, and entries to delete
+        """
+        dns_records, fw_entries, fw_deletes = plan.get_writes(self.ctx.common.force)
+        avoided = len(plan.new_dns) + len(plan.new_fw) - len(dns_records) - len(fw_entries)
+        logging.info("Writing %d of %d DNS records and %d of %d firewall entries"
+                     " (%d writes avoided), deleting %d stale firewall entries",
+                     len(dns_records), len(plan.new_dns), len(fw_entries), len(plan.new_fw),
+                     avoided, len(fw_deletes))
+        return dns_records, fw_entries, fw_deletes
+
+    def resolve(self):
+        """Resolve the current ip address, within the timeout of the context
+        unless the calls are made sequentially.
+
+        Returns:
+            str: current ip address
+        """
+        if self.is_concurrent():
+            return self.canonical_ip(gather(
+                [("resolve", functools.partial(self.call, "ipv6", self.ipv6, "resolve"))],
+                self.ctx.common.timeout)[0])
+        return self.canonical_ip(self.call("ipv6", self.ipv6, "resolve"))
+
+    def canonical_ip(self, curr_ip):
+        """Validate the ip address returned by the resolver and return it in
+        canonical form, so the diffs and the state fingerprint do not depend
+        on how the resolver spells it.
+
+        Args:
+            curr_ip (str): ip address returned by the resolver
+
+        Raises:
+            ValidationError: if the resolver returned an invalid address, or no
+                             address unless it is the noop resolver
+
+        Returns:
+            str: canonical ip address, empty for the noop resolver
+        """
+        name = self.ctx.ipv6.plugin.get_name()
+        if not curr_ip and name != Plugin.PLUGIN_NAME_NOOP:
+            raise ValidationError(name, "No IPV6 address was resolved for the host")
+        try:
+            return canonical_address(curr_ip)
+        except ValidationError as err:
+            raise ValidationError(name, err.message) from None
+
+    def fetch(self, curr_ip=None):
+        """Resolve the current ip address and fetch the current DNS records and
+        firewall entries. The three calls are independent and run concurrently,
+        each limited to the timeout of the context. When the context asks for
+        sequential execution, or a plugin is not thread-safe, the calls are made
+        one after another from the calling thread, without a timeout.
+
+        Args:
+            curr_ip (str, optional): ip address, when already resolved. Defaults to None.
+
+        Returns:
+            tuple[str, list[ZoneRecord], list[FirewallEntry]]: ip, DNS records and
+                                                               firewall entries
+        """
+        calls = [
+            ("get_aaaa_records",
+             functools.partial(self.call, "dns", self.dns, "get_aaaa_records")),
+            ("get_entries", functools.partial(self.call, "fw", self.firewall, "get_entries")),
+        ]
+        if curr_ip is None:
+            calls.insert(0, ("resolve", functools.partial(self.call, "ipv6", self.ipv6, "resolve")))
+        with self.phase("fetch") as phase:
+            if self.is_concurrent():
+                results = gather(calls, self.ctx.common.timeout)
+            else:
+                results = [func() for _, func in calls]
+            phase.count = len(results[-2]) + len(results[-1])
+        if curr_ip is None:
+            return (self.canonical_ip(results[0]), *results[1:])
+        return (curr_ip, *results)
+
+    def is_concurrent(self) -> bool:
+        """Whether the plugin calls can be made concurrently
+
+        Returns:
+            bool: True if the context and all the plugins allow concurrent calls
+        """
+        return not self.ctx.common.sequential and all(
+            plugin.is_thread_safe() for plugin in (self.ipv6, self.dns, self.firewall)
+        )
 
     def get_expected_dns_records(self, curr_ip):
         """return the list of dns records expected in the zone.
@@ -58,7 +298,8 @@ class DDNSWorkflow:
         ]
 
     def get_expected_fw_entries(self, curr_ip):
-        """return the list of firewall entries expected in the firewall
+        """return the list of firewall entries expected in the firewall. The
+        ids of the entries are derived from the host id, protocol and port.
 
         Args:
             curr_ip (str): current ip address
@@ -66,13 +307,14 @@ class DDNSWorkflow:
         Returns:
             list[FirewallEntry]: list of firewall entries
         """
+        host_id = self.ctx.firewall.host_id
         tcp_fw_entries = [
-            FirewallEntry("", curr_ip, port, Protocol.TCP)
+            FirewallEntry(fw_entry_id(host_id, Protocol.TCP, port), curr_ip, port, Protocol.TCP)
             for port in self.ctx.firewall.tcp_ports
         ]
 
         udp_fw_entries = [
-            FirewallEntry("", curr_ip, port, Protocol.UDP)
+            FirewallEntry(fw_entry_id(host_id, Protocol.UDP, port), curr_ip, port, Protocol.UDP)
             for port in self.ctx.firewall.udp_ports
         ]
 
@@ -86,63 +328,103 @@ class DDNSWorkflow:
         """
         logging.info("Current IP of the host is %s", new_ip)
 
-        for entry in dns_diff:
-            old = entry[0]
-            new = entry[1]
+        for old, new in dns_diff.changes():
             if not old:
                 logging.info("[dns.add] %s => %s", new.name, new.ip_addr)
             else:
                 logging.info("[dns.update] %s => %s [old=%s]", new.name, new.ip_addr, old.ip_addr)
 
-        for entry in fw_diff:
-            old = entry[0]
-            new = entry[1]
+        for old in dns_diff.deletes.values():
+            logging.info("[dns.stale] %s => %s", old.name, old.ip_addr)
+
+        for old, new in fw_diff.changes():
             if not old:
                 logging.info("[fw.add] ALLOW %s:%s TO %s", new.protocol, new.port, new.ip_addr)
             else:
                 logging.info("[fw.update] ALLOW %s:%s TO %s [old=%s]",
                              new.protocol, new.port, new.ip_addr, old.ip_addr)
 
+        for old in fw_diff.deletes.values():
+            logging.info("[fw.delete] ALLOW %s:%s TO %s", old.protocol, old.port, old.ip_addr)
+
     @staticmethod
     def get_dns_diff(old, new):
-        """Compute and return the diff for DNS records. Returns list of
-        tuples containing old and new records for same FQDN.
+        """Compute and return the diff for DNS records, matched on the FQDN.
+
+        Args:
+            old (list[ZoneRecord]): records currently in the zone
+            new (list[ZoneRecord]): expected records
+
+        Returns:
+            Changeset: records to add, update and delete
         """
-        diff = []
-        for record in new:
-            existing = DDNSWorkflow._find_dns_record(record, old)
-            if not existing or existing.ip_addr != record.ip_addr:
-                diff.append((existing, record))
-        return diff
+        return reconcile(old, new, dns_record_key, ip_changed)
 
     @staticmethod
     def get_fw_diff(old, new):
-        """Compute and return the diff for firewall records. Returns list of
-        tuples containing old and new records for same entry_id.
+        """Compute and return the diff for firewall entries, matched on the
+        entry id.
+
+        Args:
+            old (list[FirewallEntry]): entries currently in the firewall
+            new (list[FirewallEntry]): expected entries
+
+        Returns:
+            Changeset: entries to add, update and delete
         """
-        diff = []
-        for record in new:
-            existing = DDNSWorkflow._find_fw_entry(record, old)
-            if not existing or existing.ip_addr != record.ip_addr:
-                diff.append((existing, record))
-        return diff
+        return reconcile(old, new, fw_entry_key, ip_changed)
 
-    def update(self, dns_records, fw_entries):
-        """Update the DNS and firewall entries
+    def update(self, dns_records, fw_entries, fw_deletes=()):
+        """Update the DNS and firewall entries, and delete the stale firewall
+        entries
         """
-        self.dns.upsert_records(dns_records)
-        self.firewall.save_entries(fw_entries)
+        with self.phase("update") as phase:
+            self.call("dns", self.dns, "upsert_records", dns_records)
+            self.call("fw", self.firewall, "apply_entries", fw_entries, list(fw_deletes))
+            phase.count = len(dns_records) + len(fw_entries) + len(fw_deletes)
 
-    @staticmethod
-    def _find_dns_record(query, records):
-        for record in records:
-            if record.name == query.name:
-                return record
-        return None
+    def phase(self, name: str):
+        """Timing of a phase of the current run, to use as a context manager
+        around the phase. Does nothing when the timings are not recorded.
 
-    @staticmethod
-    def _find_fw_entry(query, entries):
-        for entry in entries:
-            if entry.entry_id == query.entry_id:
-                return entry
-        return None
+        Args:
+            name (str): name of the phase
+
+        Returns:
+            PhaseTiming: timing of the phase
+        """
+        if self.timings is None:
+            return NULL_PHASE
+        return self.timings.measure(name)
+
+    def call(self, prefix: str, plugin, name: str, *args):
+        """Call a plugin method within the rate limit of the plugin, retrying
+        its transient failures, and record the call in the timings of the run
+
+        Args:
+            prefix (str): prefix of the plugin type, dns, fw or ipv6
+            plugin (Plugin): the plugin instance
+            name (str): name of the method
+
+        Returns:
+            Any: value returned by the method
+        """
+        method = getattr(plugin, name)
+        call = f"{prefix}.{name}"
+        func = invoke
+        bucket = get_plugin_bucket(plugin)
+        if bucket is not None:
+            func = limited(bucket, call, invoke)
+        if self.timings is None:
+            return self.resilience.call(plugin, call, func, method, *args)
+        with self.timings.measure(call, plugin.get_name()) as phase:
+            result = self.resilience.call(plugin, call, func, method, *args)
+            phase.count = count_records(args if result is None else result)
+        return result
+
+    def close(self):
+        """Close the plugins used by the workflow
+        """
+        self.dns.close()
+        self.firewall.close()
+        self.ipv6.close()
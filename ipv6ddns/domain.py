@@ -2,22 +2,135 @@
 Domain entities for ipv6ddns core.
 """
 from enum import Enum
+import functools
+import ipaddress
 
 
-class ZoneRecord:
+class ValidationError(ValueError):
+    """Validation error of a plugin or of the core. Returned in lists by the
+    `validate()` of the plugins, and raised when invalid data, such as an
+    invalid address, reaches the domain.
+    """
+    def __init__(self, plugin_name: str, message: str) -> None:
+        super().__init__(f"[{plugin_name}] {message}")
+        self.plugin_name = plugin_name
+        self.message = message
+
+
+@functools.lru_cache(maxsize=1024)
+def pack_address(ip_addr) -> bytes:
+    """Pack an IPV6 address into its 16 byte form. The empty address, used
+    when no address is known, packs to empty bytes.
+
+    Args:
+        ip_addr (str | bytes): address in text or packed form
+
+    Raises:
+        ValidationError: if the address is not a valid IPV6 address
+
+    Returns:
+        bytes: 16 byte address in network order, or b""
+    """
+    if not ip_addr:
+        return b""
+    if isinstance(ip_addr, bytes):
+        if len(ip_addr) != 16:
+            raise ValidationError("domain", f"Packed IPV6 address must be 16 bytes: {ip_addr!r}")
+        return ip_addr
+    # kept off the startup path, only needed once there are addresses
+    import socket  # pylint: disable=locally-disabled, import-outside-toplevel
+    try:
+        return socket.inet_pton(socket.AF_INET6, ip_addr)
+    except (OSError, TypeError) as err:
+        raise ValidationError("domain", f"Invalid IPV6 address: {ip_addr!r}") from err
+
+
+@functools.lru_cache(maxsize=1024)
+def format_address(packed: bytes) -> str:
+    """Render a packed IPV6 address in its canonical (RFC 5952) text form
+
+    Args:
+        packed (bytes): 16 byte address, or b""
+
+    Returns:
+        str: canonical text form, or "" for the empty address
+    """
+    if not packed:
+        return ""
+    return str(ipaddress.IPv6Address(packed))
+
+
+def canonical_address(ip_addr) -> str:
+    """Validate an IPV6 address and return its canonical text form, so the
+    same address is always spelled the same way.
+
+    Args:
+        ip_addr (str | bytes): address in text or packed form
+
+    Raises:
+        ValidationError: if the address is not a valid IPV6 address
+
+    Returns:
+        str: canonical text form, or "" for the empty address
+    """
+    return format_address(pack_address(ip_addr))
+
+
+class _Value:
+    """Base of the immutable value types. Attributes are set once by the
+    constructor, and equality and hashing use the `_key()` of the value.
+    """
+
+    __slots__ = ()
+
+    def _key(self) -> tuple:
+        raise NotImplementedError
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other) -> bool:
+        if type(other) is not type(self):  # pylint: disable=locally-disabled, unidiomatic-typecheck
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __reduce__(self):
+        return (type(self), self._key())
+
+
+class ZoneRecord(_Value):
     """DNS record in a zone."""
 
-    def __init__(self, name: str, ip_addr: str, ttl: int) -> None:
+    __slots__ = ("name", "packed", "ttl")
+
+    def __init__(self, name: str, ip_addr, ttl: int) -> None:
         """Constructor
 
         Args:
             name (str): fully qualified domain name of the record
-            ip_addr (str): ip address of the record
+            ip_addr (str | bytes): ip address of the record, in text or packed form
             ttl (int): current TTL in seconds
+
+        Raises:
+            ValidationError: if the ip address is not a valid IPV6 address
         """
-        self.name = name
-        self.ip_addr = ip_addr
-        self.ttl = ttl
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "packed", pack_address(ip_addr))
+        object.__setattr__(self, "ttl", ttl)
+
+    @property
+    def ip_addr(self) -> str:
+        """ip address of the record, in canonical text form"""
+        return format_address(self.packed)
+
+    def _key(self) -> tuple:
+        return (self.name, self.packed, self.ttl)
 
     def __str__(self) -> str:
         return f"ZoneRecord: name={self.name} | ip={self.ip_addr} | ttl={self.ttl}"
@@ -33,23 +146,36 @@ class Protocol(Enum):
     UDP = "udp"
 
 
-class FirewallEntry:
+class FirewallEntry(_Value):
     """Firewall entry in the IPV6 firewall table"""
 
-    def __init__(self, entry_id: str, ip_addr: str, port: int, protocol: Protocol):
+    __slots__ = ("entry_id", "packed", "port", "protocol")
+
+    def __init__(self, entry_id: str, ip_addr, port: int, protocol: Protocol):
         """Constructor
 
         Args:
             entry_id (str): unique id of the entry in firewall. How this is built is left to
                             to the individual firewall providers.
-            ip_addr (str): ipv6 address in the firewall entry
+            ip_addr (str | bytes): ipv6 address in the firewall entry, in text or packed form
             port (int): the port that is allowed
             protocol (Protocol): protocol being allowed in the firewall entry
+
+        Raises:
+            ValidationError: if the ip address is not a valid IPV6 address
         """
-        self.entry_id = entry_id
-        self.ip_addr = ip_addr
-        self.port = port
-        self.protocol = protocol
+        object.__setattr__(self, "entry_id", entry_id)
+        object.__setattr__(self, "packed", pack_address(ip_addr))
+        object.__setattr__(self, "port", port)
+        object.__setattr__(self, "protocol", protocol)
+
+    @property
+    def ip_addr(self) -> str:
+        """ipv6 address in the firewall entry, in canonical text form"""
+        return format_address(self.packed)
+
+    def _key(self) -> tuple:
+        return (self.entry_id, self.packed, self.port, self.protocol)
 
     def __str__(self) -> str:
         return f'Firewall Entry: id={self.entry_id} | ip={self.ip_addr} |'\
@@ -63,11 +189,3 @@ class FirewallEntry:
             {repr(self.protocol)}
         )"""
 
-
-# pylint: disable=locally-disabled, too-few-public-methods,
-class ValidationError:
-    """Container struct for validation errors
-    """
-    def __init__(self, plugin_name: str, message: str) -> None:
-        self.plugin_name = plugin_name
-        self.message = message
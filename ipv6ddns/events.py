@@ -0,0 +1,236 @@
+"""
+Timing events of the DDNS workflow. Each phase of a run (fetch, plan,
+update) and each plugin call is recorded with its monotonic start and end
+times, the number of records involved and its outcome, and passed to the
+registered listeners. At the end of a run the listeners receive a summary of
+all its timings.
+
+Nothing is recorded while no listener is registered: the workflow then only
+checks that the listener list is empty once per run.
+"""
+import json
+import logging
+import time
+
+
+OUTCOME_OK = "ok"
+OUTCOME_ERROR = "error"
+
+_listeners = []
+
+
+class TimingListener:
+    """Informal interface for listeners of the timing events. The phase events
+    of a run can be received from the worker threads of its plugin calls, so
+    listeners should be thread-safe.
+    """
+
+    # pylint: disable=locally-disabled, unused-argument
+    def on_phase(self, timings, phase) -> None:
+        """Called when a phase or a plugin call ends
+
+        Args:
+            timings (RunTimings): timings of the run
+            phase (PhaseTiming): timing of the phase
+        """
+
+    # pylint: disable=locally-disabled, unused-argument
+    def on_run(self, timings) -> None:
+        """Called when a run ends, with the timings of all its phases
+
+        Args:
+            timings (RunTimings): timings of the run
+        """
+
+
+def add_listener(listener: TimingListener) -> None:
+    """Register a listener of the timing events of every workflow run"""
+    _listeners.append(listener)
+
+
+def remove_listener(listener: TimingListener) -> None:
+    """Unregister a listener added with add_listener()"""
+    _listeners.remove(listener)
+
+
+def start_run(ctx_id: str):
+    """Start recording the timings of a run
+
+    Args:
+        ctx_id (str): id of the context of the run
+
+    Returns:
+        RunTimings | None: timings of the run, None when no listener is registered
+    """
+    if not _listeners:
+        return None
+    return RunTimings(ctx_id, tuple(_listeners))
+
+
+def count_records(value) -> int:
+    """Number of records of the result or arguments of a plugin call: 1 for an
+    ip address, the length of a list, or the total length of the lists of a
+    tuple of arguments.
+    """
+    if isinstance(value, str):
+        return 1 if value else 0
+    if isinstance(value, list):
+        return len(value)
+    if isinstance(value, tuple):
+        return sum(len(item) for item in value if isinstance(item, list))
+    return 0
+
+
+class _NullPhase:
+    """Phase returned while timings are not recorded. Counts set on it are
+    discarded.
+    """
+
+    count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = _NullPhase()
+
+
+class PhaseTiming:
+    """Timing of one phase or plugin call, used as a context manager around it.
+    The outcome is set from the exception leaving the block, if any.
+    """
+
+    __slots__ = ("timings", "name", "plugin", "start", "end", "count", "outcome", "error")
+
+    def __init__(self, timings, name: str, plugin: str = None) -> None:
+        """Constructor
+
+        Args:
+            timings (RunTimings): timings of the run
+            name (str): name of the phase, `dns.get_aaaa_records` for a plugin call
+            plugin (str, optional): name of the plugin called. Defaults to None.
+        """
+        self.timings = timings
+        self.name = name
+        self.plugin = plugin
+        self.start = None
+        self.end = None
+        self.count = 0
+        self.outcome = None
+        self.error = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the start to the end of the phase"""
+        return (self.end or time.perf_counter()) - self.start
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end = time.perf_counter()
+        if exc_type is None:
+            self.outcome = OUTCOME_OK
+        else:
+            self.outcome = OUTCOME_ERROR
+            self.error = exc_type.__name__
+        self.timings.add(self)
+        return False
+
+    def as_dict(self):
+        """Timing as a JSON serializable dict, times relative to the start of the run"""
+        return {
+            "name": self.name,
+            "plugin": self.plugin,
+            "start": self.start - self.timings.start,
+            "duration": self.duration,
+            "count": self.count,
+            "outcome": self.outcome,
+            "error": self.error,
+        }
+
+
+class RunTimings:
+    """Timings of one run of the workflow, used as a context manager around
+    the run. The return code of the run is set on `result` before the block
+    ends, and the listeners receive the summary when it ends.
+    """
+
+    def __init__(self, ctx_id: str, listeners) -> None:
+        """Constructor
+
+        Args:
+            ctx_id (str): id of the context of the run
+            listeners (tuple[TimingListener]): listeners of the run
+        """
+        self.ctx_id = ctx_id
+        self.listeners = listeners
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.result = None
+        self.error = None
+        self.phases = []
+
+    def measure(self, name: str, plugin: str = None) -> PhaseTiming:
+        """Return the timing of a phase, to use as a context manager around it"""
+        return PhaseTiming(self, name, plugin)
+
+    def add(self, phase: PhaseTiming) -> None:
+        """Record an ended phase and pass it to the listeners"""
+        self.phases.append(phase)
+        self._notify("on_phase", self, phase)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end = time.perf_counter()
+        self.error = None if exc_type is None else exc_type.__name__
+        self._notify("on_run", self)
+        return False
+
+    @property
+    def outcome(self) -> str:
+        """Outcome of the run"""
+        return OUTCOME_OK if self.error is None else OUTCOME_ERROR
+
+    @property
+    def duration(self) -> float:
+        """Seconds from the start to the end of the run"""
+        return (self.end or time.perf_counter()) - self.start
+
+    def as_dict(self):
+        """Summary of the run as a JSON serializable dict"""
+        return {
+            "ctx_id": self.ctx_id,
+            "started_at": self.started_at,
+            "duration": self.duration,
+            "result": self.result,
+            "outcome": self.outcome,
+            "error": self.error,
+            "phases": [phase.as_dict() for phase in sorted(self.phases, key=lambda p: p.start)],
+        }
+
+    def _notify(self, method, *args):
+        for listener in self.listeners:
+            try:
+                getattr(listener, method)(*args)
+            # pylint: disable=locally-disabled, broad-exception-caught
+            except Exception as err:
+                logging.warning("Timing listener %s failed: %s", listener, err)
+
+
+class LogTimingListener(TimingListener):
+    """Listener logging the summary of each run as one JSON line"""
+
+    def __init__(self, level: int = logging.INFO) -> None:
+        self.level = level
+
+    def on_run(self, timings) -> None:
+        logging.log(self.level, "Timings of %s: %s", timings.ctx_id,
+                    json.dumps(timings.as_dict(), sort_keys=True))
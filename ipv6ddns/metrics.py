@@ -0,0 +1,292 @@
+"""
+Prometheus metrics of the DDNS workflow. The metrics are fed by a timing
+listener (see ipv6ddns.events), so they cost nothing unless enabled, and are
+exposed in the Prometheus text format over HTTP on `/metrics`, or written to a
+file for the textfile collector of the node exporter when running from cron.
+"""
+import bisect
+import logging
+import os
+import threading
+from ipv6ddns.events import OUTCOME_OK, TimingListener
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (0, 1, 2, 5, 10, 50, 100, 500, 1000, 10000)
+
+# plugin calls writing records, counted as provider writes
+WRITE_CALLS = ("dns.upsert_records", "fw.apply_entries")
+
+
+def escape(value) -> str:
+    """Escape a label value of the text format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_labels(names, values) -> str:
+    """Format the labels of a sample, `{name="value",...}`"""
+    labels = ",".join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return f"{{{labels}}}" if labels else ""
+
+
+def format_value(value) -> str:
+    """Format a sample value of the text format"""
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    """Metric family with labelled values"""
+
+    TYPE = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames=()) -> None:
+        """Constructor
+
+        Args:
+            name (str): name of the metric
+            documentation (str): help text of the metric
+            labelnames (tuple[str], optional): names of the labels. Defaults to ().
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self._label_text = {}
+
+    def label_text(self, labels) -> str:
+        """Formatted labels of a sample, computed once per set of labels"""
+        text = self._label_text.get(labels)
+        if text is None:
+            text = self._label_text[labels] = format_labels(self.labelnames, labels)
+        return text
+
+    def samples(self):
+        """Yield the sample lines of the metric"""
+        for labels, value in self.values.items():
+            yield f"{self.name}{self.label_text(labels)} {format_value(value)}"
+
+    def render(self):
+        """Return the metric family in the text format"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self.samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter(Metric):
+    """Monotonic counter"""
+
+    TYPE = "counter"
+
+    def inc(self, labels=(), amount=1) -> None:
+        """Increase the counter of the labels"""
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """Value that can go up and down"""
+
+    TYPE = "gauge"
+
+    def set(self, labels=(), value=0) -> None:
+        """Set the value of the labels"""
+        self.values[labels] = value
+
+
+class Histogram(Metric):
+    """Distribution of observed values, in cumulative buckets"""
+
+    TYPE = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(),
+                 buckets=DURATION_BUCKETS) -> None:
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._bounds = [format_value(float(bound)) for bound in self.buckets]
+
+    def observe(self, labels=(), value=0) -> None:
+        """Add an observation for the labels"""
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * len(self.buckets), 0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        name = self.name
+        for labels, (counts, total, count) in self.values.items():
+            text = self.label_text(labels)
+            bucket_prefix = f"{name}_bucket{text[:-1]}," if text else f"{name}_bucket{{"
+            cumulative = 0
+            for bound, bucket in zip(self._bounds, counts):
+                cumulative += bucket
+                yield f'{bucket_prefix}le="{bound}"}} {cumulative}'
+            yield f"{name}_sum{text} {format_value(total)}"
+            yield f"{name}_count{text} {count}"
+
+
+class MetricsRegistry:
+    """Metrics of the runs of the workflow. Updates and renders are serialized
+    by a lock, as runs of contexts end on several threads.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.runs = Counter(
+            "ipv6ddns_runs_total", "Runs of the workflow by outcome.", ("context", "outcome"))
+        self.noop_runs = Counter(
+            "ipv6ddns_noop_runs_total", "Successful runs which had nothing to write.",
+            ("context",))
+        self.run_duration = Histogram(
+            "ipv6ddns_run_duration_seconds", "Duration of the runs.", ("context",))
+        self.last_run = Gauge(
+            "ipv6ddns_last_run_timestamp_seconds", "Start time of the last run.", ("context",))
+        self.last_success = Gauge(
+            "ipv6ddns_last_run_success", "1 if the last run succeeded, 0 otherwise.",
+            ("context",))
+        self.diff_size = Histogram(
+            "ipv6ddns_diff_size", "Records and entries written or deleted by a run.",
+            ("context",), SIZE_BUCKETS)
+        self.phase_duration = Histogram(
+            "ipv6ddns_phase_duration_seconds", "Duration of the phases of the runs.",
+            ("context", "phase"))
+        self.call_duration = Histogram(
+            "ipv6ddns_plugin_call_duration_seconds", "Duration of the plugin calls.",
+            ("context", "plugin", "call"))
+        self.calls = Counter(
+            "ipv6ddns_plugin_calls_total", "Plugin calls by outcome.",
+            ("context", "plugin", "call", "outcome"))
+        self.writes = Counter(
+            "ipv6ddns_plugin_writes_total", "Records and entries written by the plugins.",
+            ("context", "plugin", "call"))
+        self.metrics = (self.runs, self.noop_runs, self.run_duration, self.last_run,
+                        self.last_success, self.diff_size, self.phase_duration,
+                        self.call_duration, self.calls, self.writes)
+
+    def observe_run(self, timings) -> None:
+        """Update the metrics with the timings of an ended run
+
+        Args:
+            timings (RunTimings): timings of the run
+        """
+        ctx = (timings.ctx_id,)
+        with self.lock:
+            for phase in timings.phases:
+                if phase.plugin is None:
+                    self.phase_duration.observe(ctx + (phase.name,), phase.duration)
+                    continue
+                labels = ctx + (phase.plugin, phase.name)
+                self.call_duration.observe(labels, phase.duration)
+                self.calls.inc(labels + (phase.outcome,))
+                if phase.name in WRITE_CALLS and phase.outcome == OUTCOME_OK:
+                    self.writes.inc(labels, phase.count)
+
+            self.runs.inc(ctx + (timings.outcome,))
+            self.run_duration.observe(ctx, timings.duration)
+            self.last_run.set(ctx, timings.started_at)
+            success = timings.outcome == OUTCOME_OK and not timings.result
+            self.last_success.set(ctx, 1 if success else 0)
+            names = {phase.name: phase for phase in timings.phases}
+            if "plan" in names:
+                self.diff_size.observe(ctx, names["update"].count if "update" in names else 0)
+            if success and "update" not in names:
+                self.noop_runs.inc(ctx)
+
+    def render(self) -> str:
+        """Return all the metrics in the Prometheus text format"""
+        with self.lock:
+            return "".join(metric.render() for metric in self.metrics)
+
+
+class MetricsListener(TimingListener):
+    """Timing listener feeding a metrics registry, and writing the metrics to
+    a textfile after every run when a path is given.
+    """
+
+    def __init__(self, registry: MetricsRegistry = None, textfile: str = None) -> None:
+        """Constructor
+
+        Args:
+            registry (MetricsRegistry, optional): registry to update. Defaults to a
+                                                  new registry.
+            textfile (str, optional): path of the file for the textfile collector.
+                                      Defaults to None, no file.
+        """
+        self.registry = registry or MetricsRegistry()
+        self.textfile = textfile
+
+    def on_run(self, timings) -> None:
+        self.registry.observe_run(timings)
+        if self.textfile:
+            write_textfile(self.registry, self.textfile)
+
+
+def write_textfile(registry: MetricsRegistry, path: str) -> None:
+    """Write the metrics to a file for the textfile collector of the node
+    exporter. The file is replaced atomically so the collector never reads a
+    partial file, and is readable by the user of the exporter.
+
+    Args:
+        registry (MetricsRegistry): the metrics
+        path (str): path of the file, with the .prom extension
+    """
+    directory = os.path.dirname(path) or "."
+    # only needed when the metrics are written, kept off the startup path
+    import tempfile  # pylint: disable=locally-disabled, import-outside-toplevel
+    try:
+        handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".ipv6ddns-")
+        with os.fdopen(handle, "w", encoding="utf-8") as file:
+            file.write(registry.render())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except OSError as err:
+        logging.warning("Could not write the metrics file %s: %s", path, err)
+
+
+def start_server(registry: MetricsRegistry, port: int, address: str = "127.0.0.1"):
+    """Serve the metrics on `/metrics` from a daemon thread
+
+    Args:
+        registry (MetricsRegistry): the metrics
+        port (int): port to listen on, 0 for any free port
+        address (str, optional): address to listen on. Defaults to 127.0.0.1.
+
+    Returns:
+        http.server.ThreadingHTTPServer: the server, stopped with shutdown()
+    """
+    # http.server is only needed with --metrics-port
+    # pylint: disable=locally-disabled, import-outside-toplevel
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        """Handler of the scrapes"""
+
+        # pylint: disable=locally-disabled, invalid-name
+        def do_GET(self):
+            """Return the metrics on /metrics"""
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        # pylint: disable=locally-disabled, redefined-builtin
+        def log_message(self, format, *args):
+            logging.debug("metrics: " + format, *args)
+
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="ipv6ddns-metrics", daemon=True)
+    thread.start()
+    logging.info("Serving metrics on http://%s:%d/metrics", address, server.server_address[1])
+    return server
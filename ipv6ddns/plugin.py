@@ -1,17 +1,42 @@
 """
 Plugin structure for the ipv6ddns core. 
 """
+from collections.abc import Mapping
 from enum import Enum
+import functools
+import importlib
 import sys
 import logging
+from ipv6ddns.plugin_index import PluginIndex, distributions_key
 
 
-if sys.version_info < (3, 10):
-    # pylint: disable=locally-disabled, unused-import
-    from importlib_metadata import entry_points
-else:
-    # pylint: disable=locally-disabled, unused-import
-    from importlib.metadata import entry_points
+def entry_points(**params):
+    """Select entry points with importlib.metadata. The metadata machinery is
+    slow to import, so it is only imported when the entry points are scanned.
+    """
+    # pylint: disable=locally-disabled, import-outside-toplevel
+    if sys.version_info < (3, 10):
+        from importlib_metadata import entry_points as select
+    else:
+        from importlib.metadata import entry_points as select
+    return select(**params)
+
+
+def load_object(value: str):
+    """Load the object referenced by an entry point value, `module:attr`
+
+    Args:
+        value (str): entry point value
+
+    Returns:
+        Any: the object
+    """
+    module, _, attrs = value.partition(":")
+    obj = importlib.import_module(module.strip())
+    for attr in attrs.split("[", 1)[0].strip().split("."):
+        if attr:
+            obj = getattr(obj, attr)
+    return obj
 
 
 class PluginType(Enum):
@@ -102,6 +127,44 @@ class Plugin:
             argparse_group: argparse group
         """
 
+    def get_circuit_key(self) -> str:
+        """Key of the endpoint called by this provider. Plugins calling the same
+        key share a circuit breaker, which suspends the calls to the endpoint
+        after repeated failures. Plugins whose instances call different
+        endpoints, like routers at different addresses, should include the
+        endpoint in the key.
+
+        Returns:
+            str: key of the endpoint, the name of the provider by default
+        """
+        return self.get_name()
+
+    def get_rate_limit(self):
+        """Rate limit of the calls to this provider, enforced by the workflow
+        across all the contexts using the same limit key, with one token per
+        call. Providers whose API is throttled should return a
+        `ipv6ddns.ratelimit.RateLimit` keyed by their name and the scope of the
+        credentials the limit applies to. Providers making many API requests
+        per call should instead take a token from `ipv6ddns.ratelimit.get_bucket()`
+        for each request, and return None.
+
+        Returns:
+            RateLimit | None: the rate limit, None when the calls are not limited
+        """
+        return None
+
+    @staticmethod
+    def is_thread_safe() -> bool:
+        """Whether the plugin methods can be called from a thread other than
+        the main thread, while other plugins are called concurrently. Plugins
+        which are not thread-safe should return False, so that the workflow
+        calls the plugins one after another.
+
+        Returns:
+            bool: True if the plugin can be called from worker threads
+        """
+        return True
+
     # pylint: disable=locally-disabled, unused-argument
     @staticmethod
     def validate(context):
@@ -109,6 +172,12 @@ class Plugin:
         """
         return []
 
+    def close(self) -> None:
+        """Release any resources (connections, sessions) held by the plugin.
+        Called once the plugin is no longer needed. In daemon mode the same
+        plugin instance is used for many runs before it is closed.
+        """
+
 
 class DNSPlugin(Plugin):
     """Informal interface for DNS plugin. Should be exported in 'ipv6ddns.plugin.dns'
@@ -172,6 +241,28 @@ class FirewallPlugin(Plugin):
             entries (list[FirewallEntry]): list of entries to update
         """
 
+    def delete_entries(self, entries) -> None:
+        """Delete the entries from firewall. Only entries created by ipv6ddns
+        for the host are passed.
+
+        Args:
+            entries (list[FirewallEntry]): list of entries to delete
+        """
+
+    def apply_entries(self, save, delete) -> None:
+        """Save and delete entries in one go. Plugins which can apply all the
+        changes at once, for example in a single commit, should override this.
+        By default the entries are deleted with delete_entries() and then
+        saved with save_entries().
+
+        Args:
+            save (list[FirewallEntry]): list of entries to update
+            delete (list[FirewallEntry]): list of entries to delete
+        """
+        if delete:
+            self.delete_entries(delete)
+        self.save_entries(save)
+
     @staticmethod
     def get_title() -> str:
         return "NOOP Firewall Plugin"
@@ -179,8 +270,8 @@ class FirewallPlugin(Plugin):
     @staticmethod
     def get_description() -> str:
         return "Firewall plugin for ipv6ddns which does nothing. Call to get_entries"\
-            " will always return empty list, and call to save_entries() will do "\
-            " nothing"
+            " will always return empty list, and calls to save_entries() and"\
+            " delete_entries() will do nothing"
 
     @staticmethod
     def get_type() -> PluginType:
@@ -201,6 +292,21 @@ class IPResolverPlugin(Plugin):
         """
         return ""
 
+    # pylint: disable=locally-disabled, unused-argument
+    def subscribe(self, callback) -> bool:
+        """Subscribe to changes of the IPV6 address. Used in watch mode, so that
+        an address change triggers an update without waiting for the next
+        interval. The callback takes no arguments and may be called from any
+        thread.
+
+        Args:
+            callback (Callable[[], None]): called when the address may have changed
+
+        Returns:
+            bool: True if the plugin pushes changes, False if it can only be polled
+        """
+        return False
+
     @staticmethod
     def get_title() -> str:
         return "NOOP DNS Plugin"
@@ -215,7 +321,56 @@ class IPResolverPlugin(Plugin):
         return PluginType.IPV6
 
 
-# pylint: disable=locally-disabled, too-few-public-methods
+# pylint: disable=locally-disabled, invalid-overridden-method
+class AsyncDNSPlugin(DNSPlugin):
+    """Informal interface for DNS plugins built on asyncio. Same as DNSPlugin,
+    but the methods are coroutines which are awaited on the event loop.
+    """
+
+    async def get_aaaa_records(self):
+        """See DNSPlugin.get_aaaa_records()"""
+        return []
+
+    async def upsert_records(self, records) -> None:
+        """See DNSPlugin.upsert_records()"""
+
+
+# pylint: disable=locally-disabled, invalid-overridden-method
+class AsyncFirewallPlugin(FirewallPlugin):
+    """Informal interface for firewall plugins built on asyncio. Same as
+    FirewallPlugin, but the methods are coroutines which are awaited on the
+    event loop.
+    """
+
+    async def get_entries(self):
+        """See FirewallPlugin.get_entries()"""
+        return []
+
+    async def save_entries(self, entries) -> None:
+        """See FirewallPlugin.save_entries()"""
+
+    async def delete_entries(self, entries) -> None:
+        """See FirewallPlugin.delete_entries()"""
+
+    async def apply_entries(self, save, delete) -> None:
+        """See FirewallPlugin.apply_entries()"""
+        if delete:
+            await self.delete_entries(delete)
+        await self.save_entries(save)
+
+
+# pylint: disable=locally-disabled, invalid-overridden-method, too-few-public-methods
+class AsyncIPResolverPlugin(IPResolverPlugin):
+    """Informal interface for IPV6 resolvers built on asyncio. Same as
+    IPResolverPlugin, but resolve() is a coroutine which is awaited on the
+    event loop.
+    """
+
+    async def resolve(self):
+        """See IPResolverPlugin.resolve()"""
+        return ""
+
+
 class IPluginLookup:
     """Informal interface for plugin lookup logic
     """
@@ -232,15 +387,81 @@ class IPluginLookup:
         """
         return []
 
+    # pylint: disable=locally-disabled, unused-argument
+    def lookup_lazy(self, ep_name: str):
+        """Lookup plugins without loading them. Lookups which can tell the
+        plugin names from metadata return the names and a function loading
+        each plugin, so only the plugins that are used get imported.
+
+        Args:
+            ep_name: str: Name of the entry point to look plugins up from
+
+        Returns:
+            list[tuple[str, Callable[[], _Plugin]]] | None: names and loaders of the
+                plugins, None if the lookup can only return loaded plugins
+        """
+        return None
+
 
 class ImportLibPluginLookup(IPluginLookup):
-    """Plugin lookup using importlib entry points
+    """Plugin lookup using importlib entry points. The plugin names are the
+    entry point names, so plugins are only imported when they are used.
     """
 
     def lookup(self, ep_name: str):
         eps = entry_points(group=ep_name)
         return [ep.load() for ep in eps]
 
+    def lookup_lazy(self, ep_name: str):
+        return [(ep.name, ep.load) for ep in entry_points(group=ep_name)]
+
+
+class IndexedPluginLookup(ImportLibPluginLookup):
+    """Plugin lookup using importlib entry points, read from an on-disk index.
+    The index is rebuilt with a full scan of the entry points whenever the
+    installed distributions change.
+    """
+
+    GROUPS = (PluginType.DNS.value, PluginType.FIREWALL.value, PluginType.IPV6.value)
+
+    def __init__(self, index: PluginIndex = None) -> None:
+        """Constructor
+
+        Args:
+            index (PluginIndex, optional): the index. Defaults to the index in the XDG
+                                           cache directory.
+        """
+        self.index = index
+        self._groups = None
+
+    def lookup_lazy(self, ep_name: str):
+        if ep_name not in self.GROUPS:
+            return super().lookup_lazy(ep_name)
+        return [
+            (name, functools.partial(load_object, value))
+            for name, value in self.get_groups().get(ep_name, [])
+        ]
+
+    def get_groups(self):
+        """Return the entry points of the plugin groups, from the index when it
+        matches the installed distributions, otherwise from a full scan.
+
+        Returns:
+            dict[str, list[tuple[str, str]]]: group => names and values of the entry points
+        """
+        if self._groups is None:
+            index = self.index or PluginIndex()
+            key = distributions_key()
+            groups = index.load(key)
+            if groups is None:
+                groups = {
+                    group: [(ep.name, ep.value) for ep in entry_points(group=group)]
+                    for group in self.GROUPS
+                }
+                index.save(key, groups)
+            self._groups = groups
+        return self._groups
+
 
 class StaticPluginLookup(IPluginLookup):
     """Plugin lookup that returns static list of plugins. The static list
@@ -266,20 +487,108 @@ class StaticPluginLookup(IPluginLookup):
         return []
 
 
+class PluginRegistry(Mapping):
+    """Plugins of one type by name. Plugins discovered from metadata are
+    only loaded, and validated, when they are looked up by name. Iterating
+    the names or checking if a name exists does not load any plugin.
+    """
+
+    def __init__(self, manager, plugin_type: PluginType) -> None:
+        """Constructor
+
+        Args:
+            manager (PluginManager): manager validating the loaded plugins
+            plugin_type (PluginType): type of the plugins
+        """
+        self.manager = manager
+        self.plugin_type = plugin_type
+        self._plugins = {}
+        self._loaders = {}
+
+    def add(self, plugin):
+        """Add a loaded plugin"""
+        self._plugins[plugin.get_name()] = plugin
+
+    def add_loader(self, name: str, loader) -> bool:
+        """Add a plugin that is not loaded yet
+
+        Args:
+            name (str): name of the plugin
+            loader (Callable[[], Plugin]): function loading the plugin class
+
+        Returns:
+            bool: True if added, False if the name is invalid or already used
+        """
+        if not name or name in self:
+            logging.debug('Plugin with name "%s" already registered', name)
+            return False
+        self._loaders[name] = loader
+        return True
+
+    def load_all(self):
+        """Load all the plugins not loaded yet, skipping the invalid ones"""
+        for name in list(self._loaders):
+            try:
+                self[name]
+            except KeyError:
+                pass
+            except ImportError as err:
+                logging.error("Skipping plugin '%s' which could not be imported: %s", name, err)
+
+    def __getitem__(self, name):
+        if name in self._plugins:
+            return self._plugins[name]
+        # the loader is only dropped once it loaded a valid plugin
+        plugin = self._loaders[name]()
+        if plugin.get_type() != self.plugin_type or plugin.get_name() != name:
+            logging.error("Skipping invalid plugin '%s': expected %s plugin named '%s'.",
+                          plugin, self.plugin_type.name, name)
+            raise KeyError(name)
+        del self._loaders[name]
+        self.add(plugin)
+        self.manager.loaded.append(plugin)
+        return plugin
+
+    def __contains__(self, name) -> bool:
+        return name in self._plugins or name in self._loaders
+
+    def __iter__(self):
+        yield from self._plugins
+        yield from self._loaders
+
+    def __len__(self) -> int:
+        return len(self._plugins) + len(self._loaders)
+
+    def __repr__(self) -> str:
+        return f"PluginRegistry({self.plugin_type.name}, {list(self)})"
+
+
 class PluginManager:
     """Plugin manager for the ipv6ddns core. This is responsible for
     discovering and loading the available plugins and utility functions
-    around plugin management.
+    around plugin management. Discovery only reads the plugin names, a plugin
+    is imported when it is first looked up.
     """
 
     PLUGIN_NAME_NOOP = Plugin.PLUGIN_NAME_NOOP
 
-    def __init__(self, lookup: IPluginLookup = ImportLibPluginLookup()) -> None:
-        self.lookup = lookup
-        self.plugins = []
-        self.dns_plugins = {}
-        self.firewall_plugins = {}
-        self.ipv6_plugins = {}
+    def __init__(self, lookup: IPluginLookup = None) -> None:
+        self.lookup = lookup or IndexedPluginLookup()
+        self.loaded = []
+        self.dns_plugins = PluginRegistry(self, PluginType.DNS)
+        self.firewall_plugins = PluginRegistry(self, PluginType.FIREWALL)
+        self.ipv6_plugins = PluginRegistry(self, PluginType.IPV6)
+
+    @property
+    def plugins(self):
+        """All the valid plugins. Loads the plugins that are not loaded yet.
+
+        Returns:
+            list[Plugin]: loaded plugins
+        """
+        for registry in (self.dns_plugins, self.firewall_plugins, self.ipv6_plugins):
+            registry.load_all()
+        return self.loaded
 
     def discover(self):
         """Discover available plugins and load them
@@ -289,16 +598,59 @@ class PluginManager:
         self.discover_and_load(PluginType.IPV6)
 
     def discover_and_load(self, plugin_type: PluginType):
-        """Discover and load plugins from given entry point name and store
-        it in the given target dictionalry
+        """Discover the plugins of the given type. When the lookup can tell the
+        plugin names without loading the plugins, loading is deferred until a
+        plugin is looked up.
+
+        Args:
+            plugin_type (PluginType): type of the plugins to discover
+        """
+        entries = self.lookup.lookup_lazy(plugin_type.value)
+        if entries is None:
+            for plugin in self.lookup.lookup(plugin_type.value):
+                self.register(plugin)
+            return
+
+        registry = self.get_registry(plugin_type)
+        for name, loader in entries:
+            registry.add_loader(name, loader)
+
+    def get_plugin(self, plugin_type: PluginType, name: str):
+        """Return the plugin class with the given type and name, loading it if
+        needed.
 
         Args:
-            ep_name (str): name of the entry point
-            target (dict[str, _Plugin]): target dictionary of plugin name to plugin class
+            plugin_type (PluginType): type of the plugin
+            name (str): name of the plugin
+
+        Raises:
+            KeyError: when no valid plugin has the name, or it can not be imported
+
+        Returns:
+            Plugin: plugin class
         """
-        plugins = self.lookup.lookup(plugin_type.value)
-        for plugin in plugins:
-            self.register(plugin)
+        try:
+            return self.get_registry(plugin_type)[name]
+        except ImportError as err:
+            logging.error("Plugin '%s' could not be imported: %s", name, err)
+            raise KeyError(name) from err
+
+    def get_registry(self, plugin_type: PluginType):
+        """Return the plugins of the given type
+
+        Args:
+            plugin_type (PluginType): type of plugins
+
+        Returns:
+            PluginRegistry: plugins by name
+        """
+        if plugin_type == PluginType.DNS:
+            return self.dns_plugins
+        if plugin_type == PluginType.FIREWALL:
+            return self.firewall_plugins
+        if plugin_type == PluginType.IPV6:
+            return self.ipv6_plugins
+        raise KeyError(plugin_type)
 
     def register(self, plugin):
         """Manually register a plugin.
@@ -306,14 +658,9 @@ class PluginManager:
         Args:
             plugin (Plugin): plugin to register.
         """
-        target = {}
-        if plugin.get_type() == PluginType.DNS:
-            target = self.dns_plugins
-        elif plugin.get_type() == PluginType.FIREWALL:
-            target = self.firewall_plugins
-        elif plugin.get_type() == PluginType.IPV6:
-            target = self.ipv6_plugins
-        else:
+        try:
+            target = self.get_registry(plugin.get_type())
+        except KeyError:
             logging.error("Skipping unknown plugin '%s", plugin)
             return
 
@@ -321,8 +668,8 @@ class PluginManager:
             logging.error("Skipping invalid plugin '%s'.", plugin)
             return
 
-        target[plugin.get_name()] = plugin
-        self.plugins.append(plugin)
+        target.add(plugin)
+        self.loaded.append(plugin)
 
     def validate(self, plugin: Plugin, target) -> bool:
         """Validate the plugin. Check if plugin name is correct and does not
@@ -331,8 +678,8 @@ class PluginManager:
         Args:
             plugin (_Plugin): Plugin to be loaded
             plugin_type(PluginType): Type of plugin to validate
-            target (dict[str, _Plugin]): the target plugin namespace (dns/firewall) where
-                                         the plugin will be added
+            target (PluginRegistry): the target plugin namespace (dns/firewall) where
+                                     the plugin will be added
 
         Returns:
             bool: returns True if plugin can be added, False otherwise
@@ -349,7 +696,7 @@ class PluginManager:
         return True
 
     def get_plugin_names(self, plugin_type):
-        """Get the names of loaded plugins
+        """Get the names of the discovered plugins, without loading them
 
         Args:
             plugin_type (PluginType): type of plugins required
@@ -357,10 +704,7 @@ class PluginManager:
         Returns:
             list: List of plugin names available
         """
-        if plugin_type == PluginType.DNS:
-            return self.dns_plugins.keys()
-        if plugin_type == PluginType.FIREWALL:
-            return self.firewall_plugins.keys()
-        if plugin_type == PluginType.IPV6:
-            return self.ipv6_plugins.keys()
-        return []
+        try:
+            return list(self.get_registry(plugin_type))
+        except KeyError:
+            return []
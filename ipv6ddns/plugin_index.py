@@ -0,0 +1,109 @@
+"""
+On-disk index of the plugin entry points. Reading the entry points of all
+the installed distributions is slow on small hosts, so the entry points of
+the ipv6ddns groups are stored along with a key of the installed
+distributions, and only scanned again when the distributions change.
+"""
+import hashlib
+import json
+import logging
+import os
+import sys
+
+
+def default_index_path() -> str:
+    """Default path of the index, under the XDG cache directory
+
+    Returns:
+        str: path of the index file
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "ipv6ddns", "plugins.json")
+
+
+def distributions_key(paths=None) -> str:
+    """Key of the installed distributions: the names and modification times
+    of the distribution metadata directories on the import path, and of their
+    entry_points.txt. Only the directories are listed, no metadata is read.
+
+    Args:
+        paths (list[str], optional): import path. Defaults to sys.path.
+
+    Returns:
+        str: hex digest of the installed distributions
+    """
+    digest = hashlib.blake2b(sys.version.encode(), digest_size=16)
+    for path in sys.path if paths is None else paths:
+        digest.update(b"\0" + os.fsencode(path))
+        try:
+            with os.scandir(path or ".") as entries:
+                names = sorted((entry.name, entry.path) for entry in entries
+                               if entry.name.endswith((".dist-info", ".egg-info")))
+        except OSError:
+            continue
+        for name, entry_path in names:
+            digest.update(f"\0{name}:{_mtime(entry_path)}:"
+                          f"{_mtime(os.path.join(entry_path, 'entry_points.txt'))}".encode())
+    return digest.hexdigest()
+
+
+def _mtime(path) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+class PluginIndex:
+    """Index of the entry points of some groups, stored as JSON"""
+
+    def __init__(self, path: str = None) -> None:
+        """Constructor
+
+        Args:
+            path (str, optional): path of the index file. Defaults to the XDG cache
+                                  directory.
+        """
+        self.path = path or default_index_path()
+
+    def load(self, key: str):
+        """Load the indexed entry points
+
+        Args:
+            key (str): key of the installed distributions
+
+        Returns:
+            dict[str, list[tuple[str, str]]] | None: group => names and values of the
+                entry points, None when the index is missing or was built for other
+                distributions
+        """
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                index = json.load(file)
+            if index["key"] != key:
+                return None
+            return {group: [(name, value) for name, value in entries]
+                    for group, entries in index["groups"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+
+    def save(self, key: str, groups):
+        """Store the entry points, replacing the index atomically
+
+        Args:
+            key (str): key of the installed distributions
+            groups (dict[str, list[tuple[str, str]]]): group => names and values of
+                                                       the entry points
+        """
+        directory = os.path.dirname(self.path) or "."
+        # only needed when the index is rebuilt, kept off the startup path
+        import tempfile  # pylint: disable=locally-disabled, import-outside-toplevel
+        try:
+            os.makedirs(directory, exist_ok=True)
+            handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".plugins-")
+            with os.fdopen(handle, "w", encoding="utf-8") as file:
+                json.dump({"key": key, "groups": groups}, file)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logging.debug("Could not write the plugin index %s: %s", self.path, err)
@@ -0,0 +1,183 @@
+"""
+Rate limits of the plugin calls. Plugins whose API is throttled declare a
+RateLimit from `Plugin.get_rate_limit()`, keyed by the plugin and the scope of
+the credentials the limit applies to, and the workflow takes a token from the
+bucket of the key before each call to the plugin. The buckets are shared by
+all the contexts of the process, so many hosts updated through the same
+account stay under the limit of the account together.
+
+The buckets hand out the tokens in the order they are requested: a caller
+finding the bucket empty reserves the next token and waits for it, so the
+callers queued on a bucket are served first come, first served, and a context
+making many calls cannot starve the others.
+"""
+import logging
+import threading
+import time
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class RateLimit:
+    """Rate limit declared by a plugin"""
+
+    def __init__(self, key: str, rate: float, burst: int = 1) -> None:
+        """Constructor
+
+        Args:
+            key (str): key of the limit, the plugin name and the scope of the
+                       credentials, like `route53:AKIA...`
+            rate (float): calls per second
+            burst (int, optional): calls which can be made at once after a pause.
+                                   Defaults to 1.
+        """
+        self.key = key
+        self.rate = rate
+        self.burst = burst
+
+    def __repr__(self) -> str:
+        return f"RateLimit(key={self.key}, rate={self.rate}, burst={self.burst})"
+
+
+class TokenBucket:
+    """Token bucket refilled at `rate` tokens per second up to `burst` tokens.
+    Tokens are reserved ahead of time when the bucket is empty, which keeps
+    the waiting callers in order.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def __init__(self, rate: float, burst: int = 1, clock=time.monotonic,
+                 sleep=time.sleep) -> None:
+        """Constructor
+
+        Args:
+            rate (float): tokens added per second
+            burst (int, optional): capacity of the bucket. Defaults to 1.
+            clock (Callable[[], float], optional): monotonic clock. Defaults to
+                                                   time.monotonic.
+            sleep (Callable[[float], None], optional): blocking sleep. Defaults to
+                                                       time.sleep.
+        """
+        if rate <= 0:
+            raise ValueError("The rate of a token bucket must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(self.burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int = 1) -> float:
+        """Take tokens from the bucket, reserving them ahead of time when the
+        bucket is empty
+
+        Args:
+            tokens (int, optional): tokens to take. Defaults to 1.
+
+        Returns:
+            float: seconds to wait before the tokens are available
+        """
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self, tokens: int = 1) -> float:
+        """Take tokens from the bucket, waiting until they are available
+
+        Args:
+            tokens (int, optional): tokens to take. Defaults to 1.
+
+        Returns:
+            float: seconds waited
+        """
+        delay = self.reserve(tokens)
+        if delay > 0:
+            self.sleep(delay)
+        return delay
+
+    async def acquire_async(self, tokens: int = 1) -> float:
+        """Coroutine version of `acquire()`, waiting without blocking the loop"""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            # asyncio is only imported by the async workflow
+            import asyncio  # pylint: disable=locally-disabled, import-outside-toplevel
+            await asyncio.sleep(delay)
+        return delay
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(limit: RateLimit, clock=time.monotonic, sleep=time.sleep) -> TokenBucket:
+    """Return the token bucket of a rate limit, shared by all the contexts. The
+    bucket is created with the rate and burst of the first limit of its key.
+
+    Args:
+        limit (RateLimit): the rate limit
+        clock (Callable[[], float], optional): clock of a new bucket. Defaults to
+                                               time.monotonic.
+        sleep (Callable[[float], None], optional): sleep of a new bucket. Defaults
+                                                   to time.sleep.
+
+    Returns:
+        TokenBucket: the bucket
+    """
+    with _buckets_lock:
+        bucket = _buckets.get(limit.key)
+        if bucket is None:
+            bucket = _buckets[limit.key] = TokenBucket(limit.rate, limit.burst, clock, sleep)
+        return bucket
+
+
+def reset_buckets() -> None:
+    """Forget all the token buckets"""
+    with _buckets_lock:
+        _buckets.clear()
+
+
+def get_plugin_bucket(plugin):
+    """Token bucket of the rate limit declared by a plugin
+
+    Args:
+        plugin (Plugin): the plugin instance
+
+    Returns:
+        TokenBucket | None: the bucket, None when the plugin is not rate limited
+    """
+    limit = plugin.get_rate_limit()
+    if limit is None:
+        return None
+    return get_bucket(limit)
+
+
+def limited(bucket: TokenBucket, name: str, func):
+    """Wrap a function to take a token from the bucket before each call
+
+    Args:
+        bucket (TokenBucket): the bucket
+        name (str): name of the call, used in logs
+        func (Callable): the function
+
+    Returns:
+        Callable: the wrapped function
+    """
+    def call(*args):
+        delay = bucket.acquire()
+        if delay:
+            logging.debug("%s waited %.3fs for the rate limit", name, delay)
+        return func(*args)
+    return call
+
+
+def limited_async(bucket: TokenBucket, name: str, func):
+    """Coroutine version of `limited()`, for coroutine functions"""
+    async def call(*args):
+        delay = await bucket.acquire_async()
+        if delay:
+            logging.debug("%s waited %.3fs for the rate limit", name, delay)
+        return await func(*args)
+    return call
@@ -0,0 +1,126 @@
+"""
+Indexed reconciliation of current and desired records.
+"""
+
+
+class Changeset:
+    """Result of reconciling the current records against the desired records.
+    Each of the `adds`, `updates` and `deletes` is a dictionary keyed on the
+    record identity, in the order the records were seen.
+
+    - `adds`: identity => desired record, for records missing in current view
+    - `updates`: identity => (current, desired), for records that have changed
+    - `deletes`: identity => current record, for records no longer desired
+    """
+
+    def __init__(self) -> None:
+        self.adds = {}
+        self.updates = {}
+        self.deletes = {}
+
+    def changes(self):
+        """Return the records that need to be written, as a list of tuples of
+        current and desired record. The current record is None for new records.
+
+        Returns:
+            list[tuple]: list of (current, desired) records
+        """
+        return [(None, record) for record in self.adds.values()] \
+            + list(self.updates.values())
+
+    def __len__(self) -> int:
+        return len(self.adds) + len(self.updates) + len(self.deletes)
+
+    def __bool__(self) -> bool:
+        return bool(self.adds or self.updates or self.deletes)
+
+    def __repr__(self) -> str:
+        return f"Changeset(adds={len(self.adds)}, updates={len(self.updates)},"\
+            f" deletes={len(self.deletes)})"
+
+
+def reconcile(current, desired, key, changed) -> Changeset:
+    """Reconcile the current records against the desired records in a single
+    pass over each list. The current records are indexed on their identity,
+    so the cost is linear in the number of records.
+
+    Args:
+        current (Iterable): records currently present
+        desired (Iterable): records that should be present
+        key (Callable): returns the identity of a record
+        changed (Callable): takes (current, desired) and returns True if the
+                            current record needs to be updated
+
+    Returns:
+        Changeset: adds, updates and deletes
+    """
+    changeset = Changeset()
+    index = {}
+    for record in current:
+        index.setdefault(key(record), record)
+
+    for record in desired:
+        identity = key(record)
+        existing = index.pop(identity, None)
+        if existing is None:
+            changeset.adds[identity] = record
+        elif changed(existing, record):
+            changeset.updates[identity] = (existing, record)
+
+    changeset.deletes = index
+    return changeset
+
+
+def dns_record_key(record):
+    """Identity of a DNS record: the fully qualified domain name"""
+    return record.name
+
+
+def fw_entry_key(entry):
+    """Identity of a firewall entry: the entry id"""
+    return entry.entry_id
+
+
+# prefix of the ids of the firewall entries managed by ipv6ddns
+FW_ENTRY_PREFIX = "ipv6ddns"
+
+
+def fw_entry_id(host_id, protocol, port) -> str:
+    """Stable id of the firewall entry opening a port of a host. The same
+    host, protocol and port always give the same id, so the entries created
+    by previous runs are found again.
+
+    Args:
+        host_id (str): id of the host
+        protocol (Protocol): protocol being allowed
+        port (int): port being allowed
+
+    Returns:
+        str: id of the entry, `ipv6ddns-{host_id}-{protocol}-{port}`
+    """
+    return f"{FW_ENTRY_PREFIX}-{host_id}-{protocol.value}-{port}"
+
+
+def owns_fw_entry(host_id, entry) -> bool:
+    """Whether the firewall entry was created by ipv6ddns for the host.
+    Entries of other hosts, or added by hand, are never updated or deleted.
+
+    Args:
+        host_id (str): id of the host
+        entry (FirewallEntry): entry in the firewall
+
+    Returns:
+        bool: True if the id of the entry is one of the ids of the host
+    """
+    prefix = f"{FW_ENTRY_PREFIX}-{host_id}-"
+    if not entry.entry_id.startswith(prefix):
+        return False
+    protocol, _, port = entry.entry_id[len(prefix):].partition("-")
+    return protocol in ("tcp", "udp") and port.isdigit()
+
+
+def ip_changed(old, new) -> bool:
+    """Returns True if the ip address of the record has changed. The packed
+    addresses are compared, so different spellings of an address are equal.
+    """
+    return old.packed != new.packed
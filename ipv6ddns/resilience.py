@@ -0,0 +1,319 @@
+"""
+Retries and circuit breakers around the plugin calls.
+
+Failed calls are retried with an exponential backoff and full jitter when
+the error is transient: plugins raise RetryableError, or set a `retryable`
+attribute on their exceptions, and timeouts and connection errors are
+retryable by default. Other errors are fatal and raised at once.
+
+Each plugin endpoint has a circuit breaker shared by all the contexts. After
+`threshold` consecutive transient failures the circuit opens, and the calls to
+the endpoint fail at once with CircuitOpenError instead of waiting on a dead
+endpoint, until `reset_timeout` seconds have passed. A single trial call is
+then let through, which closes the circuit again if it succeeds. A trial
+which gets no outcome, because it hangs or is cancelled, is replaced by a new
+one after another `reset_timeout` seconds.
+"""
+import logging
+import random
+import threading
+import time
+
+
+class RetryableError(Exception):
+    """Transient failure of a plugin call, which may succeed if retried"""
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a plugin endpoint whose circuit is open"""
+
+    retryable = False
+
+    def __init__(self, key: str, retry_in: float) -> None:
+        """Constructor
+
+        Args:
+            key (str): key of the circuit
+            retry_in (float): seconds before a call is tried again
+        """
+        super().__init__(f"{key} is failing, calls are suspended for {retry_in:.0f}s")
+        self.key = key
+        self.retry_in = retry_in
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call may succeed if retried
+
+    Args:
+        error (BaseException): error raised by the call
+
+    Returns:
+        bool: the `retryable` attribute of the error when it has one, otherwise True
+              for RetryableError, timeouts and connection errors
+    """
+    retryable = getattr(error, "retryable", None)
+    if retryable is not None:
+        return bool(retryable)
+    return isinstance(error, (RetryableError, TimeoutError, ConnectionError))
+
+
+class RetryPolicy:
+    """Number of retries and backoff between them. The delay before retry n is
+    drawn uniformly between 0 and `base_delay * 2 ** (n - 1)`, capped to
+    `max_delay`, so that contexts failing together do not retry in lock step.
+    """
+
+    def __init__(self, retries: int = 2, base_delay: float = 1.0, max_delay: float = 30.0,
+                 rand=random.random) -> None:
+        """Constructor
+
+        Args:
+            retries (int, optional): retries after the first attempt. Defaults to 2.
+            base_delay (float, optional): seconds of backoff before the first retry.
+                                          Defaults to 1.
+            max_delay (float, optional): upper limit of the backoff. Defaults to 30.
+            rand (Callable[[], float], optional): random number in [0, 1).
+                                                  Defaults to random.random.
+        """
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rand = rand
+
+    def delay(self, retry: int) -> float:
+        """Seconds to wait before a retry
+
+        Args:
+            retry (int): number of the retry, from 1
+
+        Returns:
+            float: backoff delay
+        """
+        return self.rand() * min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+
+
+class CircuitBreaker:
+    """Circuit breaker of one plugin endpoint"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, key: str, threshold: int = 5, reset_timeout: float = 60.0,
+                 clock=time.monotonic) -> None:
+        """Constructor
+
+        Args:
+            key (str): key of the endpoint
+            threshold (int, optional): consecutive failures opening the circuit.
+                                       Defaults to 5.
+            reset_timeout (float, optional): seconds the circuit stays open. Defaults to 60.
+            clock (Callable[[], float], optional): monotonic clock. Defaults to
+                                                   time.monotonic.
+        """
+        self.key = key
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Check that a call can be made
+
+        Raises:
+            CircuitOpenError: when the circuit is open, or its trial call is in flight
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            now = self.clock()
+            since = self.opened_at if self.state == self.OPEN else self.trial_at
+            retry_in = since + self.reset_timeout - now
+            if retry_in <= 0:
+                if self.state == self.HALF_OPEN:
+                    logging.warning("Trial call to %s got no outcome, trying again", self.key)
+                else:
+                    logging.info("Trying %s again", self.key)
+                self.state = self.HALF_OPEN
+                self.trial_at = now
+                return
+            raise CircuitOpenError(self.key, retry_in)
+
+    def record_success(self) -> None:
+        """Record a call that reached the endpoint, closing the circuit"""
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("%s is back, resuming the calls", self.key)
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Record a transient failure, opening the circuit after `threshold`
+        consecutive failures or when the trial call fails
+        """
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.threshold:
+                if self.state != self.OPEN:
+                    logging.warning("%s failed %d times, suspending the calls for %ss",
+                                    self.key, self.failures, self.reset_timeout)
+                self.state = self.OPEN
+                self.opened_at = self.clock()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(key: str, threshold: int, reset_timeout: float,
+                clock=time.monotonic) -> CircuitBreaker:
+    """Return the circuit breaker of an endpoint, shared by all the contexts
+
+    Args:
+        key (str): key of the endpoint
+        threshold (int): consecutive failures opening the circuit
+        reset_timeout (float): seconds the circuit stays open
+        clock (Callable[[], float], optional): clock of a new breaker. Defaults to
+                                               time.monotonic.
+
+    Returns:
+        CircuitBreaker: the circuit breaker
+    """
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(key, threshold, reset_timeout, clock)
+        return breaker
+
+
+def reset_breakers() -> None:
+    """Forget all the circuit breakers"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+class Resilience:
+    """Retry policy and circuit breakers applied to the plugin calls of a
+    workflow
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def __init__(self, policy: RetryPolicy = None, threshold: int = 5,
+                 reset_timeout: float = 60.0, sleep=time.sleep) -> None:
+        """Constructor
+
+        Args:
+            policy (RetryPolicy, optional): retries of the calls. Defaults to RetryPolicy().
+            threshold (int, optional): consecutive failures opening a circuit, 0 disables
+                                       the circuit breakers. Defaults to 5.
+            reset_timeout (float, optional): seconds a circuit stays open. Defaults to 60.
+            sleep (Callable[[float], None], optional): blocking sleep. Defaults to
+                                                       time.sleep.
+        """
+        self.policy = policy or RetryPolicy()
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.sleep = sleep
+
+    @classmethod
+    def from_context(cls, common_ctx):
+        """Create the resilience layer configured by the common context
+
+        Args:
+            common_ctx (CommonContext): common context
+
+        Returns:
+            Resilience: the resilience layer
+        """
+        policy = RetryPolicy(common_ctx.retries, common_ctx.retry_delay,
+                             common_ctx.retry_max_delay)
+        return cls(policy, common_ctx.breaker_threshold, common_ctx.breaker_reset)
+
+    def get_breaker(self, plugin):
+        """Circuit breaker of the endpoint of a plugin, None when disabled"""
+        if not self.threshold:
+            return None
+        return get_breaker(plugin.get_circuit_key(), self.threshold, self.reset_timeout)
+
+    def call(self, plugin, name: str, func, *args):
+        """Call a plugin method, retrying transient failures
+
+        Args:
+            plugin (Plugin): the plugin instance
+            name (str): name of the call, used in logs
+            func (Callable): function making the call
+
+        Raises:
+            CircuitOpenError: when the circuit of the plugin endpoint is open
+
+        Returns:
+            Any: value returned by the call
+        """
+        breaker = self.get_breaker(plugin)
+        retry = 0
+        while True:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = func(*args)
+            # pylint: disable=locally-disabled, broad-exception-caught
+            except Exception as err:
+                retry += 1
+                delay = self._on_failure(breaker, name, err, retry)
+                if delay is None:
+                    raise
+                self.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    async def call_async(self, plugin, name: str, func, *args):
+        """Coroutine version of `call()`, for coroutine functions"""
+        # asyncio is only imported by the async workflow
+        import asyncio  # pylint: disable=locally-disabled, import-outside-toplevel
+        breaker = self.get_breaker(plugin)
+        retry = 0
+        while True:
+            if breaker is not None:
+                breaker.before_call()
+            try:
+                result = await func(*args)
+            except asyncio.CancelledError:
+                # cancelled by the timeout of the call, the endpoint did not answer
+                if breaker is not None:
+                    breaker.record_failure()
+                raise
+            # pylint: disable=locally-disabled, broad-exception-caught
+            except Exception as err:
+                retry += 1
+                delay = self._on_failure(breaker, name, err, retry)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+    def _on_failure(self, breaker, name, err, retry):
+        """Record a failed call and return the delay before the retry, or None
+        if the error should be raised
+        """
+        retryable = is_retryable(err)
+        if breaker is not None:
+            if retryable:
+                breaker.record_failure()
+            else:
+                # the endpoint answered, the request itself is wrong
+                breaker.record_success()
+        if not retryable or retry > self.policy.retries:
+            return None
+        delay = self.policy.delay(retry)
+        logging.warning("%s failed: %s. Retry %d of %d in %.1fs", name, err, retry,
+                        self.policy.retries, delay)
+        return delay
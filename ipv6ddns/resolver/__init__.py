@@ -0,0 +1,3 @@
+"""
+IPV6 resolver plugins which read the addresses of the local interfaces.
+"""
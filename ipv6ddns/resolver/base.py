@@ -0,0 +1,159 @@
+"""
+Interface addresses and the logic to pick the address to publish.
+"""
+import socket
+from ipv6ddns.domain import ValidationError
+from ipv6ddns.plugin import IPResolverPlugin
+
+
+# Address flags, as defined in linux/if_addr.h
+IFA_F_TEMPORARY = 0x01
+IFA_F_DADFAILED = 0x08
+IFA_F_DEPRECATED = 0x20
+IFA_F_TENTATIVE = 0x40
+IFA_F_PERMANENT = 0x80
+
+# Addresses with these flags are never selected
+IFA_F_UNUSABLE = IFA_F_DADFAILED | IFA_F_DEPRECATED | IFA_F_TENTATIVE
+
+# Address scopes, as defined for rtnetlink in linux/rtnetlink.h
+SCOPES = {
+    "global": 0,
+    "site": 200,
+    "link": 253,
+    "host": 254,
+}
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class InterfaceAddress:
+    """IPV6 address assigned to a network interface"""
+
+    __slots__ = ("ifindex", "packed", "prefixlen", "scope", "flags", "ifname")
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def __init__(self, ifindex: int, packed: bytes, prefixlen: int, scope: int, flags: int,
+                 ifname: str = None) -> None:
+        """Constructor
+
+        Args:
+            ifindex (int): index of the interface
+            packed (bytes): 16 byte address in network order
+            prefixlen (int): length of the network prefix
+            scope (int): rtnetlink scope of the address, one of the values in SCOPES
+            flags (int): IFA_F_* flags of the address
+            ifname (str, optional): name of the interface, if known. Defaults to None.
+        """
+        self.ifindex = ifindex
+        self.packed = packed
+        self.prefixlen = prefixlen
+        self.scope = scope
+        self.flags = flags
+        self.ifname = ifname
+
+    @property
+    def text(self) -> str:
+        """Address in text form"""
+        return socket.inet_ntop(socket.AF_INET6, self.packed)
+
+    def __repr__(self) -> str:
+        return f"InterfaceAddress({self.ifindex}, {self.text}/{self.prefixlen},"\
+            f" scope={self.scope}, flags={self.flags:#x}, ifname={self.ifname})"
+
+
+def select_address(addresses, interface=None, scope="global", allow_temporary=False):
+    """Select the address to publish from the addresses of the host.
+
+    Addresses which are tentative, deprecated or failed duplicate address
+    detection are never selected. Temporary (privacy) addresses are only
+    selected when `allow_temporary` is set. Permanent addresses are preferred
+    over addresses with a lifetime, and ties are broken on interface index and
+    address so the same address is selected on every call.
+
+    Args:
+        addresses (Iterable[InterfaceAddress]): addresses of the host
+        interface (str | int, optional): interface name or index to select from.
+                                         Defaults to None, for any interface.
+        scope (str, optional): scope name of the address. Defaults to "global".
+        allow_temporary (bool, optional): allow temporary addresses. Defaults to False.
+
+    Returns:
+        InterfaceAddress | None: the selected address, None if no address matches
+    """
+    excluded = IFA_F_UNUSABLE if allow_temporary else IFA_F_UNUSABLE | IFA_F_TEMPORARY
+    scope_id = SCOPES[scope]
+    best = None
+    best_key = None
+    for address in addresses:
+        if address.scope != scope_id or address.flags & excluded:
+            continue
+        if interface is not None and interface not in (address.ifname, address.ifindex):
+            continue
+        key = (not address.flags & IFA_F_PERMANENT, address.ifindex, address.packed)
+        if best is None or key < best_key:
+            best = address
+            best_key = key
+    return best
+
+
+class InterfaceResolverPlugin(IPResolverPlugin):
+    """Base class for the resolvers that select one of the addresses of the
+    local interfaces. Adds the arguments to filter the addresses.
+    """
+
+    @staticmethod
+    def add_args(argparse_group, prefix):
+        argparse_group.add_argument(
+            f"--{prefix}-interface",
+            action='store',
+            type=str,
+            required=False,
+            help="Name of the interface to take the address from. Defaults to any interface."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-scope",
+            action='store',
+            default="global",
+            choices=list(SCOPES),
+            help="Scope of the address to use. Defaults to global."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-allow-temporary",
+            action='store_true',
+            required=False,
+            help="Allow temporary (privacy extension) addresses. These change often and"\
+                " are not selected by default."
+        )
+
+    @staticmethod
+    def validate(context):
+        scope = getattr(context.ipv6, "scope", "global")
+        if scope not in SCOPES:
+            return [ValidationError(context.ipv6.plugin.get_name(), f"Unknown scope '{scope}'.")]
+        return []
+
+    def select(self, addresses):
+        """Select the address to publish, using the filters from the plugin context
+
+        Args:
+            addresses (Iterable[InterfaceAddress]): addresses of the host
+
+        Returns:
+            InterfaceAddress | None: the selected address, None if no address matches
+        """
+        return select_address(
+            addresses,
+            interface=self.get_interface(),
+            scope=getattr(self.ctx_plugin, "scope", "global"),
+            allow_temporary=getattr(self.ctx_plugin, "allow_temporary", False),
+        )
+
+    def get_interface(self):
+        """Return the interface to filter the addresses on
+
+        Returns:
+            str | int | None: interface name or index, None for any interface
+        """
+        return getattr(self.ctx_plugin, "interface", None)
@@ -0,0 +1,350 @@
+"""
+IPV6 resolver for Linux which reads the interface addresses over rtnetlink.
+When subscribed, the addresses are dumped once and kept up to date from the
+RTM_NEWADDR/RTM_DELADDR notifications of the kernel, so changes of the prefix
+are pushed to ipv6ddns as soon as they happen.
+"""
+import errno
+import logging
+import socket
+import struct
+import threading
+from ipv6ddns.domain import ValidationError
+from ipv6ddns.resolver.base import InterfaceAddress, InterfaceResolverPlugin
+
+
+NETLINK_ROUTE = 0
+RTMGRP_IPV6_IFADDR = 0x100
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+
+NLM_F_REQUEST = 0x01
+NLM_F_MULTI = 0x02
+NLM_F_DUMP = 0x300
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+IFA_FLAGS = 8
+
+NLMSGHDR = struct.Struct("=IHHII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR = struct.Struct("=HH")
+FLAGS = struct.Struct("=I")
+ERROR = struct.Struct("=i")
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def pack_message(msg_type: int, flags: int, seq: int, payload: bytes) -> bytes:
+    """Build a netlink message
+
+    Args:
+        msg_type (int): message type
+        flags (int): NLM_F_* flags
+        seq (int): sequence number
+        payload (bytes): message body
+
+    Returns:
+        bytes: the message with the netlink header
+    """
+    return NLMSGHDR.pack(NLMSGHDR.size + len(payload), msg_type, flags, seq, 0) + payload
+
+
+def pack_address(address: InterfaceAddress) -> bytes:
+    """Build the body of a RTM_NEWADDR/RTM_DELADDR message for an address
+
+    Args:
+        address (InterfaceAddress): the address
+
+    Returns:
+        bytes: ifaddrmsg followed by the address and flags attributes
+    """
+    body = IFADDRMSG.pack(socket.AF_INET6, address.prefixlen, address.flags & 0xff,
+                          address.scope, address.ifindex)
+    for attr_type, value in ((IFA_ADDRESS, address.packed),
+                             (IFA_FLAGS, FLAGS.pack(address.flags))):
+        length = RTATTR.size + len(value)
+        body += RTATTR.pack(length, attr_type) + value + b"\0" * (_align(length) - length)
+    return body
+
+
+def parse_messages(data: bytes):
+    """Split a buffer received from a netlink socket into messages
+
+    Args:
+        data (bytes): received buffer
+
+    Yields:
+        tuple[int, bytes]: message type and body
+    """
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _, _, _ = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield msg_type, data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def parse_address(body: bytes):
+    """Parse the body of a RTM_NEWADDR/RTM_DELADDR message
+
+    Args:
+        body (bytes): message body
+
+    Returns:
+        InterfaceAddress | None: the address, None if it is not an IPV6 address
+    """
+    family, prefixlen, flags, scope, ifindex = IFADDRMSG.unpack_from(body)
+    if family != socket.AF_INET6:
+        return None
+
+    address = None
+    local = None
+    offset = IFADDRMSG.size
+    while offset + RTATTR.size <= len(body):
+        length, attr_type = RTATTR.unpack_from(body, offset)
+        if length < RTATTR.size:
+            break
+        value = body[offset + RTATTR.size:offset + length]
+        if attr_type == IFA_ADDRESS:
+            address = value
+        elif attr_type == IFA_LOCAL:
+            local = value
+        elif attr_type == IFA_FLAGS:
+            flags = FLAGS.unpack(value)[0]
+        offset += _align(length)
+
+    # IFA_LOCAL is the local address on point-to-point links
+    packed = local or address
+    if not packed or len(packed) != 16:
+        return None
+    return InterfaceAddress(ifindex, packed, prefixlen, scope, flags)
+
+
+class NetlinkSource:
+    """Source of rtnetlink messages from the kernel, over an AF_NETLINK socket.
+    """
+
+    def __init__(self) -> None:
+        self.sock = None
+        self.seq = 0
+
+    def open(self, groups: int = 0) -> None:
+        """Open the socket
+
+        Args:
+            groups (int, optional): multicast groups to subscribe to. Defaults to 0.
+        """
+        # pylint: disable=locally-disabled, no-member
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.bind((0, groups))
+
+    def request_dump(self) -> None:
+        """Ask the kernel for all the IPV6 addresses"""
+        self.seq += 1
+        request = IFADDRMSG.pack(socket.AF_INET6, 0, 0, 0, 0)
+        self.sock.send(pack_message(RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, self.seq, request))
+
+    def receive(self, timeout=None):
+        """Receive the next buffer of messages
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to None, wait forever.
+
+        Returns:
+            bytes | None: received buffer, None on timeout
+        """
+        self.sock.settimeout(timeout)
+        try:
+            return self.sock.recv(65536)
+        except socket.timeout:
+            return None
+
+    def close(self) -> None:
+        """Close the socket"""
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+
+class NetlinkResolverPlugin(InterfaceResolverPlugin):
+    """IPV6 resolver which reads the interface addresses over rtnetlink
+    """
+
+    DUMP_TIMEOUT = 5.0
+    POLL_TIMEOUT = 1.0
+
+    def __init__(self, common_ctx, plugin_ctx) -> None:
+        super().__init__(common_ctx, plugin_ctx)
+        self.addresses = {}
+        self._lock = threading.Lock()
+        self._source = None
+        self._thread = None
+        self._callback = None
+        self._closed = False
+
+    @staticmethod
+    def get_name() -> str:
+        return "netlink"
+
+    @staticmethod
+    def get_title() -> str:
+        return "Netlink IPV6 Resolver Plugin"
+
+    @staticmethod
+    def get_description() -> str:
+        return "Resolves the IPV6 address from the addresses of the local interfaces,"\
+            " read over rtnetlink. In watch mode, address changes trigger an update"\
+            " immediately. Linux only."
+
+    @staticmethod
+    def validate(context):
+        errors = InterfaceResolverPlugin.validate(context)
+        if not hasattr(socket, "AF_NETLINK"):
+            errors.append(ValidationError(NetlinkResolverPlugin.get_name(),
+                                          "Netlink is only available on Linux."))
+        return errors
+
+    def create_source(self):
+        """Create the source of the netlink messages
+
+        Returns:
+            NetlinkSource: message source
+        """
+        return NetlinkSource()
+
+    def resolve(self):
+        if not self.listening:
+            source = self.create_source()
+            source.open()
+            try:
+                self._load(source)
+            finally:
+                source.close()
+
+        with self._lock:
+            address = self.select(self.addresses.values())
+        return address.text if address else ""
+
+    def subscribe(self, callback) -> bool:
+        source = self.create_source()
+        # join the multicast group before the dump, so no change is missed
+        source.open(RTMGRP_IPV6_IFADDR)
+        try:
+            self._load(source)
+        except Exception:
+            source.close()
+            raise
+
+        self._source = source
+        self._callback = callback
+        self._thread = threading.Thread(target=self._listen, name="netlink-resolver", daemon=True)
+        self._thread.start()
+        return True
+
+    @property
+    def listening(self) -> bool:
+        """True if the addresses are kept up to date from notifications"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def close(self) -> None:
+        self._closed = True
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        if self._source:
+            self._source.close()
+            self._source = None
+
+    def get_interface(self):
+        interface = super().get_interface()
+        if interface is None or isinstance(interface, int):
+            return interface
+        if interface.isdigit():
+            return int(interface)
+        try:
+            return socket.if_nametoindex(interface)
+        except OSError:
+            logging.warning("Unknown interface '%s'", interface)
+            return interface
+
+    def _load(self, source):
+        """Dump all the addresses from the source and replace the known addresses"""
+        addresses = {}
+        source.request_dump()
+        done = False
+        while not done:
+            data = source.receive(self.DUMP_TIMEOUT)
+            if data is None:
+                raise TimeoutError("Timed out waiting for the netlink address dump")
+            done = self._apply(data, addresses)
+        with self._lock:
+            self.addresses = addresses
+
+    def _apply(self, data, addresses) -> bool:
+        """Apply the messages in the buffer to the addresses.
+
+        Returns:
+            bool: True if the buffer contains the end of a dump
+        """
+        done = False
+        for msg_type, body in parse_messages(data):
+            if msg_type == NLMSG_DONE:
+                done = True
+            elif msg_type == NLMSG_ERROR:
+                error = -ERROR.unpack_from(body)[0]
+                if error:
+                    raise OSError(error, f"netlink: {errno.errorcode.get(error, error)}")
+            elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+                address = parse_address(body)
+                if address is None:
+                    continue
+                key = (address.ifindex, address.packed)
+                if msg_type == RTM_NEWADDR:
+                    addresses[key] = address
+                else:
+                    addresses.pop(key, None)
+        return done
+
+    def _selected(self):
+        with self._lock:
+            address = self.select(self.addresses.values())
+        return address.packed if address else None
+
+    def _listen(self):
+        """Apply the notifications from the kernel and call the callback when
+        the selected address changes.
+        """
+        selected = self._selected()
+        while not self._closed:
+            try:
+                data = self._source.receive(self.POLL_TIMEOUT)
+                if data is None:
+                    continue
+                with self._lock:
+                    self._apply(data, self.addresses)
+            except OSError as err:
+                if self._closed:
+                    break
+                if err.errno != errno.ENOBUFS:
+                    logging.exception("Stopped listening for address changes")
+                    break
+                logging.warning("Lost netlink notifications, reloading the addresses")
+                try:
+                    self._load(self._source)
+                except OSError:
+                    logging.exception("Stopped listening for address changes")
+                    break
+
+            current = self._selected()
+            if current != selected:
+                selected = current
+                logging.info("Selected IPV6 address changed")
+                self._callback()
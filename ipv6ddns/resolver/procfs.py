@@ -0,0 +1,92 @@
+"""
+IPV6 resolver for Linux which reads the interface addresses from
+/proc/net/if_inet6, without spawning any process.
+"""
+import binascii
+import hashlib
+import os
+from ipv6ddns.domain import ValidationError
+from ipv6ddns.resolver.base import InterfaceAddress, InterfaceResolverPlugin, SCOPES
+
+
+# IPV6_ADDR_SCOPE_* values used in /proc/net/if_inet6 to rtnetlink scopes
+PROC_SCOPES = {
+    0x00: SCOPES["global"],
+    0x10: SCOPES["host"],
+    0x20: SCOPES["link"],
+    0x40: SCOPES["site"],
+}
+
+
+def parse_if_inet6(data: bytes):
+    """Parse the contents of /proc/net/if_inet6. Each line has the address in
+    hex, interface index, prefix length, scope and flags in hex, followed by
+    the interface name.
+
+    Args:
+        data (bytes): contents of the file
+
+    Returns:
+        list[InterfaceAddress]: addresses in the file
+    """
+    addresses = []
+    for line in data.splitlines():
+        fields = line.split()
+        if len(fields) != 6 or len(fields[0]) != 32:
+            continue
+        addresses.append(InterfaceAddress(
+            int(fields[1], 16),
+            binascii.unhexlify(fields[0]),
+            int(fields[2], 16),
+            PROC_SCOPES.get(int(fields[3], 16), -1),
+            int(fields[4], 16),
+            fields[5].decode(),
+        ))
+    return addresses
+
+
+class ProcfsResolverPlugin(InterfaceResolverPlugin):
+    """IPV6 resolver which reads the interface addresses from /proc/net/if_inet6.
+    The selected address is cached until the contents of the file change.
+    """
+
+    PROC_PATH = "/proc/net/if_inet6"
+
+    def __init__(self, common_ctx, plugin_ctx) -> None:
+        super().__init__(common_ctx, plugin_ctx)
+        self._digest = None
+        self._selected = ""
+
+    @staticmethod
+    def get_name() -> str:
+        return "procfs"
+
+    @staticmethod
+    def get_title() -> str:
+        return "procfs IPV6 Resolver Plugin"
+
+    @staticmethod
+    def get_description() -> str:
+        return "Resolves the IPV6 address from the addresses of the local interfaces,"\
+            f" read from {ProcfsResolverPlugin.PROC_PATH}. Linux only."
+
+    @staticmethod
+    def validate(context):
+        errors = InterfaceResolverPlugin.validate(context)
+        if not os.path.exists(ProcfsResolverPlugin.PROC_PATH):
+            errors.append(ValidationError(
+                ProcfsResolverPlugin.get_name(),
+                f"{ProcfsResolverPlugin.PROC_PATH} not found. Is IPV6 enabled?"
+            ))
+        return errors
+
+    def resolve(self):
+        with open(self.PROC_PATH, "rb") as file:
+            data = file.read()
+
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        if digest != self._digest:
+            address = self.select(parse_if_inet6(data))
+            self._selected = address.text if address else ""
+            self._digest = digest
+        return self._selected
@@ -0,0 +1,223 @@
+"""
+Execution of the DDNS workflow over many contexts.
+"""
+import contextvars
+import logging
+import queue
+import threading
+import time
+from ipv6ddns.ddns import DDNSWorkflow
+
+
+EXIT_FAILED = 1
+EXIT_DEADLINE = 5
+
+# run of the context being executed by the current thread or asyncio task
+current_run = contextvars.ContextVar("current_run", default=None)
+
+
+class ContextRun:
+    """State of the run of one context in the worker pool"""
+
+    def __init__(self, ctx) -> None:
+        self.ctx = ctx
+        self.started = threading.Event()
+        self.completed = threading.Event()
+        self.start_time = None
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        self.abandoned = False
+        self.records = []
+        self.buffering = True
+        self.lock = threading.Lock()
+
+
+class LogCollector(logging.Handler):
+    """Root logging handler which holds back the records logged while a
+    context runs in a worker thread or asyncio task, so they can be written
+    out in the order of the contexts. Other records are passed to the
+    original handlers.
+    """
+
+    def __init__(self, handlers) -> None:
+        super().__init__()
+        self.handlers = handlers
+
+    def install(self):
+        """Replace the root logging handlers with the collector"""
+        logging.getLogger().handlers = [self]
+
+    def uninstall(self):
+        """Restore the original root logging handlers"""
+        logging.getLogger().handlers = self.handlers
+
+    def emit(self, record):
+        run = current_run.get()
+        if run is not None:
+            with run.lock:
+                if run.buffering:
+                    run.records.append(record)
+                    return
+        self.forward(record)
+
+    def flush_run(self, run):
+        """Stop holding back the records of a run and write out the records
+        held back so far.
+
+        Args:
+            run (ContextRun): the run
+        """
+        with run.lock:
+            run.buffering = False
+        for record in run.records:
+            self.forward(record)
+
+    def forward(self, record):
+        """Pass the record to the original handlers"""
+        handlers = self.handlers
+        if not handlers and logging.lastResort:
+            handlers = [logging.lastResort]
+        for handler in handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+
+class ContextRunner:
+    """Runs the DDNS workflow for each context. With more than one job the
+    contexts run on a bounded pool of worker threads. The log output of each
+    context is held back and written in the order of the contexts, so the
+    output reads the same as a serial run.
+
+    A context which passes its deadline is abandoned: its worker is replaced
+    by a new one, so the contexts queued behind it still start, and exits once
+    the abandoned run returns. Contexts which can not start before the end of
+    the schedule, `deadline` seconds for each round of `jobs` contexts, fail
+    with EXIT_DEADLINE without running.
+    """
+
+    def __init__(self, jobs: int = 1, deadline: float = None, workflow=DDNSWorkflow) -> None:
+        """Constructor
+
+        Args:
+            jobs (int, optional): number of contexts to run at the same time. Defaults to 1.
+            deadline (float, optional): seconds each context is given to complete.
+                                        Defaults to None, no limit.
+            workflow (type, optional): workflow class. Defaults to DDNSWorkflow.
+        """
+        self.jobs = jobs
+        self.deadline = deadline
+        self.workflow = workflow
+
+    def run(self, contexts):
+        """Run the workflow for the contexts.
+
+        Args:
+            contexts (list[DDNSContext]): execution contexts
+
+        Returns:
+            list[int]: return code of each context, in the order of the contexts
+        """
+        if self.jobs <= 1 and self.deadline is None:
+            results = []
+            for ctx in contexts:
+                try:
+                    results.append(self.run_context(ctx))
+                # pylint: disable=locally-disabled, broad-exception-caught
+                except Exception as err:
+                    logging.error("Run of %s failed", ctx.ctx_id, exc_info=err)
+                    results.append(EXIT_FAILED)
+            return results
+
+        collector = LogCollector(logging.getLogger().handlers[:])
+        collector.install()
+        try:
+            runs = [ContextRun(ctx) for ctx in contexts]
+            pending = queue.Queue()
+            for run in runs:
+                pending.put(run)
+            jobs = min(max(self.jobs, 1), len(runs))
+            schedule_end = None
+            if self.deadline is not None:
+                rounds = -(-len(runs) // jobs)
+                schedule_end = time.monotonic() + self.deadline * rounds
+            for i in range(jobs):
+                self._start_worker(pending, i)
+            return [self._wait(run, collector, pending, schedule_end) for run in runs]
+        finally:
+            collector.uninstall()
+
+    def run_context(self, ctx):
+        """Run the workflow for one context and close its plugins
+
+        Args:
+            ctx (DDNSContext): execution context
+
+        Returns:
+            int: return code of the run
+        """
+        workflow = self.workflow(ctx)
+        try:
+            return workflow.run()
+        finally:
+            workflow.close()
+
+    def _start_worker(self, pending, number):
+        threading.Thread(target=self._work, args=(pending,),
+                         name=f"ipv6ddns-worker-{number}", daemon=True).start()
+
+    def _work(self, pending):
+        while True:
+            try:
+                run = pending.get_nowait()
+            except queue.Empty:
+                return
+            with run.lock:
+                if run.cancelled:
+                    continue
+                run.start_time = time.monotonic()
+                run.started.set()
+            current_run.set(run)
+            try:
+                run.result = self.run_context(run.ctx)
+            # pylint: disable=locally-disabled, broad-exception-caught
+            except Exception as err:
+                run.error = err
+                logging.error("Run of %s failed", run.ctx.ctx_id, exc_info=err)
+            finally:
+                with run.lock:
+                    run.completed.set()
+                    replaced = run.abandoned
+                current_run.set(None)
+            if replaced:
+                # another worker took over when the run passed its deadline
+                return
+
+    def _wait(self, run, collector, pending, schedule_end):
+        """Wait for a context to complete, write out its logs and return its code"""
+        started = run.started.wait(
+            None if schedule_end is None else max(schedule_end - time.monotonic(), 0))
+        if not started:
+            with run.lock:
+                run.cancelled = not run.started.is_set()
+            if run.cancelled:
+                logging.error("Run of %s did not start within the deadline of the runs",
+                              run.ctx.ctx_id)
+                return EXIT_DEADLINE
+        timeout = None
+        if self.deadline is not None:
+            timeout = max(run.start_time + self.deadline - time.monotonic(), 0)
+        completed = run.completed.wait(timeout)
+
+        collector.flush_run(run)
+
+        if not completed:
+            with run.lock:
+                run.abandoned = not run.completed.is_set()
+            if run.abandoned:
+                self._start_worker(pending, f"{run.ctx.ctx_id}-replacement")
+            logging.error("Run of %s did not complete within %ss", run.ctx.ctx_id, self.deadline)
+            return EXIT_DEADLINE
+        if run.error is not None:
+            return EXIT_FAILED
+        return run.result
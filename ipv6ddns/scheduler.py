@@ -0,0 +1,177 @@
+"""
+Scheduler for running DDNS workflows repeatedly in daemon mode.
+"""
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class Job:
+    """A unit of work that is run by the scheduler every `interval` seconds.
+    The `func` is called without arguments and should return 0 on success.
+    A non-zero return value or an exception is treated as a failure.
+    """
+
+    def __init__(self, name: str, func, interval: float) -> None:
+        """Constructor
+
+        Args:
+            name (str): name of the job, used for logging
+            func (Callable[[], int]): the function to run
+            interval (float): seconds between two successful runs
+        """
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.failures = 0
+        self.runs = 0
+        self.next_run = None
+        self.seq = None
+
+    def __repr__(self) -> str:
+        return f"Job(name={self.name}, interval={self.interval}, failures={self.failures})"
+
+
+class Scheduler:
+    """Priority queue based scheduler. Jobs are kept in a heap ordered on their
+    next due time, and the scheduler sleeps until the earliest job is due or
+    until it is woken up by `trigger()` or `stop()`.
+
+    After a successful run a job is rescheduled after its interval. After a
+    failure the delay is doubled for each consecutive failure, up to
+    `max_backoff`. A random jitter of up to `jitter` times the delay is added
+    so that jobs with the same interval do not run in lock step.
+    """
+
+    # pylint: disable=locally-disabled, too-many-arguments
+    def __init__(self,
+                 jitter: float = 0.1,
+                 max_backoff: float = 3600.0,
+                 clock=time.monotonic,
+                 rand=random.random) -> None:
+        self.jitter = jitter
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.rand = rand
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+
+    def add(self, job: Job, delay: float = 0.0) -> None:
+        """Add a job to the scheduler
+
+        Args:
+            job (Job): job to schedule
+            delay (float, optional): seconds from now to the first run. Defaults to 0.
+        """
+        with self._lock:
+            self._push(job, self.clock() + delay)
+        self._wakeup.set()
+
+    def trigger(self, job: Job) -> None:
+        """Run the job as soon as possible, instead of waiting for its next
+        due time. Safe to call from other threads.
+
+        Args:
+            job (Job): a job previously added to the scheduler
+        """
+        logging.debug("Triggered %s", job)
+        self.add(job)
+
+    def stop(self) -> None:
+        """Stop the scheduler. Safe to call from other threads and signal handlers.
+        """
+        self._stopped = True
+        self._wakeup.set()
+
+    @property
+    def stopped(self) -> bool:
+        """True if the scheduler has been stopped"""
+        return self._stopped
+
+    def run(self) -> None:
+        """Run the scheduled jobs until `stop()` is called. Sleeps between the runs.
+        """
+        while not self._stopped:
+            delay = self.run_pending()
+            if self._stopped:
+                break
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def run_pending(self):
+        """Run all the jobs that are due and reschedule them.
+
+        Returns:
+            float | None: seconds until the next job is due, None if there are no jobs
+        """
+        while not self._stopped:
+            job = self._pop_due()
+            if job is None:
+                break
+            self._run_job(job)
+
+        with self._lock:
+            # drop entries superseded by an earlier trigger()
+            while self._heap and self._heap[0][1] != self._heap[0][2].seq:
+                heapq.heappop(self._heap)
+            if not self._heap:
+                return None
+            return max(self._heap[0][0] - self.clock(), 0.0)
+
+    def next_delay(self, job: Job) -> float:
+        """Return the delay before the next run of a job, based on its interval
+        and the number of consecutive failures.
+
+        Args:
+            job (Job): the job that just ran
+
+        Returns:
+            float: delay in seconds
+        """
+        delay = job.interval
+        if job.failures:
+            delay = min(job.interval * 2 ** job.failures, max(self.max_backoff, job.interval))
+        return delay + delay * self.jitter * self.rand()
+
+    def _run_job(self, job: Job) -> None:
+        job.runs += 1
+        try:
+            failed = bool(job.func())
+        # pylint: disable=locally-disabled, broad-exception-caught
+        except Exception:
+            logging.exception("Run of %s failed", job.name)
+            failed = True
+
+        job.failures = job.failures + 1 if failed else 0
+        delay = self.next_delay(job)
+        if failed:
+            logging.warning("Run of %s failed %d time(s) in a row, retrying in %.0fs",
+                            job.name, job.failures, delay)
+        with self._lock:
+            # a trigger() during the run has already rescheduled the job
+            if job.next_run is None:
+                self._push(job, self.clock() + delay)
+
+    def _push(self, job: Job, due: float) -> None:
+        if job.next_run is not None and job.next_run <= due:
+            return
+        job.next_run = due
+        job.seq = next(self._seq)
+        heapq.heappush(self._heap, (due, job.seq, job))
+
+    def _pop_due(self):
+        with self._lock:
+            while self._heap and self._heap[0][0] <= self.clock():
+                _, seq, job = heapq.heappop(self._heap)
+                # skip entries superseded by an earlier trigger()
+                if seq == job.seq:
+                    job.next_run = None
+                    return job
+        return None
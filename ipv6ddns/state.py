@@ -0,0 +1,108 @@
+"""
+Persistent state of the last successful run of each context, used to skip
+the remote reads and writes when nothing has changed since.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+
+def fingerprint(ctx, ip_addr: str) -> str:
+    """Fingerprint of the state applied by a run: the ip address, the FQDNs,
+    the ports and the plugins used.
+
+    Args:
+        ctx (DDNSContext): execution context
+        ip_addr (str): ip address of the host
+
+    Returns:
+        str: hex digest of the state
+    """
+    state = {
+        "ip": ip_addr,
+        "fqdns": sorted(ctx.dns.fqdns or []),
+        "tcp_ports": sorted(ctx.firewall.tcp_ports or []),
+        "udp_ports": sorted(ctx.firewall.udp_ports or []),
+        "host_id": getattr(ctx.firewall, "host_id", None),
+        "plugins": [ctx.dns.plugin.get_name(), ctx.firewall.plugin.get_name(),
+                    ctx.ipv6.plugin.get_name()],
+    }
+    data = json.dumps(state, sort_keys=True).encode()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class StateStore:
+    """JSON file holding the fingerprint and time of the last successful run
+    of each context, keyed on the context id. Writes replace the file
+    atomically, so a crash never leaves a partial file behind.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, path: str, clock=time.time) -> None:
+        """Constructor
+
+        Args:
+            path (str): path of the state file
+            clock (Callable[[], float], optional): current time. Defaults to time.time.
+        """
+        self.path = path
+        self.clock = clock
+
+    def load(self):
+        """Load the state of all the contexts
+
+        Returns:
+            dict: context id => {"fingerprint": str, "time": float}
+        """
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                state = json.load(file)
+            return state if isinstance(state, dict) else {}
+        except (OSError, ValueError):
+            return {}
+
+    def is_current(self, ctx_id: str, digest: str, max_age: float) -> bool:
+        """Whether the last successful run of the context applied the same
+        state, recently enough to be trusted without verifying it.
+
+        Args:
+            ctx_id (str): context id
+            digest (str): fingerprint of the state
+            max_age (float): seconds after which the state is verified again.
+                             0 or None always verifies.
+
+        Returns:
+            bool: True if the remote state can be assumed up to date
+        """
+        if not max_age:
+            return False
+        entry = self.load().get(ctx_id)
+        if not isinstance(entry, dict) or entry.get("fingerprint") != digest:
+            return False
+        return self.clock() - entry.get("time", 0) <= max_age
+
+    def save(self, ctx_id: str, digest: str):
+        """Record a successful run of the context
+
+        Args:
+            ctx_id (str): context id
+            digest (str): fingerprint of the applied state
+        """
+        with self._lock:
+            state = self.load()
+            state[ctx_id] = {"fingerprint": digest, "time": self.clock()}
+            directory = os.path.dirname(self.path) or "."
+            # only needed when the state changes, kept off the no-op path
+            import tempfile  # pylint: disable=locally-disabled, import-outside-toplevel
+            try:
+                os.makedirs(directory, exist_ok=True)
+                handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".state-")
+                with os.fdopen(handle, "w", encoding="utf-8") as file:
+                    json.dump(state, file, sort_keys=True)
+                os.replace(tmp_path, self.path)
+            except OSError as err:
+                logging.warning("Could not write the state file %s: %s", self.path, err)
@@ -0,0 +1,122 @@
+"""
+Helpers to run blocking plugin calls concurrently.
+
+Calls run in daemon threads, so a call that hangs past its timeout does not
+keep the process alive once ipv6ddns is done.
+"""
+import queue
+import threading
+import time
+from collections.abc import Coroutine
+
+
+def invoke(func, *args):
+    """Call a plugin method from blocking code. The coroutines returned by the
+    methods of async plugins are run to completion on a new event loop.
+
+    Args:
+        func (Callable): plugin method
+
+    Returns:
+        Any: value returned by the method
+    """
+    result = func(*args)
+    if isinstance(result, Coroutine):
+        import asyncio  # pylint: disable=locally-disabled, import-outside-toplevel
+        return asyncio.run(result)
+    return result
+
+
+class Task:
+    """A call running in its own daemon thread"""
+
+    def __init__(self, name: str, func, done: queue.Queue = None) -> None:
+        """Constructor
+
+        Args:
+            name (str): name of the call, used in errors
+            func (Callable[[], Any]): the call
+            done (queue.Queue, optional): queue the task is put on once completed.
+                                          Defaults to None.
+        """
+        self.name = name
+        self.func = func
+        self.result = None
+        self.error = None
+        self._done = done
+        self._completed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ipv6ddns-{name}", daemon=True)
+
+    def start(self):
+        """Start the call
+
+        Returns:
+            Task: self
+        """
+        self._thread.start()
+        return self
+
+    @property
+    def completed(self) -> bool:
+        """True if the call has returned or raised"""
+        return self._completed.is_set()
+
+    def wait(self, timeout=None):
+        """Wait for the call and return its result, or raise its exception.
+
+        Args:
+            timeout (float, optional): seconds to wait. Defaults to None, wait forever.
+
+        Raises:
+            TimeoutError: when the call does not complete in time
+
+        Returns:
+            Any: value returned by the call
+        """
+        if not self._completed.wait(timeout):
+            raise TimeoutError(f"{self.name} did not complete within {timeout}s")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _run(self):
+        try:
+            self.result = self.func()
+        # pylint: disable=locally-disabled, broad-exception-caught
+        except BaseException as err:
+            self.error = err
+        finally:
+            self._completed.set()
+            if self._done is not None:
+                self._done.put(self)
+
+
+def gather(calls, timeout=None):
+    """Run the calls concurrently and return their results, in the order of
+    the calls. If a call raises, its exception is raised as soon as it is
+    known, without waiting for the other calls.
+
+    Args:
+        calls (list[tuple[str, Callable[[], Any]]]): names and calls
+        timeout (float, optional): seconds each call is given to complete.
+                                   Defaults to None, no limit.
+
+    Raises:
+        TimeoutError: when a call does not complete in time
+
+    Returns:
+        list: results of the calls
+    """
+    done = queue.Queue()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    tasks = [Task(name, func, done).start() for name, func in calls]
+    for _ in tasks:
+        remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+        try:
+            task = done.get(timeout=remaining)
+        except queue.Empty:
+            pending = ", ".join(task.name for task in tasks if not task.completed)
+            raise TimeoutError(f"{pending} did not complete within {timeout}s") from None
+        if task.error is not None:
+            raise task.error
+    return [task.result for task in tasks]
@@ -0,0 +1,376 @@
+"""
+Minimal client for the Amazon Route53 REST API, built on the standard library.
+Requests are signed with AWS Signature Version 4 and sent over a pool of
+persistent keep-alive connections.
+"""
+import datetime
+import hashlib
+import hmac
+import http.client
+import queue
+import re
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+
+API_VERSION = "2013-04-01"
+XMLNS = f"https://route53.amazonaws.com/doc/{API_VERSION}/"
+
+# an UPSERT counts as two changes against the limit of 1000 changes per batch
+MAX_UPSERTS_PER_BATCH = 500
+# maximum page size of ListResourceRecordSets and ListHostedZones
+MAX_ITEMS = 300
+
+
+# error codes returned when requests are throttled or conflict with a pending change
+RETRYABLE_CODES = ("Throttling", "ThrottlingException", "PriorRequestNotComplete")
+
+
+class Route53Error(Exception):
+    """Error returned by the Route53 API"""
+
+    def __init__(self, status: int, code: str, message: str) -> None:
+        super().__init__(f"{code}: {message} (HTTP {status})")
+        self.status = status
+        self.code = code
+        self.message = message
+
+    @property
+    def retryable(self) -> bool:
+        """Whether the request may succeed if retried: server errors and throttling"""
+        return self.status >= 500 or self.code in RETRYABLE_CODES
+
+
+# pylint: disable=locally-disabled, too-few-public-methods
+class Credentials:
+    """AWS credentials used to sign the requests"""
+
+    def __init__(self, access_key_id: str, secret_access_key: str,
+                 session_token: str = None) -> None:
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.session_token = session_token
+
+
+def _hmac(key: bytes, msg: str) -> bytes:
+    return hmac.new(key, msg.encode(), hashlib.sha256).digest()
+
+
+def _quote(value: str) -> str:
+    return urllib.parse.quote(value, safe="-_.~")
+
+
+# pylint: disable=locally-disabled, too-many-arguments, too-many-locals
+def sign(method: str, path: str, query: dict, headers: dict, body: bytes,
+         credentials: Credentials, region: str, service: str, amz_date: str) -> str:
+    """Compute the AWS Signature Version 4 Authorization header of a request.
+    All the `headers` are signed, they must include the host and x-amz-date.
+
+    Args:
+        method (str): HTTP method
+        path (str): request path
+        query (dict): query parameters
+        headers (dict): headers to sign
+        body (bytes): request payload
+        credentials (Credentials): credentials to sign with
+        region (str): AWS region
+        service (str): AWS service name
+        amz_date (str): request time, as in the x-amz-date header
+
+    Returns:
+        str: value of the Authorization header
+    """
+    canonical_headers = {name.lower(): " ".join(str(value).split())
+                         for name, value in headers.items()}
+    signed_headers = ";".join(sorted(canonical_headers))
+    canonical_request = "\n".join([
+        method,
+        urllib.parse.quote(path, safe="/-_.~"),
+        "&".join(f"{_quote(key)}={_quote(str(value))}"
+                 for key, value in sorted(query.items())),
+        "".join(f"{name}:{canonical_headers[name]}\n" for name in sorted(canonical_headers)),
+        signed_headers,
+        hashlib.sha256(body).hexdigest(),
+    ])
+
+    scope = f"{amz_date[:8]}/{region}/{service}/aws4_request"
+    string_to_sign = "\n".join([
+        "AWS4-HMAC-SHA256",
+        amz_date,
+        scope,
+        hashlib.sha256(canonical_request.encode()).hexdigest(),
+    ])
+
+    key = ("AWS4" + credentials.secret_access_key).encode()
+    for part in (amz_date[:8], region, service, "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+    return f"AWS4-HMAC-SHA256 Credential={credentials.access_key_id}/{scope},"\
+        f" SignedHeaders={signed_headers}, Signature={signature}"
+
+
+class ConnectionPool:
+    """Pool of persistent HTTP(S) connections to one endpoint. At most `size`
+    connections are open at the same time, idle connections are reused by the
+    next request.
+    """
+
+    def __init__(self, endpoint: str, size: int = 4, timeout: float = 30) -> None:
+        """Constructor
+
+        Args:
+            endpoint (str): base url, http:// or https://
+            size (int, optional): maximum number of connections. Defaults to 4.
+            timeout (float, optional): socket timeout in seconds. Defaults to 30.
+        """
+        url = urllib.parse.urlsplit(endpoint)
+        if url.scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported endpoint '{endpoint}'")
+        self.scheme = url.scheme
+        self.host = url.netloc
+        self.timeout = timeout
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def request(self, method: str, path: str, body: bytes = b"", headers: dict = None):
+        """Send a request and read the response
+
+        Args:
+            method (str): HTTP method
+            path (str): path and query string
+            body (bytes, optional): payload. Defaults to b"".
+            headers (dict, optional): request headers. Defaults to None.
+
+        Returns:
+            tuple[int, bytes]: status and body of the response
+        """
+        with self._slots:
+            conn, reused = self._acquire()
+            try:
+                try:
+                    response = self._send(conn, method, path, body, headers)
+                except (http.client.RemoteDisconnected, ConnectionError):
+                    # the server may have closed an idle connection, retry once
+                    # on a new connection
+                    if not reused:
+                        raise
+                    conn.close()
+                    conn = self._connect()
+                    response = self._send(conn, method, path, body, headers)
+                data = response.read()
+            except BaseException:
+                conn.close()
+                raise
+
+            if response.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+            return response.status, data
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def _connect(self):
+        self.created += 1
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, timeout=self.timeout)
+        return http.client.HTTPConnection(self.host, timeout=self.timeout)
+
+    @staticmethod
+    def _send(conn, method, path, body, headers):
+        conn.request(method, path, body=body or None, headers=headers or {})
+        return conn.getresponse()
+
+
+def _text(element, path, default=None):
+    child = element.find(path, {"r": XMLNS})
+    return default if child is None else child.text
+
+
+def normalize_name(name: str) -> str:
+    """Convert a domain name returned by Route53 to the form used by
+    ipv6ddns: lower case, without the trailing dot and with the octal escapes
+    (like \\052 for *) decoded.
+
+    Args:
+        name (str): name as returned by Route53
+
+    Returns:
+        str: normalized name
+    """
+    name = re.sub(r"\\([0-7]{3})", lambda match: chr(int(match.group(1), 8)), name)
+    return name.rstrip(".").lower()
+
+
+def record_order(name: str) -> tuple:
+    """Sort key of a normalized name in the order Route53 lists the record
+    sets: by labels from the right, like com.example.www for www.example.com
+
+    Args:
+        name (str): normalized name
+
+    Returns:
+        tuple[str, ...]: labels of the name from the right
+    """
+    return tuple(reversed(name.split(".")))
+
+
+class Route53Client:
+    """Client for the hosted zone and record set operations of Route53"""
+
+    def __init__(self, pool: ConnectionPool, credentials: Credentials,
+                 region: str = "us-east-1", bucket=None) -> None:
+        """Constructor
+
+        Args:
+            pool (ConnectionPool): connections to the Route53 endpoint
+            credentials (Credentials): AWS credentials
+            region (str, optional): signing region. Defaults to "us-east-1".
+            bucket (TokenBucket, optional): rate limit of the requests, a token is
+                                            taken for each request. Defaults to None.
+        """
+        self.pool = pool
+        self.credentials = credentials
+        self.region = region
+        self.bucket = bucket
+
+    def list_hosted_zones(self):
+        """List the public hosted zones, following the pagination
+
+        Yields:
+            tuple[str, str]: id and normalized name of each zone
+        """
+        query = {"maxitems": MAX_ITEMS}
+        while True:
+            root = self.call("GET", f"/{API_VERSION}/hostedzone", query)
+            for zone in root.iterfind("r:HostedZones/r:HostedZone", {"r": XMLNS}):
+                if _text(zone, "r:Config/r:PrivateZone") == "true":
+                    continue
+                zone_id = _text(zone, "r:Id").rsplit("/", 1)[-1]
+                yield zone_id, normalize_name(_text(zone, "r:Name"))
+            if _text(root, "r:IsTruncated") != "true":
+                return
+            query["marker"] = _text(root, "r:NextMarker")
+
+    def list_resource_record_sets(self, zone_id: str, start_name: str = None,
+                                  start_type: str = None):
+        """List the record sets of a zone, following the pagination
+
+        Args:
+            zone_id (str): id of the hosted zone
+            start_name (str, optional): name to start listing from. Defaults to None.
+            start_type (str, optional): type to start listing from. Defaults to None.
+
+        Yields:
+            tuple[str, str, int, list[str]]: normalized name, type, ttl and values
+                                             of each record set
+        """
+        query = {"maxitems": MAX_ITEMS}
+        if start_name:
+            query["name"] = start_name
+            if start_type:
+                query["type"] = start_type
+        while True:
+            root = self.call("GET", f"/{API_VERSION}/hostedzone/{zone_id}/rrset", query)
+            for rrset in root.iterfind("r:ResourceRecordSets/r:ResourceRecordSet", {"r": XMLNS}):
+                values = [value.text for value in rrset.iterfind(
+                    "r:ResourceRecords/r:ResourceRecord/r:Value", {"r": XMLNS})]
+                yield (
+                    normalize_name(_text(rrset, "r:Name")),
+                    _text(rrset, "r:Type"),
+                    int(_text(rrset, "r:TTL", "0")),
+                    values,
+                )
+            if _text(root, "r:IsTruncated") != "true":
+                return
+            query = {"maxitems": MAX_ITEMS, "name": _text(root, "r:NextRecordName"),
+                     "type": _text(root, "r:NextRecordType")}
+            identifier = _text(root, "r:NextRecordIdentifier")
+            if identifier:
+                query["identifier"] = identifier
+
+    def upsert_aaaa_records(self, zone_id: str, records, comment: str = "ipv6ddns"):
+        """Create or update AAAA records in one ChangeResourceRecordSets batch.
+        The caller keeps the batch within MAX_UPSERTS_PER_BATCH records.
+
+        Args:
+            zone_id (str): id of the hosted zone
+            records (list[ZoneRecord]): records to write
+            comment (str, optional): comment of the change. Defaults to "ipv6ddns".
+
+        Returns:
+            str: id of the change
+        """
+        root = ET.Element("ChangeResourceRecordSetsRequest", xmlns=XMLNS)
+        batch = ET.SubElement(root, "ChangeBatch")
+        ET.SubElement(batch, "Comment").text = comment
+        changes = ET.SubElement(batch, "Changes")
+        for record in records:
+            change = ET.SubElement(changes, "Change")
+            ET.SubElement(change, "Action").text = "UPSERT"
+            rrset = ET.SubElement(change, "ResourceRecordSet")
+            ET.SubElement(rrset, "Name").text = record.name
+            ET.SubElement(rrset, "Type").text = "AAAA"
+            ET.SubElement(rrset, "TTL").text = str(record.ttl)
+            values = ET.SubElement(rrset, "ResourceRecords")
+            ET.SubElement(ET.SubElement(values, "ResourceRecord"), "Value").text = record.ip_addr
+
+        body = ET.tostring(root, encoding="utf-8", xml_declaration=True)
+        response = self.call("POST", f"/{API_VERSION}/hostedzone/{zone_id}/rrset", body=body)
+        return _text(response, "r:ChangeInfo/r:Id")
+
+    def call(self, method: str, path: str, query: dict = None, body: bytes = b""):
+        """Send a signed request and parse the XML response
+
+        Args:
+            method (str): HTTP method
+            path (str): request path
+            query (dict, optional): query parameters. Defaults to None.
+            body (bytes, optional): XML payload. Defaults to b"".
+
+        Raises:
+            Route53Error: when the API returns an error
+
+        Returns:
+            xml.etree.ElementTree.Element: root element of the response
+        """
+        query = query or {}
+        if self.bucket is not None:
+            # before signing, so the request date is not behind after waiting
+            self.bucket.acquire()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        headers = {"Host": self.pool.host, "X-Amz-Date": now.strftime("%Y%m%dT%H%M%SZ")}
+        if self.credentials.session_token:
+            headers["X-Amz-Security-Token"] = self.credentials.session_token
+        headers["Authorization"] = sign(method, path, query, headers, body, self.credentials,
+                                        self.region, "route53", headers["X-Amz-Date"])
+        if body:
+            headers["Content-Type"] = "application/xml"
+
+        if query:
+            path += "?" + urllib.parse.urlencode(sorted(query.items()),
+                                                 quote_via=urllib.parse.quote)
+        status, data = self.pool.request(method, path, body, headers)
+        try:
+            root = ET.fromstring(data)
+        except ET.ParseError:
+            root = ET.Element("Empty")
+        if status >= 400:
+            raise Route53Error(status, _text(root, "r:Error/r:Code", str(status)),
+                               _text(root, "r:Error/r:Message", ""))
+        return root
@@ -1,13 +1,38 @@
 """
 Route53 integration for ipv6ddns
 """
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ipv6ddns.domain import ValidationError, ZoneRecord
 from ipv6ddns.plugin import DNSPlugin
+from ipv6ddns.ratelimit import RateLimit, get_bucket
+from ipv6ddns_dns_route53.client import ConnectionPool, Credentials, Route53Client, \
+    Route53Error, MAX_UPSERTS_PER_BATCH, normalize_name, record_order
+from ipv6ddns_dns_route53.zones import ZoneCache, ZoneTrie, default_cache_path
 
 
 class Route53DNSPlugin(DNSPlugin):
-    """DNS plugin for Amazon Route53
+    """DNS plugin for Amazon Route53. The records are read and written over a
+    pool of keep-alive HTTPS connections, with the hosted zones processed
+    concurrently. The hosted zones are cached on disk, and dropped from the
+    cache when Route53 reports one of them as unknown.
     """
 
+    DEFAULT_ENDPOINT = "https://route53.amazonaws.com"
+    DEFAULT_ZONE_CACHE_TTL = 3600
+    # Route53 allows 5 requests per second per account
+    DEFAULT_RATE_LIMIT = 5
+
+    def __init__(self, common_ctx, plugin_ctx) -> None:
+        super().__init__(common_ctx, plugin_ctx)
+        self._client = None
+        self._trie = None
+        self._trie_time = 0
+        self._lock = threading.Lock()
+        self._zones_lock = threading.Lock()
+
     @staticmethod
     def get_name():
         return "route53"
@@ -21,3 +46,276 @@ class Route53DNSPlugin(DNSPlugin):
         return """DNS plugin with support for Amazon Route53
         for ipv6ddns.
         """
+
+    @staticmethod
+    def add_args(argparse_group, prefix):
+        argparse_group.add_argument(
+            f"--{prefix}-access-key-id",
+            action='store',
+            default=os.environ.get("AWS_ACCESS_KEY_ID"),
+            help="AWS access key id. Defaults to the AWS_ACCESS_KEY_ID environment variable."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-secret-access-key",
+            action='store',
+            default=os.environ.get("AWS_SECRET_ACCESS_KEY"),
+            help="AWS secret access key. Defaults to the AWS_SECRET_ACCESS_KEY environment"\
+                " variable."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-session-token",
+            action='store',
+            default=os.environ.get("AWS_SESSION_TOKEN"),
+            help="AWS session token for temporary credentials. Defaults to the"\
+                " AWS_SESSION_TOKEN environment variable."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-endpoint",
+            action='store',
+            default=Route53DNSPlugin.DEFAULT_ENDPOINT,
+            help=f"Route53 API endpoint. Defaults to {Route53DNSPlugin.DEFAULT_ENDPOINT}."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-connections",
+            action='store',
+            type=int,
+            default=4,
+            help="Maximum number of connections to the API, and of hosted zones processed"\
+                " at the same time. Defaults to 4."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-zone-cache",
+            action='store',
+            default=default_cache_path(),
+            help="File the hosted zones are cached in. Defaults to"\
+                " $XDG_CACHE_HOME/ipv6ddns/route53-zones.json."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-zone-cache-ttl",
+            action='store',
+            type=int,
+            default=Route53DNSPlugin.DEFAULT_ZONE_CACHE_TTL,
+            help="Seconds the cached hosted zones are used for before they are listed"\
+                " again. 0 disables the cache. Defaults to 3600."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-rate-limit",
+            action='store',
+            type=float,
+            default=Route53DNSPlugin.DEFAULT_RATE_LIMIT,
+            help="Requests per second to the API, shared by all the hosts using the same"\
+                " access key. 0 disables the limit. Defaults to 5."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-rate-burst",
+            action='store',
+            type=int,
+            default=Route53DNSPlugin.DEFAULT_RATE_LIMIT,
+            help="Requests which can be made at once after a pause, within the rate limit."\
+                " Defaults to 5."
+        )
+
+    @staticmethod
+    def validate(context):
+        errors = []
+        if not getattr(context.dns, "access_key_id", None) \
+                or not getattr(context.dns, "secret_access_key", None):
+            errors.append(ValidationError(
+                Route53DNSPlugin.get_name(),
+                "AWS credentials are required. Use --dns-access-key-id and"
+                " --dns-secret-access-key or the AWS_* environment variables."
+            ))
+        if getattr(context.dns, "connections", 4) < 1:
+            errors.append(ValidationError(
+                Route53DNSPlugin.get_name(), "--dns-connections must be at least 1."
+            ))
+        if getattr(context.dns, "rate_limit", 0) < 0:
+            errors.append(ValidationError(
+                Route53DNSPlugin.get_name(), "--dns-rate-limit must not be negative."
+            ))
+        return errors
+
+    def get_request_limit(self):
+        """Rate limit of the API requests, shared by all the plugins using the
+        same endpoint and access key. The client takes a token for each request,
+        as one call to the plugin can make many requests, so the plugin does not
+        declare a limit to the workflow.
+
+        Returns:
+            RateLimit | None: the rate limit, None when disabled
+        """
+        ctx = self.ctx_plugin
+        rate = getattr(ctx, "rate_limit", self.DEFAULT_RATE_LIMIT)
+        if not rate:
+            return None
+        return RateLimit(
+            f"route53:{getattr(ctx, 'endpoint', self.DEFAULT_ENDPOINT)}#{ctx.access_key_id}",
+            rate, getattr(ctx, "rate_burst", self.DEFAULT_RATE_LIMIT))
+
+    @property
+    def client(self) -> Route53Client:
+        """Route53 client, created on first use and kept for the lifetime of
+        the plugin so connections are reused across runs.
+        """
+        with self._lock:
+            if self._client is None:
+                ctx = self.ctx_plugin
+                pool = ConnectionPool(
+                    getattr(ctx, "endpoint", self.DEFAULT_ENDPOINT),
+                    size=getattr(ctx, "connections", 4),
+                    timeout=self.ctx_common.timeout or 30,
+                )
+                credentials = Credentials(ctx.access_key_id, ctx.secret_access_key,
+                                          getattr(ctx, "session_token", None))
+                limit = self.get_request_limit()
+                self._client = Route53Client(
+                    pool, credentials, bucket=None if limit is None else get_bucket(limit))
+            return self._client
+
+    @property
+    def zone_cache(self) -> ZoneCache:
+        """On-disk cache of the hosted zones"""
+        ctx = self.ctx_plugin
+        return ZoneCache(
+            getattr(ctx, "zone_cache", None) or default_cache_path(),
+            getattr(ctx, "zone_cache_ttl", self.DEFAULT_ZONE_CACHE_TTL),
+            f"{getattr(ctx, 'endpoint', self.DEFAULT_ENDPOINT)}#{ctx.access_key_id}",
+        )
+
+    def get_aaaa_records(self):
+        def fetch(zone_id, names):
+            # list from the first managed name and stop past the last one,
+            # rather than paging through the whole zone
+            names = set(names)
+            ordered = sorted(names, key=record_order)
+            last = record_order(ordered[-1])
+            found = []
+            rrsets = self.client.list_resource_record_sets(zone_id, ordered[0], "AAAA")
+            try:
+                for name, rtype, ttl, values in rrsets:
+                    if record_order(name) > last:
+                        break
+                    if rtype == "AAAA" and name in names and values:
+                        found.append((name, ttl, values[0]))
+            finally:
+                rrsets.close()
+            return found
+
+        found = {}
+        for zone_records in self._map_names(fetch, self.ctx_plugin.fqdns):
+            for name, ttl, ip_addr in zone_records:
+                found[name] = (ip_addr, ttl)
+        return [
+            ZoneRecord(fqdn, *found[normalize_name(fqdn)])
+            for fqdn in self.ctx_plugin.fqdns
+            if normalize_name(fqdn) in found
+        ]
+
+    def upsert_records(self, records) -> None:
+        by_name = {normalize_name(record.name): record for record in records}
+
+        def upsert(zone_id, names):
+            zone_records = [by_name[name] for name in names]
+            for start in range(0, len(zone_records), MAX_UPSERTS_PER_BATCH):
+                self.client.upsert_aaaa_records(
+                    zone_id, zone_records[start:start + MAX_UPSERTS_PER_BATCH]
+                )
+
+        self._map_names(upsert, by_name)
+
+    def get_zone_trie(self, refresh: bool = False) -> ZoneTrie:
+        """Return the trie of the public hosted zones. The zones are taken from
+        memory, then from the on-disk cache, and only listed from Route53 when
+        both are missing or expired.
+
+        Args:
+            refresh (bool, optional): drop the cached zones and list them again.
+                                      Defaults to False.
+
+        Returns:
+            ZoneTrie: the hosted zones
+        """
+        cache = self.zone_cache
+        with self._zones_lock:
+            if refresh:
+                cache.invalidate()
+                self._trie = None
+            if self._trie is not None and self._trie_time + cache.ttl >= cache.clock():
+                return self._trie
+            zones = None if refresh else cache.load()
+            if zones is None:
+                zones = list(self.client.list_hosted_zones())
+                cache.save(zones)
+            self._trie = ZoneTrie(zones)
+            self._trie_time = cache.clock()
+            return self._trie
+
+    def get_zones_by_fqdn(self, fqdns, refresh: bool = False):
+        """Group the FQDNs by the hosted zone they belong to. A name belongs to
+        the zone with the longest matching suffix.
+
+        Args:
+            fqdns (Iterable[str]): domain names
+            refresh (bool, optional): list the hosted zones again instead of using
+                                      the cached zones. Defaults to False.
+
+        Raises:
+            ValueError: when no hosted zone matches a name
+
+        Returns:
+            dict[str, list[str]]: zone id => normalized names in the zone
+        """
+        trie = self.get_zone_trie(refresh)
+        zones = {}
+        for fqdn in fqdns:
+            name = normalize_name(fqdn)
+            zone = trie.find(name)
+            if zone is None:
+                raise ValueError(f"No Route53 hosted zone found for {fqdn}")
+            zones.setdefault(zone[0], []).append(name)
+        return zones
+
+    def _map_names(self, func, fqdns):
+        """Group the names by hosted zone and call func(zone_id, names) for each
+        zone. When the cached zones are stale, because a name has no zone or
+        Route53 reports a zone as unknown, the zones are listed again and the
+        calls retried once.
+        """
+        try:
+            zones = self.get_zones_by_fqdn(fqdns)
+        except ValueError:
+            if not self.zone_cache.ttl:
+                raise
+            zones = None
+
+        if zones is not None:
+            try:
+                return self._map_zones(func, zones)
+            except Route53Error as err:
+                if err.code != "NoSuchHostedZone":
+                    raise
+                logging.info("Route53 hosted zones have changed, listing them again")
+        return self._map_zones(func, self.get_zones_by_fqdn(fqdns, refresh=True))
+
+    def _map_zones(self, func, zones):
+        """Call func(zone_id, fqdns) for each zone, with up to `connections`
+        zones processed at the same time, and return the results in order.
+        """
+        if len(zones) <= 1:
+            return [func(zone_id, fqdns) for zone_id, fqdns in zones.items()]
+        workers = min(getattr(self.ctx_plugin, "connections", 4), len(zones))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(func, zone_id, fqdns) for zone_id, fqdns in zones.items()]
+            return [future.result() for future in futures]
+
+    def close(self) -> None:
+        if self._client is not None:
+            self._client.pool.close()
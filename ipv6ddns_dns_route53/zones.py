@@ -0,0 +1,139 @@
+"""
+Resolution of the hosted zone owning a domain name: a label trie for the
+longest-suffix match and an on-disk cache of the hosted zones.
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+
+
+class ZoneTrie:
+    """Trie of hosted zone names keyed on their labels, from the top level
+    domain down. Finding the zone of a name walks its labels once, whatever
+    the number of zones.
+    """
+
+    def __init__(self, zones=()) -> None:
+        """Constructor
+
+        Args:
+            zones (Iterable[tuple[str, str]], optional): zone ids and normalized names.
+                                                         Defaults to ().
+        """
+        self._root = {}
+        self.zones = []
+        for zone_id, name in zones:
+            self.add(zone_id, name)
+
+    def add(self, zone_id: str, name: str):
+        """Add a hosted zone
+
+        Args:
+            zone_id (str): id of the zone
+            name (str): normalized name of the zone
+        """
+        node = self._root
+        for label in reversed(name.split(".")):
+            node = node.setdefault(label, {})
+        node[None] = (zone_id, name)
+        self.zones.append((zone_id, name))
+
+    def find(self, fqdn: str):
+        """Find the zone with the longest name that is a suffix of the fqdn
+
+        Args:
+            fqdn (str): normalized domain name
+
+        Returns:
+            tuple[str, str] | None: id and name of the zone, None if no zone matches
+        """
+        best = None
+        node = self._root
+        for label in reversed(fqdn.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            best = node.get(None, best)
+        return best
+
+    def __len__(self) -> int:
+        return len(self.zones)
+
+
+class ZoneCache:
+    """On-disk cache of the hosted zones of an account. Entries older than
+    `ttl` seconds, or stored for another account or endpoint, are ignored.
+    """
+
+    def __init__(self, path: str, ttl: float, key: str, clock=time.time) -> None:
+        """Constructor
+
+        Args:
+            path (str): path of the cache file
+            ttl (float): seconds the cached zones are valid for. 0 disables the cache.
+            key (str): identity of the account and endpoint the zones belong to
+            clock (Callable[[], float], optional): current time. Defaults to time.time.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.key = key
+        self.clock = clock
+
+    def load(self):
+        """Load the cached zones
+
+        Returns:
+            list[tuple[str, str]] | None: zone ids and names, None when the cache is
+                                          missing, expired or unreadable
+        """
+        if not self.ttl:
+            return None
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                data = json.load(file)
+            if data["key"] != self.key or self.clock() - data["time"] > self.ttl:
+                return None
+            return [(zone_id, name) for zone_id, name in data["zones"]]
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, zones):
+        """Store the zones. The file is replaced atomically, so concurrent
+        readers see either the old or the new zones.
+
+        Args:
+            zones (list[tuple[str, str]]): zone ids and names
+        """
+        if not self.ttl:
+            return
+        directory = os.path.dirname(self.path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".zones-")
+            with os.fdopen(handle, "w", encoding="utf-8") as file:
+                json.dump({"key": self.key, "time": self.clock(), "zones": zones}, file)
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logging.debug("Could not write the zone cache %s: %s", self.path, err)
+
+    def invalidate(self):
+        """Remove the cached zones"""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as err:
+            logging.debug("Could not remove the zone cache %s: %s", self.path, err)
+
+
+def default_cache_path() -> str:
+    """Default path of the zone cache, under the XDG cache directory
+
+    Returns:
+        str: path of the cache file
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "ipv6ddns", "route53-zones.json")
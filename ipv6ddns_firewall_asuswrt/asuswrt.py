@@ -0,0 +1,225 @@
+"""
+Asus WRT integration for ipv6ddns
+"""
+import logging
+import os
+import shlex
+import threading
+from ipv6ddns.domain import FirewallEntry, Protocol, ValidationError
+from ipv6ddns.plugin import FirewallPlugin
+from ipv6ddns_firewall_asuswrt.session import ShellSession
+
+
+# nvram variable holding the IPV6 firewall rules
+RULELIST = "ipv6_fw_rulelist"
+
+
+def parse_rules(value: str):
+    """Parse the IPV6 firewall rules of the router. Each rule is written as
+    `<description>remote ip>local ip>port>protocol`.
+
+    Args:
+        value (str): value of the ipv6_fw_rulelist nvram variable
+
+    Returns:
+        list[list[str]]: fields of each rule
+    """
+    return [rule.split(">") for rule in value.strip("\r\n").split("<")[1:]]
+
+
+def format_rules(rules) -> str:
+    """Inverse of parse_rules()"""
+    return "".join("<" + ">".join(rule) for rule in rules)
+
+
+def to_rule(entry):
+    """Rule allowing any remote host to the address and port of the entry"""
+    return [entry.entry_id, "", entry.ip_addr, str(entry.port), entry.protocol.value.upper()]
+
+
+def to_entry(rule):
+    """Firewall entry of a rule, None for rules ipv6ddns cannot manage, such
+    as port ranges, remote address filters or rules for both protocols.
+    """
+    if len(rule) != 5 or rule[1] or not rule[3].isdigit():
+        return None
+    try:
+        return FirewallEntry(rule[0], rule[2], int(rule[3]), Protocol(rule[4].lower()))
+    except ValueError:
+        return None
+
+
+class AsusWrtFirewallPlugin(FirewallPlugin):
+    """Firewall plugin for Asus WRT routers with SSH enabled. All the commands
+    of the plugin go through one persistent shell session on the router. The
+    rules are read with a single command, and all the changes of a run are
+    applied with one nvram commit and one firewall restart.
+    """
+
+    DEFAULT_CONTROL_PERSIST = 300
+
+    def __init__(self, common_ctx, plugin_ctx) -> None:
+        super().__init__(common_ctx, plugin_ctx)
+        self._session = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_name():
+        return "asuswrt"
+
+    @staticmethod
+    def get_title() -> str:
+        return "Asus WRT Firewall Plugin for ipv6ddns"
+
+    def get_circuit_key(self) -> str:
+        ctx = self.ctx_plugin
+        return f"asuswrt:{getattr(ctx, 'host', None)}:{getattr(ctx, 'port', 22)}"
+
+    @staticmethod
+    def get_description() -> str:
+        return """Firewall plugin for Asus WRT routers, managed over SSH
+        for ipv6ddns.
+        """
+
+    @staticmethod
+    def add_args(argparse_group, prefix):
+        argparse_group.add_argument(
+            f"--{prefix}-host",
+            action='store',
+            help="Host name or address of the router."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-port",
+            action='store',
+            type=int,
+            default=22,
+            help="SSH port of the router. Defaults to 22."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-user",
+            action='store',
+            default="admin",
+            help="SSH user of the router. Defaults to admin."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-identity",
+            action='store',
+            help="Private key used to log in to the router. Defaults to the keys of the"\
+                " SSH agent and configuration."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-ssh-command",
+            action='store',
+            default="ssh",
+            help="SSH client command, with any extra options. Defaults to ssh."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-control-persist",
+            action='store',
+            type=int,
+            default=AsusWrtFirewallPlugin.DEFAULT_CONTROL_PERSIST,
+            help="Seconds the SSH connection is kept open after the last run, to be reused"\
+                " by the next runs. 0 disables the shared connection. Defaults to 300."
+        )
+
+    @staticmethod
+    def validate(context):
+        errors = []
+        if not getattr(context.firewall, "host", None):
+            errors.append(ValidationError(
+                AsusWrtFirewallPlugin.get_name(), "The router is required. Use --fw-host."
+            ))
+        if any(char in str(getattr(context.firewall, "host_id", "")) for char in "<>"):
+            errors.append(ValidationError(
+                AsusWrtFirewallPlugin.get_name(), "The host id cannot contain '<' or '>'."
+            ))
+        return errors
+
+    @property
+    def session(self) -> ShellSession:
+        """Shell session on the router, started on first use and kept for the
+        lifetime of the plugin so it is reused across runs.
+        """
+        with self._lock:
+            if self._session is None:
+                self._session = ShellSession(self.get_ssh_argv(),
+                                             timeout=self.ctx_common.timeout or 30)
+            return self._session
+
+    def get_ssh_argv(self):
+        """Command starting the shell on the router
+
+        Returns:
+            list[str]: ssh command line
+        """
+        ctx = self.ctx_plugin
+        argv = shlex.split(getattr(ctx, "ssh_command", None) or "ssh")
+        argv += ["-o", "BatchMode=yes", "-o", "LogLevel=ERROR",
+                 "-p", str(getattr(ctx, "port", 22))]
+        if getattr(ctx, "identity", None):
+            argv += ["-i", ctx.identity]
+        persist = getattr(ctx, "control_persist", self.DEFAULT_CONTROL_PERSIST)
+        if persist:
+            argv += ["-o", "ControlMaster=auto", "-o", f"ControlPath={control_path()}",
+                     "-o", f"ControlPersist={persist}"]
+        argv += [f"{getattr(ctx, 'user', 'admin')}@{ctx.host}", "sh"]
+        return argv
+
+    def get_rules(self):
+        """Read the IPV6 firewall rules of the router
+
+        Returns:
+            list[list[str]]: fields of each rule
+        """
+        return parse_rules(self.session.run(f"nvram get {RULELIST}"))
+
+    def get_entries(self):
+        entries = []
+        for rule in self.get_rules():
+            entry = to_entry(rule)
+            if entry is None:
+                logging.debug("Skipping firewall rule %s", rule)
+            else:
+                entries.append(entry)
+        return entries
+
+    def save_entries(self, entries) -> None:
+        self.apply_entries(entries, [])
+
+    def delete_entries(self, entries) -> None:
+        self.apply_entries([], entries)
+
+    def apply_entries(self, save, delete) -> None:
+        if not save and not delete:
+            return
+        rules = self.get_rules()
+        replaced = {entry.entry_id for entry in save} | {entry.entry_id for entry in delete}
+        new_rules = [rule for rule in rules if rule[0] not in replaced]
+        new_rules += [to_rule(entry) for entry in save]
+        if new_rules == rules:
+            return
+        self.session.run(f"nvram set {RULELIST}={shlex.quote(format_rules(new_rules))}"
+                         " && nvram commit && service restart_firewall")
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
+def control_path() -> str:
+    """Path of the SSH control socket, under the XDG cache directory. The
+    directory is only accessible to the user.
+
+    Returns:
+        str: ssh ControlPath, with %C expanded by ssh to a hash of the connection
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    directory = os.path.join(cache_home, "ipv6ddns", "ssh")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, "%C")
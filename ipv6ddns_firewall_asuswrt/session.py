@@ -0,0 +1,160 @@
+"""
+Persistent shell session on the router. One `sh` is started over SSH and
+kept for the lifetime of the plugin, and every command is written to its
+standard input, so a run costs a single SSH handshake whatever the number of
+commands. With an SSH control master the handshake is also shared by the
+runs of separate processes.
+"""
+import logging
+import os
+import secrets
+import select
+import subprocess
+import threading
+import time
+
+
+class SessionError(Exception):
+    """Failure of a command, or of the session itself"""
+
+    def __init__(self, message: str, status: int = None, output: str = "") -> None:
+        """Constructor
+
+        Args:
+            message (str): description of the failure
+            status (int, optional): exit status of the command. None when the
+                                    session failed. Defaults to None.
+            output (str, optional): output of the command. Defaults to "".
+        """
+        super().__init__(message)
+        self.status = status
+        self.output = output
+
+    @property
+    def retryable(self) -> bool:
+        """Whether the failure is transient: the session failed, not the command"""
+        return self.status is None
+
+
+class ShellSession:
+    """Long lived shell, started on first use. The output of each command is
+    delimited by a marker line which carries its exit status. The session is
+    restarted once when it was closed by the other end, for example after the
+    router rebooted, so the commands run in it should be idempotent.
+    """
+
+    def __init__(self, argv, timeout: float = 30) -> None:
+        """Constructor
+
+        Args:
+            argv (list[str]): command starting the shell, for example
+                              `["ssh", "admin@router", "sh"]`
+            timeout (float, optional): seconds to wait for the output of a command.
+                                       Defaults to 30.
+        """
+        self.argv = list(argv)
+        self.timeout = timeout
+        self.started = 0
+        self._proc = None
+        self._buffer = b""
+        self._marker = b""
+        self._lock = threading.Lock()
+
+    def run(self, command: str, check: bool = True) -> str:
+        """Run a command in the session and return its output. The standard
+        error of the command is part of the output.
+
+        Args:
+            command (str): shell command
+            check (bool, optional): raise if the command fails. Defaults to True.
+
+        Raises:
+            SessionError: if the command fails, or the session fails or times out
+
+        Returns:
+            str: output of the command
+        """
+        with self._lock:
+            try:
+                status, output = self._run(command)
+            except BrokenPipeError:
+                logging.info("Shell session closed, starting a new one")
+                self._stop()
+                try:
+                    status, output = self._run(command)
+                except BrokenPipeError as err:
+                    self._stop()
+                    raise SessionError(f"Shell session closed: {' '.join(self.argv)}") from err
+        if check and status != 0:
+            raise SessionError(f"Command failed with status {status}: {output.strip()}",
+                               status, output)
+        return output
+
+    def close(self) -> None:
+        """Exit the shell"""
+        with self._lock:
+            if self._proc is None:
+                return
+            try:
+                self._proc.stdin.write(b"exit\n")
+                self._proc.stdin.flush()
+                self._proc.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+            self._stop()
+
+    def _run(self, command):
+        if self._proc is None or self._proc.poll() is not None:
+            self._start()
+        self._proc.stdin.write(
+            b"{ " + command.encode() + b"\n} 2>&1 </dev/null; printf '\\n%s %d\\n' "
+            + self._marker + b" $?\n"
+        )
+        self._proc.stdin.flush()
+        return self._read_result()
+
+    def _start(self):
+        self._stop()
+        logging.debug("Starting shell session: %s", " ".join(self.argv))
+        # pylint: disable=locally-disabled, consider-using-with
+        self._proc = subprocess.Popen(self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      bufsize=0)
+        self._buffer = b""
+        self._marker = b"__ipv6ddns_" + secrets.token_hex(8).encode() + b"__"
+        self.started += 1
+
+    def _stop(self):
+        if self._proc is not None:
+            if self._proc.poll() is None:
+                self._proc.kill()
+            self._proc.wait()
+            for pipe in (self._proc.stdin, self._proc.stdout):
+                pipe.close()
+        self._proc = None
+
+    def _read_result(self):
+        """Read up to the marker line and return the exit status and output"""
+        marker = b"\n" + self._marker + b" "
+        deadline = time.monotonic() + self.timeout
+        fileno = self._proc.stdout.fileno()
+        while True:
+            start = self._buffer.find(marker)
+            if start >= 0:
+                end = self._buffer.find(b"\n", start + len(marker))
+                if end >= 0:
+                    status = int(self._buffer[start + len(marker):end])
+                    output = self._buffer[:start].decode(errors="replace")
+                    self._buffer = self._buffer[end + 1:]
+                    return status, output
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._stop()
+                raise SessionError(f"No response from the shell within {self.timeout}s")
+            readable, _, _ = select.select([fileno], [], [], remaining)
+            if not readable:
+                continue
+            data = os.read(fileno, 65536)
+            if not data:
+                self._stop()
+                raise BrokenPipeError("shell session closed")
+            self._buffer += data
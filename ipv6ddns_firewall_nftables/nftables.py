@@ -0,0 +1,230 @@
+"""
+nftables integration for ipv6ddns
+"""
+import json
+import logging
+import shlex
+import subprocess
+import threading
+from ipv6ddns.domain import FirewallEntry, Protocol, ValidationError
+from ipv6ddns.plugin import FirewallPlugin
+
+
+class NftError(Exception):
+    """Failure of an nft command"""
+
+    def __init__(self, message: str, stderr: str = "") -> None:
+        """Constructor
+
+        Args:
+            message (str): error message
+            stderr (str, optional): standard error of nft, empty when nft did not
+                                    run to completion. Defaults to "".
+        """
+        super().__init__(message)
+        self.stderr = stderr
+
+
+def parse_rule(rule):
+    """Firewall entry of a rule of the JSON dump of nft, None for rules which
+    are not of the form `ip6 daddr ADDR tcp|udp dport PORT accept comment ID`.
+
+    Args:
+        rule (dict): value of a "rule" object of `nft -j list chain`
+
+    Returns:
+        FirewallEntry | None: entry of the rule
+    """
+    ip_addr = protocol = port = None
+    accept = False
+    for expr in rule.get("expr", []):
+        match = expr.get("match")
+        if match and match.get("op", "==") == "==":
+            payload = match.get("left", {}).get("payload", {})
+            if payload.get("protocol") == "ip6" and payload.get("field") == "daddr":
+                ip_addr = match.get("right")
+            elif payload.get("protocol") in ("tcp", "udp") and payload.get("field") == "dport":
+                protocol, port = payload["protocol"], match.get("right")
+        elif "accept" in expr:
+            accept = True
+    if not (accept and rule.get("comment") and isinstance(ip_addr, str)
+            and isinstance(port, int)):
+        return None
+    try:
+        return FirewallEntry(rule["comment"], ip_addr, port, Protocol(protocol))
+    except ValueError:
+        return None
+
+
+def render_chain(family: str, table: str, chain: str, entries) -> str:
+    """Render the nft script replacing all the rules of the chain by the rules
+    of the entries. The table and chain are created when missing, and the
+    script is applied by nft as a single transaction.
+
+    Args:
+        family (str): family of the table
+        table (str): name of the table
+        chain (str): name of the chain
+        entries (list[FirewallEntry]): entries of the chain
+
+    Returns:
+        str: nft script
+    """
+    rules = "".join(
+        f"\t\tip6 daddr {entry.ip_addr} {entry.protocol.value} dport {entry.port} accept"
+        f" comment \"{entry.entry_id}\"\n"
+        for entry in entries
+    )
+    return f"table {family} {table} {{\n\tchain {chain} {{\n\t}}\n}}\n"\
+        f"flush chain {family} {table} {chain}\n"\
+        f"table {family} {table} {{\n\tchain {chain} {{\n{rules}\t}}\n}}\n"
+
+
+class NftablesFirewallPlugin(FirewallPlugin):
+    """Firewall plugin for Linux routers using nftables. The plugin owns one
+    regular chain, which the forward chain of the router jumps to. The chain
+    is read with a single JSON dump, and rewritten with a single `nft -f`
+    transaction, so the rules are never left half applied.
+    """
+
+    DEFAULT_FAMILY = "inet"
+    DEFAULT_TABLE = "filter"
+    DEFAULT_CHAIN = "ipv6ddns"
+
+    # runs of contexts sharing the chain must not interleave their read and write
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_name():
+        return "nftables"
+
+    @staticmethod
+    def get_title() -> str:
+        return "nftables Firewall Plugin for ipv6ddns"
+
+    @staticmethod
+    def get_description() -> str:
+        return """Firewall plugin for Linux routers using nftables
+        for ipv6ddns.
+        """
+
+    @staticmethod
+    def add_args(argparse_group, prefix):
+        argparse_group.add_argument(
+            f"--{prefix}-nft",
+            action='store',
+            default="nft",
+            help="nft command, with any extra options. Defaults to nft."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-family",
+            action='store',
+            default=NftablesFirewallPlugin.DEFAULT_FAMILY,
+            choices=["inet", "ip6"],
+            help=f"Family of the table. Defaults to {NftablesFirewallPlugin.DEFAULT_FAMILY}."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-table",
+            action='store',
+            default=NftablesFirewallPlugin.DEFAULT_TABLE,
+            help=f"Table of the chain. Defaults to {NftablesFirewallPlugin.DEFAULT_TABLE}."
+        )
+
+        argparse_group.add_argument(
+            f"--{prefix}-chain",
+            action='store',
+            default=NftablesFirewallPlugin.DEFAULT_CHAIN,
+            help="Chain managed by ipv6ddns. The forward chain of the table should jump to"\
+                f" it. Defaults to {NftablesFirewallPlugin.DEFAULT_CHAIN}."
+        )
+
+    @staticmethod
+    def validate(context):
+        if any(char in str(getattr(context.firewall, "host_id", "")) for char in "\"\\\n"):
+            return [ValidationError(
+                NftablesFirewallPlugin.get_name(),
+                "The host id cannot contain quotes, backslashes or new lines."
+            )]
+        return []
+
+    @property
+    def chain(self):
+        """Family, table and name of the chain"""
+        ctx = self.ctx_plugin
+        return (getattr(ctx, "family", self.DEFAULT_FAMILY),
+                getattr(ctx, "table", self.DEFAULT_TABLE),
+                getattr(ctx, "chain", self.DEFAULT_CHAIN))
+
+    def get_entries(self):
+        entries = []
+        for rule in self.get_rules():
+            entry = parse_rule(rule)
+            if entry is None:
+                logging.warning("Rule %s of the %s chain is not managed by ipv6ddns and will"
+                                " be removed", rule.get("handle"), self.chain[2])
+            else:
+                entries.append(entry)
+        return entries
+
+    def get_rules(self):
+        """Read the rules of the chain with a single JSON dump
+
+        Returns:
+            list[dict]: rules of the chain, empty when the chain does not exist
+        """
+        try:
+            output = self.nft("-j", "list", "chain", *self.chain)
+        except NftError as err:
+            # nft reports a missing table or chain as ENOENT
+            if err.stderr.startswith("Error: No such file or directory"):
+                return []
+            raise
+        return [item["rule"] for item in json.loads(output).get("nftables", [])
+                if "rule" in item]
+
+    def save_entries(self, entries) -> None:
+        self.apply_entries(entries, [])
+
+    def delete_entries(self, entries) -> None:
+        self.apply_entries([], entries)
+
+    def apply_entries(self, save, delete) -> None:
+        if not save and not delete:
+            return
+        with self._lock:
+            current = [parse_rule(rule) for rule in self.get_rules()]
+            replaced = {entry.entry_id for entry in save} | {entry.entry_id for entry in delete}
+            entries = [entry for entry in current
+                       if entry is not None and entry.entry_id not in replaced]
+            entries += save
+            if entries == current:
+                return
+            self.nft("-f", "-", script=render_chain(*self.chain, entries))
+
+    def nft(self, *args, script: str = None) -> str:
+        """Run nft
+
+        Args:
+            script (str, optional): script passed on the standard input. Defaults to None.
+
+        Raises:
+            FileNotFoundError: if nft is not installed
+            NftError: if nft fails
+
+        Returns:
+            str: standard output of nft
+        """
+        argv = shlex.split(getattr(self.ctx_plugin, "nft", None) or "nft") + list(args)
+        try:
+            proc = subprocess.run(argv, input=script, capture_output=True, text=True,
+                                  timeout=self.ctx_common.timeout or 30, check=False)
+        except FileNotFoundError:
+            raise
+        except (OSError, subprocess.TimeoutExpired) as err:
+            raise NftError(f"{' '.join(argv)}: {err}") from err
+        if proc.returncode != 0:
+            stderr = proc.stderr.strip()
+            raise NftError(f"{' '.join(argv)}: {stderr}", stderr)
+        return proc.stdout
@@ -32,7 +32,7 @@ setup(
     license = "MIT",
     keywords = "ipv6 cli ddns firewall",
     url = "https://github.com/skidmarkturbo/ipv6ddns",
-    packages=['ipv6ddns'],
+    packages=['ipv6ddns', 'ipv6ddns.resolver'],
     long_description=read('README.md'),
     classifiers=[
         "Development Status :: 1 - Planning",
@@ -44,7 +44,11 @@ setup(
         'console_scripts': ['ipv6ddns=ipv6ddns.main:main'],
         'ipv6ddns.plugin.dns': ['noop=ipv6ddns.plugin:DNSPlugin'],
         'ipv6ddns.plugin.firewall': ['noop=ipv6ddns.plugin:FirewallPlugin'],
-        'ipv6ddns.plugin.ipv6': ['noop=ipv6ddns.plugin:IPResolverPlugin'],
+        'ipv6ddns.plugin.ipv6': [
+            'noop=ipv6ddns.plugin:IPResolverPlugin',
+            'netlink=ipv6ddns.resolver.netlink:NetlinkResolverPlugin',
+            'procfs=ipv6ddns.resolver.procfs:ProcfsResolverPlugin',
+        ],
     },
     install_requires = [],
 )
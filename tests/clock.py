@@ -0,0 +1,30 @@
+"""
+Simulated clock for the tests of time based behaviour
+"""
+import threading
+
+
+class SimulatedClock:
+    """Monotonic clock which only moves when the test advances it, or when
+    code under test sleeps on it. Used as the `clock` and `sleep` of token
+    buckets and circuit breakers, so the tests run without waiting.
+    """
+
+    def __init__(self, now: float = 1000.0) -> None:
+        self.now = now
+        self.sleeps = []
+        self._lock = threading.Lock()
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        """Move the clock forward"""
+        with self._lock:
+            self.now += seconds
+
+    def sleep(self, seconds: float) -> None:
+        """Record the sleep and move the clock forward by its duration"""
+        with self._lock:
+            self.sleeps.append(seconds)
+            self.now += seconds
@@ -0,0 +1,75 @@
+"""
+Shared fixtures for the tests
+"""
+import pytest
+from ipv6ddns import ratelimit, resilience
+from ipv6ddns.cli import Cli
+from ipv6ddns.context import ArgparseContextParser
+from ipv6ddns.plugin import PluginManager
+from tests.plugins import InMemoryDNSPlugin, InMemoryFirewallPlugin
+
+
+# options of the contexts created by the context fixtures
+CONTEXT_ARGS = ["--domain", "example.com", "--tcp-port", "443", "--host-id", "nas",
+                "--assume-yes"]
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path_factory, monkeypatch):
+    """Keep the plugin index and other caches of each test in a temp dir,
+    away from the cache of the user running the tests.
+    """
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path_factory.mktemp("cache")))
+
+
+@pytest.fixture(autouse=True)
+def isolated_breakers():
+    """Start each test with closed circuit breakers and full token buckets, as
+    they are shared by all the workflows of the process.
+    """
+    resilience.reset_breakers()
+    ratelimit.reset_buckets()
+    yield
+    resilience.reset_breakers()
+    ratelimit.reset_buckets()
+
+
+@pytest.fixture(name="plugin_manager")
+def fixture_plugin_manager():
+    """Plugin manager with the installed plugins and the in-memory DNS and
+    firewall plugins
+    """
+    plugins = PluginManager()
+    plugins.discover()
+    plugins.register(InMemoryDNSPlugin)
+    plugins.register(InMemoryFirewallPlugin)
+    return plugins
+
+
+@pytest.fixture(name="context_factory")
+def fixture_context_factory(plugin_manager):
+    """Return a function creating contexts for example.com and port 443 of the
+    nas host, with the in-memory DNS and firewall plugins. The function takes
+    extra command line options, and keyword arguments replacing the parsed
+    options, like `dns="noop"`.
+    """
+    def create(*args, **options):
+        parsed = Cli([*CONTEXT_ARGS, *args]).parse_args()
+        parsed.dns = parsed.firewall = InMemoryDNSPlugin.get_name()
+        vars(parsed).update(options)
+        return ArgparseContextParser(plugin_manager, parsed).parse()[0]
+    return create
+
+
+@pytest.fixture(name="context_args")
+def fixture_context_args():
+    """Extra command line options of the context fixture. Override it in a
+    module, or parametrize it in a test, to set the flags the tests need.
+    """
+    return []
+
+
+@pytest.fixture(name="context")
+def fixture_context(context_factory, context_args):
+    """Context created with the context_args options"""
+    return context_factory(*context_args)
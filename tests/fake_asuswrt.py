@@ -0,0 +1,64 @@
+"""
+Local stand-in for an Asus WRT router used by the asuswrt plugin tests. The
+`ssh` of the stand-in starts a local `sh` with fake `nvram` and `service`
+commands on its PATH, and every command is logged.
+"""
+import os
+import stat
+
+
+SSH = """#!/bin/sh
+echo "ssh $*" >> "{root}/calls.log"
+PATH="{root}/bin:$PATH" FAKE_ROUTER="{root}" exec sh
+"""
+
+NVRAM = """#!/bin/sh
+echo "nvram $*" >> "$FAKE_ROUTER/calls.log"
+case "$1" in
+    get) cat "$FAKE_ROUTER/nvram/$2" 2>/dev/null; echo ;;
+    set) printf '%s' "${2#*=}" > "$FAKE_ROUTER/nvram/${2%%=*}" ;;
+    commit) ;;
+    *) exit 1 ;;
+esac
+"""
+
+SERVICE = """#!/bin/sh
+echo "service $*" >> "$FAKE_ROUTER/calls.log"
+"""
+
+
+class FakeRouter:
+    """Router stand-in rooted in a temporary directory"""
+
+    def __init__(self, root) -> None:
+        self.root = str(root)
+        os.makedirs(os.path.join(self.root, "bin"))
+        os.makedirs(os.path.join(self.root, "nvram"))
+        self.ssh = self._script("ssh", SSH.format(root=self.root))
+        self._script(os.path.join("bin", "nvram"), NVRAM)
+        self._script(os.path.join("bin", "service"), SERVICE)
+
+    def set_nvram(self, name: str, value: str):
+        """Set a nvram variable"""
+        with open(os.path.join(self.root, "nvram", name), "w", encoding="utf-8") as file:
+            file.write(value)
+
+    def get_nvram(self, name: str) -> str:
+        """Return the value of a nvram variable"""
+        with open(os.path.join(self.root, "nvram", name), encoding="utf-8") as file:
+            return file.read()
+
+    def calls(self, command: str = ""):
+        """Return the logged commands starting with `command`"""
+        try:
+            with open(os.path.join(self.root, "calls.log"), encoding="utf-8") as file:
+                return [line.rstrip("\n") for line in file if line.startswith(command)]
+        except FileNotFoundError:
+            return []
+
+    def _script(self, name, text):
+        path = os.path.join(self.root, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+        return path
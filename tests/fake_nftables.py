@@ -0,0 +1,106 @@
+"""
+Local stand-in for nft used by the nftables plugin tests. The fake `nft` is
+put on the PATH and keeps the rules of its chains in a JSON file. It only
+understands the commands and scripts the plugin writes. A script is parsed
+completely before anything is changed, like the transactions of nft, and
+every call is logged.
+"""
+import json
+import os
+import stat
+import sys
+
+
+NFT = """#!{python}
+import json, re, sys
+
+ROOT = {root!r}
+RULE = re.compile(r'ip6 daddr (\\S+) (tcp|udp) dport (\\d+) accept comment "([^"]*)"$')
+
+with open(ROOT + "/calls.log", "a", encoding="utf-8") as log:
+    log.write("nft " + " ".join(sys.argv[1:]) + "\\n")
+with open(ROOT + "/ruleset.json", encoding="utf-8") as file:
+    chains = json.load(file)
+
+def fail(message):
+    sys.stderr.write(message + "\\n")
+    sys.exit(1)
+
+if sys.argv[1:4] == ["-j", "list", "chain"]:
+    key = " ".join(sys.argv[4:7])
+    if key not in chains:
+        fail("Error: No such file or directory")
+    family, table, chain = sys.argv[4:7]
+    items = [{{"metainfo": {{"json_schema_version": 1}}}},
+             {{"chain": {{"family": family, "table": table, "name": chain}}}}]
+    items += [{{"rule": dict(rule, family=family, table=table, chain=chain, handle=handle)}}
+              for handle, rule in enumerate(chains[key], 1)]
+    print(json.dumps({{"nftables": items}}))
+elif sys.argv[1:] == ["-f", "-"]:
+    new = {{key: list(rules) for key, rules in chains.items()}}
+    table = chain = None
+    for line in sys.stdin.read().splitlines():
+        line = line.strip()
+        if line.startswith("table "):
+            table = line[len("table "):].rstrip(" {{")
+        elif line.startswith("chain "):
+            chain = table + " " + line[len("chain "):].rstrip(" {{")
+            new.setdefault(chain, [])
+        elif line.startswith("flush chain "):
+            key = line[len("flush chain "):]
+            if key not in new:
+                fail("Error: No such file or directory")
+            new[key] = []
+        elif line == "}}":
+            chain = None
+        elif line:
+            match = RULE.match(line)
+            if chain is None or not match:
+                fail("Error: syntax error: " + line)
+            addr, proto, port, comment = match.groups()
+            new[chain].append({{"comment": comment, "expr": [
+                {{"match": {{"op": "==", "left": {{"payload": {{"protocol": "ip6",
+                  "field": "daddr"}}}}, "right": addr}}}},
+                {{"match": {{"op": "==", "left": {{"payload": {{"protocol": proto,
+                  "field": "dport"}}}}, "right": int(port)}}}},
+                {{"accept": None}},
+            ]}})
+    with open(ROOT + "/ruleset.json", "w", encoding="utf-8") as file:
+        json.dump(new, file)
+else:
+    fail("Error: unsupported command")
+"""
+
+
+class FakeNft:
+    """nft stand-in rooted in a temporary directory"""
+
+    def __init__(self, root) -> None:
+        self.root = str(root)
+        self.bin = os.path.join(self.root, "bin")
+        os.makedirs(self.bin)
+        self.set_chains({})
+        path = os.path.join(self.bin, "nft")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(NFT.format(python=sys.executable, root=self.root))
+        os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+
+    def set_chains(self, chains):
+        """Replace the ruleset. Each chain, keyed by "family table chain", is
+        a list of rules in the JSON format of nft without their handles.
+        """
+        with open(os.path.join(self.root, "ruleset.json"), "w", encoding="utf-8") as file:
+            json.dump(chains, file)
+
+    def get_chains(self):
+        """Return the ruleset"""
+        with open(os.path.join(self.root, "ruleset.json"), encoding="utf-8") as file:
+            return json.load(file)
+
+    def calls(self, command: str = ""):
+        """Return the logged commands starting with `command`"""
+        try:
+            with open(os.path.join(self.root, "calls.log"), encoding="utf-8") as file:
+                return [line.rstrip("\n") for line in file if line.startswith(command)]
+        except FileNotFoundError:
+            return []
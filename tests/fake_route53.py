@@ -0,0 +1,183 @@
+"""
+Local HTTP stand-in for the Route53 API used by the route53 plugin tests.
+Implements ListHostedZones, ListResourceRecordSets and ChangeResourceRecordSets
+over keep-alive HTTP/1.1 connections.
+"""
+import bisect
+import threading
+import urllib.parse
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+
+XMLNS = "https://route53.amazonaws.com/doc/2013-04-01/"
+
+
+class FakeRoute53:
+    """Route53 stand-in listening on a random local port"""
+
+    def __init__(self, page_size: int = 300) -> None:
+        self.page_size = page_size
+        self.zones = {}
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(self))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.05,),
+                                       daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        """Base url of the stand-in"""
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def add_zone(self, zone_id: str, name: str, private: bool = False):
+        """Add a hosted zone"""
+        self.zones[zone_id] = {"name": name.rstrip(".") + ".", "private": private, "rrsets": {}}
+
+    def add_record(self, zone_id: str, name: str, rtype: str, ttl: int, *values):
+        """Add a record set to a hosted zone"""
+        self.zones[zone_id]["rrsets"][(name.rstrip(".") + ".", rtype)] = (ttl, list(values))
+
+    def get_record(self, zone_id: str, name: str, rtype: str = "AAAA"):
+        """Return the ttl and values of a record set, None if missing"""
+        return self.zones[zone_id]["rrsets"].get((name.rstrip(".") + ".", rtype))
+
+    def calls(self, method: str):
+        """Return the requests made with the given method"""
+        return [request for request in self.requests if request[0] == method]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _error(status, code, message):
+    return status, f'<ErrorResponse xmlns="{XMLNS}"><Error><Code>{code}</Code>'\
+        f'<Message>{escape(message)}</Message></Error></ErrorResponse>'
+
+
+def _list_zones(fake, query):
+    zone_ids = sorted(fake.zones)
+    start = zone_ids.index(query["marker"]) if "marker" in query else 0
+    page = zone_ids[start:start + min(int(query.get("maxitems", 100)), fake.page_size)]
+    body = "".join(
+        f'<HostedZone><Id>/hostedzone/{zone_id}</Id><Name>{fake.zones[zone_id]["name"]}</Name>'
+        f'<Config><PrivateZone>{str(fake.zones[zone_id]["private"]).lower()}</PrivateZone>'
+        '</Config></HostedZone>'
+        for zone_id in page
+    )
+    more = start + len(page) < len(zone_ids)
+    tail = f"<NextMarker>{zone_ids[start + len(page)]}</NextMarker>" if more else ""
+    return 200, f'<ListHostedZonesResponse xmlns="{XMLNS}"><HostedZones>{body}</HostedZones>'\
+        f'<IsTruncated>{str(more).lower()}</IsTruncated>{tail}</ListHostedZonesResponse>'
+
+
+def _order(key):
+    """Route53 lists the record sets by labels from the right, then by type"""
+    name, rtype = key
+    return tuple(reversed(name.rstrip(".").split("."))), rtype
+
+
+def _list_rrsets(zone, query):
+    keys = sorted(zone["rrsets"], key=_order)
+    start = 0
+    if "name" in query:
+        # like Route53, start at the first record set at or after the given name
+        orders = [_order(key) for key in keys]
+        start = bisect.bisect_left(orders, _order((query["name"], query.get("type", ""))))
+    page = keys[start:start + min(int(query.get("maxitems", 300)), zone["page_size"])]
+    body = ""
+    for name, rtype in page:
+        ttl, values = zone["rrsets"][(name, rtype)]
+        records = "".join(f"<ResourceRecord><Value>{value}</Value></ResourceRecord>"
+                          for value in values)
+        body += f"<ResourceRecordSet><Name>{name}</Name><Type>{rtype}</Type><TTL>{ttl}</TTL>"\
+            f"<ResourceRecords>{records}</ResourceRecords></ResourceRecordSet>"
+    tail = ""
+    more = start + len(page) < len(keys)
+    if more:
+        name, rtype = keys[start + len(page)]
+        tail = f"<NextRecordName>{name}</NextRecordName><NextRecordType>{rtype}</NextRecordType>"
+    return 200, f'<ListResourceRecordSetsResponse xmlns="{XMLNS}"><ResourceRecordSets>{body}'\
+        f'</ResourceRecordSets><IsTruncated>{str(more).lower()}</IsTruncated>{tail}'\
+        '</ListResourceRecordSetsResponse>'
+
+
+def _change_rrsets(zone, body):
+    namespaces = {"r": XMLNS}
+    changes = ET.fromstring(body).findall("r:ChangeBatch/r:Changes/r:Change", namespaces)
+    weight = sum(2 if change.find("r:Action", namespaces).text == "UPSERT" else 1
+                 for change in changes)
+    if weight > 1000:
+        return _error(400, "InvalidChangeBatch", "Number of records limit of 1000 exceeded.")
+    for change in changes:
+        rrset = change.find("r:ResourceRecordSet", namespaces)
+        name = rrset.find("r:Name", namespaces).text.rstrip(".") + "."
+        values = [value.text for value in rrset.iterfind(".//r:Value", namespaces)]
+        zone["rrsets"][(name, rrset.find("r:Type", namespaces).text)] = \
+            (int(rrset.find("r:TTL", namespaces).text), values)
+    return 200, f'<ChangeResourceRecordSetsResponse xmlns="{XMLNS}"><ChangeInfo>'\
+        '<Id>/change/C1</Id><Status>PENDING</Status></ChangeInfo>'\
+        '</ChangeResourceRecordSetsResponse>'
+
+
+def _handler(fake):
+
+    class Handler(BaseHTTPRequestHandler):
+        """Request handler of the stand-in"""
+
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        # pylint: disable=locally-disabled, invalid-name
+        def do_GET(self):
+            """Handle the list requests"""
+            self._handle("GET")
+
+        # pylint: disable=locally-disabled, invalid-name
+        def do_POST(self):
+            """Handle the change requests"""
+            self._handle("POST")
+
+        def log_message(self, *args):  # pylint: disable=locally-disabled, arguments-differ
+            pass
+
+        def _handle(self, method):
+            url = urllib.parse.urlsplit(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query))
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            with fake.lock:
+                fake.requests.append((method, url.path, query, body))
+                fake.connections.add(self.client_address)
+                status, response = self._dispatch(method, url.path.split("/"), query, body)
+
+            data = response.encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "text/xml")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _dispatch(self, method, parts, query, body):
+            if not self.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256 "):
+                return _error(403, "MissingAuthenticationToken", "Missing Authentication Token")
+            if parts[2:] == ["hostedzone"] and method == "GET":
+                return _list_zones(fake, query)
+            if len(parts) == 5 and parts[2] == "hostedzone" and parts[4] == "rrset":
+                if parts[3] not in fake.zones:
+                    return _error(404, "NoSuchHostedZone", f"No hosted zone found with ID: "
+                                  f"{parts[3]}")
+                zone = dict(fake.zones[parts[3]], page_size=fake.page_size)
+                if method == "GET":
+                    return _list_rrsets(zone, query)
+                return _change_rrsets(fake.zones[parts[3]], body)
+            return _error(404, "NotFound", self.path)
+
+    return Handler
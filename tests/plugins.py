@@ -1,8 +1,12 @@
 """
-Plugins for test cases
+Plugins and workflows for test cases
 """
+import asyncio
+import queue
 from ipv6ddns import plugin
+from ipv6ddns.ddns import DDNSWorkflow
 from ipv6ddns.domain import FirewallEntry, ZoneRecord
+from ipv6ddns.resolver import netlink
 
 
 class InMemoryDNSPlugin(plugin.DNSPlugin):
@@ -80,6 +84,10 @@ class InMemoryFirewallPlugin(plugin.FirewallPlugin):
                 'protocol': entry.protocol
             }
 
+    def delete_entries(self, entries) -> None:
+        for entry in entries:
+            self.entries.pop(entry.entry_id, None)
+
     def set_entries(self, entries):
         """Set the entries in firewall to desired entries
 
@@ -93,3 +101,98 @@ class InMemoryFirewallPlugin(plugin.FirewallPlugin):
                 'port': entry.port,
                 'protocol': entry.protocol
             }
+
+
+class FakeNetlinkSource:
+    """Netlink message source which replays messages built from in-memory
+    addresses instead of talking to the kernel. Notifications can be pushed
+    using the notify method.
+    """
+
+    def __init__(self, addresses=None) -> None:
+        self.addresses = list(addresses) if addresses else []
+        self.messages = queue.Queue()
+        self.groups = None
+        self.dumps = 0
+        self.closed = False
+
+    def open(self, groups=0):
+        """Record the multicast groups"""
+        self.groups = groups
+
+    def request_dump(self):
+        """Queue the dump of all the addresses"""
+        self.dumps += 1
+        data = b"".join(
+            netlink.pack_message(netlink.RTM_NEWADDR, netlink.NLM_F_MULTI, self.dumps,
+                                 netlink.pack_address(address))
+            for address in self.addresses
+        )
+        self.messages.put(data + netlink.pack_message(
+            netlink.NLMSG_DONE, netlink.NLM_F_MULTI, self.dumps, b"\0" * 4))
+
+    def notify(self, msg_type, address):
+        """Queue a RTM_NEWADDR or RTM_DELADDR notification
+
+        Args:
+            msg_type (int): message type
+            address (InterfaceAddress): the address added or removed
+        """
+        if msg_type == netlink.RTM_NEWADDR:
+            self.addresses.append(address)
+        else:
+            self.addresses = [a for a in self.addresses if a.packed != address.packed]
+        self.messages.put(netlink.pack_message(msg_type, 0, 0, netlink.pack_address(address)))
+
+    def receive(self, timeout=None):
+        """Return the next queued buffer, None on timeout"""
+        try:
+            return self.messages.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        """Mark the source closed"""
+        self.closed = True
+
+
+class InMemoryAsyncDNSPlugin(plugin.AsyncDNSPlugin):
+    """Async DNS plugin which stores the records in memory, shared by all
+    instances. Each call waits for `delay` seconds on the event loop.
+    """
+
+    delay = 0.0
+    records = {}
+
+    @staticmethod
+    def get_name() -> str:
+        return "in-memory-async"
+
+    async def get_aaaa_records(self):
+        await asyncio.sleep(self.delay)
+        return [
+            ZoneRecord(fqdn, self.records[fqdn], 60)
+            for fqdn in self.ctx_plugin.fqdns
+            if fqdn in self.records
+        ]
+
+    async def upsert_records(self, records) -> None:
+        await asyncio.sleep(self.delay)
+        for record in records:
+            self.records[record.name] = record.ip_addr
+
+
+def create_workflow(context, workflow=DDNSWorkflow, ip_addr="2001:db8::1"):
+    """Create a workflow resolving a fixed address
+
+    Args:
+        context (DDNSContext): execution context
+        workflow (type, optional): workflow class. Defaults to DDNSWorkflow.
+        ip_addr (str, optional): resolved address. Defaults to 2001:db8::1.
+
+    Returns:
+        DDNSWorkflow: the workflow
+    """
+    flow = workflow(context)
+    flow.ipv6.resolve = lambda: ip_addr
+    return flow
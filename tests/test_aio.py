@@ -0,0 +1,157 @@
+"""
+Tests for the asyncio workflow engine
+"""
+import asyncio
+import logging
+import threading
+import time
+import pytest
+from ipv6ddns import plugin
+from ipv6ddns.aio import AsyncContextRunner, AsyncDDNSWorkflow, AsyncPluginAdapter
+from ipv6ddns.cli import Cli
+from ipv6ddns.ddns import DDNSWorkflow
+from ipv6ddns.runner import EXIT_DEADLINE, EXIT_FAILED
+from tests.plugins import InMemoryAsyncDNSPlugin
+
+
+class StaticResolverPlugin(plugin.IPResolverPlugin):
+    """Blocking resolver which records the threads it is called from"""
+
+    threads = []
+
+    @staticmethod
+    def get_name() -> str:
+        return "static"
+
+    def resolve(self):
+        StaticResolverPlugin.threads.append(threading.current_thread())
+        logging.warning("resolving %s", self.ctx_plugin.host_id)
+        return "2001:db8::1"
+
+
+@pytest.fixture(name="plugin_manager")
+def fixture_plugin_manager(plugin_manager):
+    """Plugin manager with the test plugins registered"""
+    plugin_manager.register(InMemoryAsyncDNSPlugin)
+    plugin_manager.register(StaticResolverPlugin)
+    InMemoryAsyncDNSPlugin.records = {}
+    InMemoryAsyncDNSPlugin.delay = 0.0
+    StaticResolverPlugin.threads = []
+    return plugin_manager
+
+
+def create_context(context_factory, host):
+    """Create a context for the host using the async DNS plugin"""
+    ctx = context_factory(
+        dns=InMemoryAsyncDNSPlugin.get_name(), domain=[f"{host}.example.com"],
+        firewall=plugin.PluginManager.PLUGIN_NAME_NOOP, tcp_port=[], host_id=host,
+        resolver=StaticResolverPlugin.get_name(),
+    )
+    ctx.ctx_id = host
+    ctx.ipv6.host_id = host
+    return ctx
+
+
+def test_async_workflow(context_factory):
+    """Tests that async plugins are awaited and blocking plugins run in the executor"""
+    ctx = create_context(context_factory, "nas")
+
+    assert AsyncContextRunner().run([ctx]) == [0]
+    assert InMemoryAsyncDNSPlugin.records == {"nas.example.com": "2001:db8::1"}
+    assert StaticResolverPlugin.threads[0] is not threading.current_thread()
+
+
+def test_many_contexts_on_one_loop(context_factory, caplog):
+    """Tests that contexts run concurrently and logs keep the context order"""
+    InMemoryAsyncDNSPlugin.delay = 0.05
+    contexts = [create_context(context_factory, f"host{i}") for i in range(200)]
+
+    start = time.monotonic()
+    assert AsyncContextRunner(jobs=200).run(contexts) == [0] * 200
+    assert time.monotonic() - start < 5
+    assert len(InMemoryAsyncDNSPlugin.records) == 200
+
+    resolving = [r.getMessage() for r in caplog.records if r.getMessage().startswith("resolv")]
+    assert resolving == [f"resolving host{i}" for i in range(200)]
+
+
+def test_workflows_are_closed(context_factory, monkeypatch):
+    """Tests that the plugins of every context are closed after the run,
+    whether it succeeds, fails or passes the deadline
+    """
+    closed = []
+
+    async def get_aaaa_records(self):
+        fqdn = self.ctx_plugin.fqdns[0]
+        if fqdn.startswith("failed"):
+            raise RuntimeError("boom")
+        if fqdn.startswith("slow"):
+            await asyncio.sleep(5)
+        return []
+    monkeypatch.setattr(InMemoryAsyncDNSPlugin, "get_aaaa_records", get_aaaa_records)
+    monkeypatch.setattr(InMemoryAsyncDNSPlugin, "close",
+                        lambda self: closed.append(self.ctx_plugin.fqdns[0]), raising=False)
+    contexts = [create_context(context_factory, host) for host in ("ok", "failed", "slow")]
+
+    assert AsyncContextRunner(jobs=3, deadline=0.5).run(contexts) \
+        == [0, EXIT_FAILED, EXIT_DEADLINE]
+    assert sorted(closed) == ["failed.example.com", "ok.example.com", "slow.example.com"]
+
+
+def test_deadline(context_factory):
+    """Tests that a context exceeding the deadline is cancelled"""
+    InMemoryAsyncDNSPlugin.delay = 5
+    ctx = create_context(context_factory, "nas")
+
+    start = time.monotonic()
+    assert AsyncContextRunner(deadline=0.1).run([ctx]) == [EXIT_DEADLINE]
+    assert time.monotonic() - start < 1
+
+
+def test_timeout(context_factory):
+    """Tests that a plugin call exceeding the timeout fails the run"""
+    InMemoryAsyncDNSPlugin.delay = 5
+    ctx = create_context(context_factory, "nas")
+    ctx.common.timeout = 0.1
+
+    with pytest.raises(TimeoutError, match="get_aaaa_records"):
+        asyncio.run(AsyncDDNSWorkflow(ctx).fetch_async())
+
+
+def test_blocking_plugin_which_is_not_thread_safe(context_factory, monkeypatch):
+    """Tests that plugins which are not thread-safe are called on the loop thread"""
+    ctx = create_context(context_factory, "nas")
+    monkeypatch.setattr(StaticResolverPlugin, "is_thread_safe", staticmethod(lambda: False))
+    adapter = AsyncPluginAdapter(StaticResolverPlugin(ctx.common, ctx.ipv6))
+
+    coro = adapter.call("resolve")
+    with pytest.raises(StopIteration) as result:
+        coro.send(None)
+    assert result.value.value == "2001:db8::1"
+    assert StaticResolverPlugin.threads == [threading.current_thread()]
+
+
+def test_sync_workflow_runs_async_plugins(context_factory):
+    """Tests that the blocking workflow can use async plugins"""
+    ctx = create_context(context_factory, "nas")
+
+    assert DDNSWorkflow(ctx).run() == 0
+    assert InMemoryAsyncDNSPlugin.records == {"nas.example.com": "2001:db8::1"}
+
+
+def test_cli_asyncio():
+    """Tests the cli with the asyncio engine"""
+    cli = Cli(cli_args=["--asyncio", "--jobs", "10", "--assume-yes", "--domain", "example.com"])
+
+    with pytest.raises(SystemExit) as sys_exit:
+        cli.execute()
+    assert sys_exit.value.code == 0
+
+
+def test_async_invalid_resolved_address_fails_the_run(context_factory, monkeypatch):
+    """Tests that an invalid address from the resolver fails the async run"""
+    monkeypatch.setattr(StaticResolverPlugin, "resolve", lambda self: "2001:db8::x")
+    ctx = create_context(context_factory, "nas")
+
+    assert AsyncContextRunner().run([ctx]) == [1]
+    assert not InMemoryAsyncDNSPlugin.records
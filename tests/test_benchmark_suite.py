@@ -0,0 +1,73 @@
+"""
+Tests for the baseline and comparison of the benchmark suite
+"""
+import pytest
+from benchmarks import suite
+from benchmarks.bench_reconcile import build_dns, build_fw
+from ipv6ddns.ddns import DDNSWorkflow
+
+
+def test_reconcile_data_has_every_kind_of_change():
+    """Tests that a tenth of the benchmark records are added, updated and
+    deleted, so every path of the reconciliation is measured
+    """
+    for diff, build in ((DDNSWorkflow.get_dns_diff, build_dns),
+                        (DDNSWorkflow.get_fw_diff, build_fw)):
+        changes = diff(*build(100))
+
+        assert (len(changes.adds), len(changes.updates), len(changes.deletes)) == (10, 10, 10)
+
+
+def test_baseline_round_trip(tmp_path):
+    """Tests that saved results are loaded back"""
+    results = {"workflow.dns_diff[10]": {"seconds": 0.001, "units": 10}}
+    path = tmp_path / "baseline.json"
+
+    suite.save_baseline(path, results)
+
+    assert suite.load_baseline(path) == results
+
+
+def test_load_invalid_baseline(tmp_path):
+    """Tests that files which are not baselines are rejected"""
+    path = tmp_path / "baseline.json"
+    path.write_text("{}")
+
+    with pytest.raises(ValueError):
+        suite.load_baseline(path)
+
+
+def test_compare_flags_regressions():
+    """Tests that only the cases slower than the threshold are regressions,
+    and cases missing from the baseline are skipped
+    """
+    baseline = {"a": {"seconds": 1.0, "units": 1}, "b": {"seconds": 1.0, "units": 1}}
+    results = {"a": {"seconds": 1.1, "units": 1}, "b": {"seconds": 1.5, "units": 1},
+               "c": {"seconds": 9.0, "units": 1}}
+
+    rows = suite.compare(baseline, results, 0.25)
+
+    assert rows == [("a", pytest.approx(1.1), False), ("b", pytest.approx(1.5), True)]
+
+
+def test_startup_cases_run_the_command_line():
+    """Tests that the startup cases time runs of the command line which
+    succeed, the unchanged run included
+    """
+    names = []
+    for name, _, func in suite.startup_cases():
+        seconds, _ = func()
+        assert seconds > 0
+        names.append(name)
+
+    assert names == ["startup.help", "startup.unchanged"]
+
+
+def test_run_suite_filter():
+    """Tests that the cases are measured and filtered by name"""
+    cases = [("fast", 2, lambda: None), ("skipped", 1, lambda: None)]
+
+    results = suite.run_suite(cases, repeat=2, name_filter="fast", min_time=0.001)
+
+    assert list(results) == ["fast"]
+    assert results["fast"]["units"] == 2
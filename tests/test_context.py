@@ -2,7 +2,11 @@
 Tests for execution context classes
 """
 import argparse
-from ipv6ddns.context import ArgparseContextParser
+import json
+import pytest
+from ipv6ddns.cli import Cli
+from ipv6ddns.context import ArgparseContextParser, ConfigError, FileContextParser, \
+    get_toml_parser
 from ipv6ddns import plugin
 
 
@@ -107,3 +111,140 @@ def test_custom_args_are_parsed_correctly():
     assert ctx.fqdns == namespace.domain
     assert getattr(ctx, "arg") == namespace.dns_arg
     assert getattr(ctx, "disable")
+
+
+def write_config(tmp_path, name, config):
+    """Write a JSON config file and return its path"""
+    path = tmp_path / name
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return str(path)
+
+
+def test_file_contexts_are_parsed_correctly(tmp_path):
+    """Tests that each host in a config file becomes a context and that
+    shared settings are reused between the contexts
+    """
+    plugin_manager = plugin.PluginManager()
+    plugin_manager.discover()
+    plugin_manager.register(SampleDNSPlugin)
+    path = write_config(tmp_path, "hosts.json", {
+        "defaults": {
+            "dns": SampleDNSPlugin.get_name(),
+            "interval": 120,
+            "dns_options": {"arg": "shared"},
+            "tcp_ports": [443],
+        },
+        "hosts": [
+            {"host_id": "nas", "domains": ["nas.example.com"]},
+            {
+                "host_id": "proxy",
+                "domains": ["example.com", "www.example.com"],
+                "tcp_ports": [80, 443],
+                "udp_ports": [1191],
+                "dns": plugin.PluginManager.PLUGIN_NAME_NOOP,
+            },
+            {"host_id": "nvr", "dns_options": {"arg": "own"}},
+        ],
+    })
+
+    contexts = FileContextParser(plugin_manager, path).parse()
+
+    assert [ctx.ctx_id for ctx in contexts] == ["nas", "proxy", "nvr"]
+    nas, proxy, nvr = contexts
+    assert nas.common is proxy.common is nvr.common
+    assert nas.common.interval == 120
+
+    assert nas.dns.plugin == SampleDNSPlugin
+    assert nas.dns.fqdns == ["nas.example.com"]
+    assert nas.dns.arg == "shared"
+    assert nas.dns.defaults is nvr.dns.defaults
+    assert "arg" not in vars(nas.dns)
+    assert nas.firewall.tcp_ports == [443]
+    assert nas.firewall.udp_ports == []
+    assert nas.firewall.host_id == "nas"
+    assert nas.ipv6.plugin == plugin.IPResolverPlugin
+
+    assert proxy.dns.plugin == plugin.DNSPlugin
+    assert "arg" not in proxy.dns.defaults
+    assert proxy.firewall.tcp_ports == [80, 443]
+    assert proxy.firewall.udp_ports == [1191]
+
+    assert nvr.dns.arg == "own"
+    assert nvr.dns.fqdns == []
+
+
+def test_file_contexts_use_cli_flags(tmp_path):
+    """Tests that the command line flags apply to every host"""
+    plugin_manager = plugin.PluginManager()
+    plugin_manager.discover()
+    namespace = argparse.Namespace(dry_run=True, force=False, assume_yes=True)
+    path = write_config(tmp_path, "hosts.json", {"hosts": [{"host_id": "nas"}]})
+
+    contexts = FileContextParser(plugin_manager, path, namespace).parse()
+
+    assert contexts[0].common.dry_run
+    assert contexts[0].common.assume_yes
+
+
+@pytest.mark.parametrize("config, message", [
+    ({"hosts": [{"domains": ["example.com"]}]}, "hosts\\[0\\] has no host_id"),
+    ({"hosts": [{"host_id": "nas", "dns": "unknown"}]}, "unknown dns plugin 'unknown'"),
+    ({"hosts": {"host_id": "nas"}}, "'hosts' a list"),
+    ({"hosts": [{"host_id": "nas", "domains": "nas.example.com"}]},
+     "hosts\\[0\\] domains must be a list of str"),
+    ({"hosts": [{"host_id": "nas", "tcp_ports": ["80"]}]},
+     "hosts\\[0\\] tcp_ports must be a list of int"),
+    ({"defaults": {"udp_ports": 1191}, "hosts": [{"host_id": "nas"}]},
+     "hosts\\[0\\] udp_ports must be a list of int"),
+    ({"hosts": [{"host_id": "nas", "tcp_ports": [True]}]},
+     "hosts\\[0\\] tcp_ports must be a list of int"),
+])
+def test_invalid_file_contexts(tmp_path, config, message):
+    """Tests that invalid config files raise ConfigError"""
+    plugin_manager = plugin.PluginManager()
+    plugin_manager.discover()
+    path = write_config(tmp_path, "hosts.json", config)
+
+    with pytest.raises(ConfigError, match=message):
+        FileContextParser(plugin_manager, path).parse()
+
+
+def test_toml_file_contexts(tmp_path):
+    """Tests that TOML config files are parsed"""
+    if get_toml_parser() is None:
+        pytest.skip("TOML parser not available")
+    plugin_manager = plugin.PluginManager()
+    plugin_manager.discover()
+    path = tmp_path / "hosts.toml"
+    path.write_text(
+        '[defaults]\n'
+        'interval = 60\n'
+        '[[hosts]]\n'
+        'host_id = "nas"\n'
+        'domains = ["nas.example.com"]\n'
+        'tcp_ports = [443]\n',
+        encoding="utf-8",
+    )
+
+    contexts = FileContextParser(plugin_manager, str(path)).parse()
+
+    assert len(contexts) == 1
+    assert contexts[0].common.interval == 60
+    assert contexts[0].dns.fqdns == ["nas.example.com"]
+    assert contexts[0].firewall.tcp_ports == [443]
+
+
+def test_cli_with_config(tmp_path):
+    """Tests running the cli over a config file"""
+    path = write_config(tmp_path, "hosts.json", {
+        "hosts": [{"host_id": f"host{i}", "domains": [f"host{i}.example.com"]}
+                  for i in range(10)]
+    })
+
+    with pytest.raises(SystemExit) as sys_exit:
+        Cli(cli_args=["--config", path, "--assume-yes", "--jobs", "4"]).execute()
+    assert sys_exit.value.code == 0
+
+    with pytest.raises(SystemExit) as sys_exit:
+        Cli(cli_args=["--config", str(tmp_path / "missing.json")]).execute()
+    assert sys_exit.value.code == 3
@@ -1,12 +1,17 @@
 """
 Tests for ddns workflow
 """
+import threading
+import time
 import pytest
 from ipv6ddns.cli import Cli
 from ipv6ddns.context import ArgparseContextParser
 from ipv6ddns.ddns import DDNSWorkflow
-from ipv6ddns.domain import ZoneRecord, FirewallEntry, Protocol
+from ipv6ddns.domain import ZoneRecord, FirewallEntry, Protocol, ValidationError
 from ipv6ddns.plugin import PluginManager
+from ipv6ddns.reconcile import fw_entry_id
+from ipv6ddns.resolver.procfs import ProcfsResolverPlugin
+from tests.plugins import InMemoryDNSPlugin, InMemoryFirewallPlugin
 
 
 @pytest.fixture()
@@ -46,6 +51,8 @@ def full_context(plugin_manager):
         "443",
         "--udp-port",
         "1191",
+        "--host-id",
+        "nas",
         "--assume-yes",
     ]
     cli = Cli(args)
@@ -92,8 +99,9 @@ def test_get_fw_diff_no_old_records():
     fw_diff = DDNSWorkflow.get_fw_diff(old, new)
 
     assert len(fw_diff) == 1
-    assert not fw_diff[0][0]
-    assert fw_diff[0][1] == new[0]
+    assert list(fw_diff.adds.values()) == [new[0]]
+    assert not fw_diff.updates
+    assert not fw_diff.deletes
 
 
 def test_get_fw_diff_update_records():
@@ -112,8 +120,9 @@ def test_get_fw_diff_update_records():
     fw_diff = DDNSWorkflow.get_fw_diff(old, new)
 
     assert len(fw_diff) == 1
-    assert fw_diff[0][0] == old[0]
-    assert fw_diff[0][1] == new[0]
+    assert list(fw_diff.updates.values()) == [(old[0], new[0])]
+    assert not fw_diff.adds
+    assert not fw_diff.deletes
 
 
 def test_get_fw_diff_no_changes():
@@ -142,8 +151,9 @@ def test_get_dns_diff_no_old_records():
     diff = DDNSWorkflow.get_dns_diff(old, new)
 
     assert len(diff) == 1
-    assert not diff[0][0]
-    assert diff[0][1] == new[0]
+    assert diff.adds == {"example.com": new[0]}
+    assert not diff.updates
+    assert not diff.deletes
 
 
 def test_get_dns_diff_update_records():
@@ -154,8 +164,9 @@ def test_get_dns_diff_update_records():
     diff = DDNSWorkflow.get_dns_diff(old, new)
 
     assert len(diff) == 1
-    assert diff[0][0] == old[0]
-    assert diff[0][1] == new[0]
+    assert diff.updates == {"example.com": (old[0], new[0])}
+    assert not diff.adds
+    assert not diff.deletes
 
 
 def test_get_dns_diff_no_update():
@@ -168,37 +179,76 @@ def test_get_dns_diff_no_update():
     assert not diff
 
 
+def test_get_dns_diff_deleted_records():
+    """Test get_dns_diff when existing records are no longer expected"""
+    old = [
+        ZoneRecord("example.com", "0001:db8:3333:4444:5555:6666:7777:8888", 60),
+        ZoneRecord("old.example.com", "0001:db8:3333:4444:5555:6666:7777:8888", 60),
+    ]
+    new = [ZoneRecord("example.com", "0001:db8:3333:4444:5555:6666:7777:8888", 60)]
+
+    diff = DDNSWorkflow.get_dns_diff(old, new)
+
+    assert len(diff) == 1
+    assert diff.deletes == {"old.example.com": old[1]}
+    assert not diff.changes()
+
+
+def test_get_fw_diff_matches_on_entry_id():
+    """Test get_fw_diff matches entries on their id in a single pass"""
+    ip_addr = "0001:db8:3333:4444:5555:6666:7777:8888"
+    old = [
+        FirewallEntry("fw:tcp:80", ip_addr, 80, Protocol.TCP),
+        FirewallEntry("fw:udp:80", ip_addr, 80, Protocol.UDP),
+        FirewallEntry("fw:tcp:22", ip_addr, 22, Protocol.TCP),
+    ]
+    new = [
+        FirewallEntry("fw:udp:80", ip_addr, 80, Protocol.UDP),
+        FirewallEntry("fw:tcp:80", "0001:db8:3333:4444:5555:6666:7777:8889", 80, Protocol.TCP),
+        FirewallEntry("fw:tcp:443", ip_addr, 443, Protocol.TCP),
+    ]
+
+    fw_diff = DDNSWorkflow.get_fw_diff(old, new)
+
+    assert fw_diff.adds == {"fw:tcp:443": new[2]}
+    assert fw_diff.updates == {"fw:tcp:80": (old[0], new[1])}
+    assert fw_diff.deletes == {"fw:tcp:22": old[2]}
+    assert fw_diff.changes() == [(None, new[2]), (old[0], new[1])]
+
+
 def test_print_diff():
     """Test print_diff"""
-    dns_diff = [
-        (
+    dns_diff = DDNSWorkflow.get_dns_diff(
+        [
             ZoneRecord("example.com", "0001:db8:3333:4444:5555:6666:7777:8889", 60),
+            ZoneRecord("old.example.com", "0001:db8:3333:4444:5555:6666:7777:8889", 60),
+        ],
+        [
             ZoneRecord("example.com", "0001:db8:3333:4444:5555:6666:7777:8888", 60),
-        ),
-        (
-            None,
             ZoneRecord(
                 "site.example.com", "0001:db8:3333:4444:5555:6666:7777:8888", 60
             ),
-        ),
-    ]
+        ],
+    )
 
-    fw_diff = [
-        (
+    fw_diff = DDNSWorkflow.get_fw_diff(
+        [
             FirewallEntry(
                 "fw:1", "0001:db8:3333:4444:5555:6666:7777:8889", 80, Protocol.TCP
             ),
+            FirewallEntry(
+                "fw:2", "0001:db8:3333:4444:5555:6666:7777:8889", 22, Protocol.TCP
+            ),
+        ],
+        [
             FirewallEntry(
                 "fw:1", "0001:db8:3333:4444:5555:6666:7777:8888", 80, Protocol.TCP
             ),
-        ),
-        (
-            None,
             FirewallEntry(
                 "fw:1", "0001:db8:3333:4444:5555:6666:7777:8888", 443, Protocol.TCP
             ),
-        ),
-    ]
+        ],
+    )
 
     DDNSWorkflow.print_diff("0001:db8:3333:4444:5555:6666:7777:8888", dns_diff, fw_diff)
 
@@ -221,20 +271,23 @@ def test_expected_fw_entries(full_context):
     correctly
     """
     ip_addr = "0001:db8:3333:4444:5555:6666:7777:8888"
+    canonical = "1:db8:3333:4444:5555:6666:7777:8888"
     workflow = DDNSWorkflow(full_context)
     entries = workflow.get_expected_fw_entries(ip_addr)
 
     assert len(entries) == 3
 
-    assert entries[0].ip_addr == ip_addr
+    assert entries[0].entry_id == "ipv6ddns-nas-tcp-80"
+    assert entries[0].ip_addr == canonical
     assert entries[0].protocol == Protocol.TCP
     assert entries[0].port == 80
 
-    assert entries[1].ip_addr == ip_addr
+    assert entries[1].ip_addr == canonical
     assert entries[1].protocol == Protocol.TCP
     assert entries[1].port == 443
 
-    assert entries[2].ip_addr == ip_addr
+    assert entries[2].entry_id == "ipv6ddns-nas-udp-1191"
+    assert entries[2].ip_addr == canonical
     assert entries[2].protocol == Protocol.UDP
     assert entries[2].port == 1191
 
@@ -257,16 +310,17 @@ def test_expected_dns_entries(full_context):
     correctly
     """
     ip_addr = "0001:db8:3333:4444:5555:6666:7777:8888"
+    canonical = "1:db8:3333:4444:5555:6666:7777:8888"
     workflow = DDNSWorkflow(full_context)
     records = workflow.get_expected_dns_records(ip_addr)
 
     assert len(records) == 2
 
-    assert records[0].ip_addr == ip_addr
+    assert records[0].ip_addr == canonical
     assert records[0].name == "example.com"
     assert records[0].ttl == 60
 
-    assert records[1].ip_addr == ip_addr
+    assert records[1].ip_addr == canonical
     assert records[1].name == "site.example.com"
     assert records[1].ttl == 60
 
@@ -313,6 +367,19 @@ def test_ddns_works_correctly_with_yes(input_context, monkeypatch):
     assert result == 0
 
 
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_dry_run_does_not_prompt_or_write(input_context, monkeypatch):
+    """Test that a dry run prints the changes and stops, without asking for
+    a confirmation or writing anything
+    """
+    input_context.common.dry_run = True
+    monkeypatch.setattr("builtins.input", lambda _: pytest.fail("no prompt expected"))
+    workflow = DDNSWorkflow(input_context)
+    workflow.update = lambda *writes: pytest.fail("no writes expected")
+
+    assert workflow.run() == 0
+
+
 # pylint: disable=locally-disabled, redefined-outer-name
 def test_ddns_works_correctly_empty(empty_context):
     """Test that expected firewall entries are created
@@ -321,3 +388,228 @@ def test_ddns_works_correctly_empty(empty_context):
     workflow = DDNSWorkflow(empty_context)
     result = workflow.run()
     assert result == 0
+
+
+def slow(result, calls):
+    """Return a plugin method which takes 0.2s and records the calling thread"""
+    def method():
+        calls.append(threading.current_thread())
+        time.sleep(0.2)
+        return result
+    return method
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_fetch_is_concurrent(full_context):
+    """Test that resolve, get_aaaa_records and get_entries run concurrently"""
+    calls = []
+    workflow = DDNSWorkflow(full_context)
+    workflow.ipv6.resolve = slow("2001:db8::1", calls)
+    workflow.dns.get_aaaa_records = slow([], calls)
+    workflow.firewall.get_entries = slow([], calls)
+
+    start = time.monotonic()
+    assert workflow.fetch() == ("2001:db8::1", [], [])
+    assert time.monotonic() - start < 0.5
+    assert threading.current_thread() not in calls
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_fetch_sequential(full_context, monkeypatch):
+    """Test that fetch calls the plugins from the calling thread when asked to,
+    or when a plugin is not thread-safe
+    """
+    calls = []
+    workflow = DDNSWorkflow(full_context)
+    workflow.ipv6.resolve = slow("2001:db8::1", calls)
+    full_context.common.sequential = True
+
+    assert workflow.fetch() == ("2001:db8::1", [], [])
+    assert calls == [threading.current_thread()]
+
+    full_context.common.sequential = False
+    monkeypatch.setattr(workflow.dns, "is_thread_safe", lambda: False)
+    assert not workflow.is_concurrent()
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_fetch_timeout(full_context):
+    """Test that a plugin call exceeding the timeout fails the run"""
+    workflow = DDNSWorkflow(full_context)
+    workflow.dns.get_aaaa_records = slow([], [])
+    full_context.common.timeout = 0.05
+
+    with pytest.raises(TimeoutError, match="get_aaaa_records"):
+        workflow.run()
+
+
+def fetched(ip_addr, records, entries):
+    """Return a fetch method which returns the given state"""
+    return lambda curr_ip=None: (ip_addr, records, entries)
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_update_writes_only_changes(full_context, caplog):
+    """Test that only new and changed records and entries are written"""
+    ip_addr = "0001:db8:3333:4444:5555:6666:7777:8888"
+    written = []
+    workflow = DDNSWorkflow(full_context)
+    workflow.fetch = fetched(ip_addr, [
+        ZoneRecord("example.com", ip_addr, 60),
+        ZoneRecord("site.example.com", "0001:db8:3333:4444:5555:6666:7777:8889", 60),
+    ], [
+        FirewallEntry("ipv6ddns-nas-tcp-80", ip_addr, 80, Protocol.TCP),
+        FirewallEntry("ipv6ddns-nas-tcp-443", ip_addr, 443, Protocol.TCP),
+    ])
+    workflow.update = lambda *writes: written.extend(writes)
+
+    caplog.set_level("INFO")
+    assert workflow.run() == 0
+
+    records, entries, deletes = written
+    assert [record.name for record in records] == ["site.example.com"]
+    assert [(entry.protocol, entry.port) for entry in entries] == [(Protocol.UDP, 1191)]
+    assert not deletes
+    assert "(3 writes avoided)" in caplog.text
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_update_force_writes_all(full_context):
+    """Test that --force writes all the expected records and entries"""
+    ip_addr = "0001:db8:3333:4444:5555:6666:7777:8888"
+    written = []
+    full_context.common.force = True
+    workflow = DDNSWorkflow(full_context)
+    workflow.fetch = fetched(ip_addr, [
+        ZoneRecord("example.com", ip_addr, 60),
+        ZoneRecord("site.example.com", ip_addr, 60),
+    ], [])
+    workflow.update = lambda *writes: written.extend(writes)
+
+    assert workflow.run() == 0
+
+    records, entries, _ = written
+    assert len(records) == 2
+    assert len(entries) == 3
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_spellings_of_an_address_are_not_changes(full_context):
+    """Test that the same address spelled differently by the resolver and
+    the providers is not a change
+    """
+    workflow = DDNSWorkflow(full_context)
+    workflow.fetch = fetched("2001:0DB8:0:0::1", [
+        ZoneRecord("example.com", "2001:db8::1", 60),
+        ZoneRecord("site.example.com", "2001:0db8:0000:0000:0000:0000:0000:0001", 60),
+    ], [
+        FirewallEntry("ipv6ddns-nas-tcp-80", "2001:DB8::1", 80, Protocol.TCP),
+        FirewallEntry("ipv6ddns-nas-tcp-443", "2001:db8:0::1", 443, Protocol.TCP),
+        FirewallEntry("ipv6ddns-nas-udp-1191", "2001:db8::0:1", 1191, Protocol.UDP),
+    ])
+    workflow.update = lambda *writes: pytest.fail("no writes expected")
+
+    assert workflow.run() == 0
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_resolved_address_is_canonical(full_context):
+    """Test that the resolved address is validated and made canonical"""
+    workflow = DDNSWorkflow(full_context)
+    workflow.ipv6.resolve = lambda: "2001:0DB8::0001"
+
+    assert workflow.resolve() == "2001:db8::1"
+    assert workflow.fetch()[0] == "2001:db8::1"
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_invalid_resolved_address_fails_the_run(full_context):
+    """Test that an invalid address from the resolver fails the run before
+    anything is written
+    """
+    workflow = DDNSWorkflow(full_context)
+    workflow.ipv6.resolve = lambda: "192.0.2.1"
+    workflow.update = lambda *writes: pytest.fail("no writes expected")
+
+    with pytest.raises(ValidationError, match="192.0.2.1") as err:
+        workflow.run()
+    assert err.value.plugin_name == full_context.ipv6.plugin.get_name()
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_empty_resolved_address_fails_the_run(full_context):
+    """Test that a resolver finding no address fails the run before anything
+    is planned or written, unless it is the noop resolver
+    """
+    full_context.ipv6.plugin = ProcfsResolverPlugin
+    workflow = DDNSWorkflow(full_context)
+    workflow.ipv6.resolve = lambda: ""
+    workflow.plan = lambda *fetched: pytest.fail("no plan expected")
+    workflow.update = lambda *writes: pytest.fail("no writes expected")
+
+    with pytest.raises(ValidationError, match="No IPV6 address") as err:
+        workflow.run()
+    assert err.value.plugin_name == "procfs"
+
+
+def test_cli_reports_empty_resolved_address(monkeypatch):
+    """Test that a resolver finding no address fails the command line with an
+    exit code instead of a traceback
+    """
+    monkeypatch.setattr(ProcfsResolverPlugin, "resolve", lambda self: "")
+    cli = Cli(["--domain", "example.com", "--resolver", "procfs", "--assume-yes"])
+
+    with pytest.raises(SystemExit) as sys_exit:
+        cli.execute()
+    assert sys_exit.value.code != 0
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_stale_entries_of_the_host_are_deleted(full_context):
+    """Test that the entries of removed ports are deleted, and the entries of
+    other hosts or added by hand are left alone
+    """
+    ip_addr = "2001:db8::1"
+    written = []
+    workflow = DDNSWorkflow(full_context)
+    stale = FirewallEntry(fw_entry_id("nas", Protocol.TCP, 22), ip_addr, 22, Protocol.TCP)
+    workflow.fetch = fetched(ip_addr, [
+        ZoneRecord("example.com", ip_addr, 60),
+        ZoneRecord("site.example.com", ip_addr, 60),
+    ], [
+        FirewallEntry("ipv6ddns-nas-tcp-80", ip_addr, 80, Protocol.TCP),
+        FirewallEntry("ipv6ddns-nas-tcp-443", ip_addr, 443, Protocol.TCP),
+        FirewallEntry("ipv6ddns-nas-udp-1191", ip_addr, 1191, Protocol.UDP),
+        stale,
+        FirewallEntry("ipv6ddns-nas-2-tcp-22", ip_addr, 22, Protocol.TCP),
+        FirewallEntry("ipv6ddns-proxy-tcp-22", ip_addr, 22, Protocol.TCP),
+        FirewallEntry("ssh", ip_addr, 22, Protocol.TCP),
+    ])
+    workflow.update = lambda *writes: written.extend(writes)
+
+    assert workflow.run() == 0
+    assert written == [[], [], [stale]]
+
+
+# pylint: disable=locally-disabled, redefined-outer-name
+def test_entries_are_applied_by_id(full_context):
+    """Test that a second run against the firewall written by the first one
+    has nothing to do
+    """
+    dns = InMemoryDNSPlugin(full_context.common, full_context.dns)
+    firewall = InMemoryFirewallPlugin(full_context.common, full_context.firewall)
+    firewall.set_entries([
+        FirewallEntry(fw_entry_id("nas", Protocol.UDP, 53), "2001:db8::1", 53, Protocol.UDP),
+        FirewallEntry("ssh", "2001:db8::1", 22, Protocol.TCP),
+    ])
+    for _ in range(2):
+        workflow = DDNSWorkflow(full_context)
+        workflow.dns, workflow.firewall = dns, firewall
+        workflow.ipv6.resolve = lambda: "2001:db8::2"
+        assert workflow.run() == 0
+
+    assert sorted(firewall.entries) == [
+        "ipv6ddns-nas-tcp-443", "ipv6ddns-nas-tcp-80", "ipv6ddns-nas-udp-1191", "ssh",
+    ]
+    workflow.update = lambda *writes: pytest.fail("no writes expected")
+    assert workflow.run() == 0
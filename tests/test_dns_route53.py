@@ -0,0 +1,256 @@
+"""
+Tests for the Route53 DNS plugin, run against a local stand-in of the API
+"""
+import types
+import pytest
+from ipv6ddns.context import CommonContext, DNSContext
+from ipv6ddns.domain import ZoneRecord
+from ipv6ddns.ratelimit import RateLimit, get_bucket
+from ipv6ddns_dns_route53.client import Credentials, Route53Error, normalize_name, sign
+from ipv6ddns_dns_route53.route53 import Route53DNSPlugin
+from ipv6ddns_dns_route53.zones import ZoneCache, ZoneTrie, default_cache_path
+from tests.clock import SimulatedClock
+from tests.fake_route53 import FakeRoute53
+
+
+@pytest.fixture(name="fake")
+def fixture_fake(tmp_path, monkeypatch):
+    """Route53 stand-in with a zone, a delegated sub zone and a private zone"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    with FakeRoute53(page_size=2) as fake:
+        fake.add_zone("Z1", "example.com")
+        fake.add_zone("Z2", "lab.example.com")
+        fake.add_zone("Z3", "example.com", private=True)
+        fake.add_record("Z1", "example.com", "NS", 172800, "ns-1.awsdns.com.")
+        fake.add_record("Z1", "example.com", "AAAA", 300, "2001:db8::1")
+        fake.add_record("Z1", "www.example.com", "A", 300, "192.0.2.1")
+        fake.add_record("Z1", "www.example.com", "AAAA", 300, "2001:db8::2")
+        fake.add_record("Z2", "nas.lab.example.com", "AAAA", 60, "2001:db8::3")
+        yield fake
+
+
+def create_plugin(fake, fqdns, connections=4, zone_cache_ttl=3600, rate_limit=0):
+    """Create the plugin for the stand-in, without rate limit by default"""
+    ctx = DNSContext()
+    ctx.plugin = Route53DNSPlugin
+    ctx.fqdns = fqdns
+    ctx.access_key_id = "AKIDEXAMPLE"
+    ctx.secret_access_key = "secret"
+    ctx.session_token = None
+    ctx.endpoint = fake.endpoint
+    ctx.connections = connections
+    ctx.zone_cache = default_cache_path()
+    ctx.zone_cache_ttl = zone_cache_ttl
+    ctx.rate_limit = rate_limit
+    ctx.rate_burst = 1
+    return Route53DNSPlugin(CommonContext(), ctx)
+
+
+def test_sign():
+    """Tests the signature against the example of the AWS documentation"""
+    authorization = sign(
+        "GET", "/", {"Action": "ListUsers", "Version": "2010-05-08"},
+        {
+            "Content-Type": "application/x-www-form-urlencoded; charset=utf-8",
+            "Host": "iam.amazonaws.com",
+            "X-Amz-Date": "20150830T123600Z",
+        },
+        b"", Credentials("AKIDEXAMPLE", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY"),
+        "us-east-1", "iam", "20150830T123600Z",
+    )
+
+    assert authorization == "AWS4-HMAC-SHA256"\
+        " Credential=AKIDEXAMPLE/20150830/us-east-1/iam/aws4_request,"\
+        " SignedHeaders=content-type;host;x-amz-date,"\
+        " Signature=5d672d79c15b13162d9279b0855cfba6789a8edb4c82c400e06b5924a6f2b5d7"
+
+
+def test_normalize_name():
+    """Tests that names from Route53 are normalized"""
+    assert normalize_name("WWW.Example.com.") == "www.example.com"
+    assert normalize_name("\\052.example.com.") == "*.example.com"
+
+
+def test_get_aaaa_records(fake):
+    """Tests that records are read from the longest matching public zone,
+    following the pagination
+    """
+    plugin = create_plugin(fake, ["example.com", "www.example.com", "nas.lab.example.com",
+                                  "missing.example.com"])
+
+    records = plugin.get_aaaa_records()
+
+    assert [(r.name, r.ip_addr, r.ttl) for r in records] == [
+        ("example.com", "2001:db8::1", 300),
+        ("www.example.com", "2001:db8::2", 300),
+        ("nas.lab.example.com", "2001:db8::3", 60),
+    ]
+    rrset_pages = [r for r in fake.calls("GET") if r[1].endswith("/hostedzone/Z1/rrset")]
+    assert len(rrset_pages) == 2
+    assert not [r for r in fake.calls("GET") if "Z3" in r[1]]
+
+
+def test_get_aaaa_records_lists_only_the_managed_names(fake):
+    """Tests that the record sets are listed from the first managed name and
+    the listing stops past the last one, instead of paging through the zone
+    """
+    fake.add_record("Z1", "a.example.com", "AAAA", 300, "2001:db8::4")
+    for i in range(10):
+        fake.add_record("Z1", f"host{i}.example.com", "AAAA", 300, "2001:db8::5")
+    fake.add_record("Z1", "host3.example.com", "A", 300, "192.0.2.3")
+    plugin = create_plugin(fake, ["host4.example.com", "host3.example.com"])
+
+    records = plugin.get_aaaa_records()
+
+    assert [(r.name, r.ip_addr) for r in records] == [
+        ("host4.example.com", "2001:db8::5"),
+        ("host3.example.com", "2001:db8::5"),
+    ]
+    rrset_pages = [r for r in fake.calls("GET") if r[1].endswith("/hostedzone/Z1/rrset")]
+    query = rrset_pages[0][2]
+    assert (query["name"], query["type"]) == ("host3.example.com", "AAAA")
+    # 2 record sets per page: host3 and host4, then host5 ends the listing
+    assert len(rrset_pages) == 2
+
+
+def test_upsert_records_batches(fake):
+    """Tests that changes are sent in batches within the limits of the API"""
+    plugin = create_plugin(fake, [])
+    records = [ZoneRecord(f"host{i}.example.com", "2001:db8::10", 60) for i in range(1201)]
+    records.append(ZoneRecord("nas.lab.example.com", "2001:db8::11", 60))
+
+    plugin.upsert_records(records)
+
+    posts = fake.calls("POST")
+    assert sorted(body.count(b"<Change>") for _, _, _, body in posts) == [1, 201, 500, 500]
+    assert fake.get_record("Z1", "host1200.example.com") == (60, ["2001:db8::10"])
+    assert fake.get_record("Z2", "nas.lab.example.com") == (60, ["2001:db8::11"])
+
+
+def test_connections_are_reused(fake):
+    """Tests that requests share a small pool of keep-alive connections"""
+    plugin = create_plugin(fake, ["example.com", "nas.lab.example.com"], connections=2)
+
+    for _ in range(5):
+        plugin.get_aaaa_records()
+    plugin.close()
+
+    assert len(fake.requests) > 10
+    assert plugin.client.pool.created <= 2
+    assert len(fake.connections) <= 2
+
+
+def test_no_hosted_zone(fake):
+    """Tests that names outside of the hosted zones are reported"""
+    plugin = create_plugin(fake, ["example.org"])
+
+    with pytest.raises(ValueError, match="example.org"):
+        plugin.get_aaaa_records()
+
+
+def test_api_error(fake):
+    """Tests that API errors are raised with their code"""
+    plugin = create_plugin(fake, [])
+
+    with pytest.raises(Route53Error) as error:
+        list(plugin.client.list_resource_record_sets("Z9"))
+    assert error.value.code == "NoSuchHostedZone"
+    assert error.value.status == 404
+
+
+def test_validate():
+    """Tests that credentials are required"""
+    context = types.SimpleNamespace(dns=types.SimpleNamespace(access_key_id=None,
+                                                              secret_access_key=None))
+
+    errors = Route53DNSPlugin.validate(context)
+
+    assert len(errors) == 1
+    assert errors[0].plugin_name == "route53"
+
+
+def list_zone_calls(fake):
+    """Return the ListHostedZones requests for the first page made to the stand-in"""
+    return [r for r in fake.calls("GET")
+            if r[1].endswith("/hostedzone") and "marker" not in r[2]]
+
+
+def test_zone_trie():
+    """Tests the longest-suffix match of the zone trie"""
+    trie = ZoneTrie([("Z1", "example.com"), ("Z2", "lab.example.com"), ("Z3", "com")])
+
+    assert trie.find("nas.lab.example.com") == ("Z2", "lab.example.com")
+    assert trie.find("lab.example.com") == ("Z2", "lab.example.com")
+    assert trie.find("xlab.example.com") == ("Z1", "example.com")
+    assert trie.find("example.org") is None
+    assert len(trie) == 3
+
+
+def test_zone_cache(tmp_path):
+    """Tests that cached zones expire and are scoped to the account"""
+    now = [1000.0]
+    path = str(tmp_path / "zones.json")
+    ZoneCache(path, 60, "account", clock=lambda: now[0]).save([("Z1", "example.com")])
+
+    assert ZoneCache(path, 60, "account", clock=lambda: now[0]).load() == [("Z1", "example.com")]
+    assert ZoneCache(path, 60, "other", clock=lambda: now[0]).load() is None
+    now[0] += 61
+    assert ZoneCache(path, 60, "account", clock=lambda: now[0]).load() is None
+
+
+def test_hosted_zones_are_cached_on_disk(fake):
+    """Tests that the hosted zones are listed once across plugin instances"""
+    create_plugin(fake, ["www.example.com"]).get_aaaa_records()
+    create_plugin(fake, ["www.example.com"]).get_aaaa_records()
+
+    assert len(list_zone_calls(fake)) == 1
+
+
+def test_zone_cache_disabled(fake):
+    """Tests that a ttl of 0 lists the hosted zones on every run"""
+    plugin = create_plugin(fake, ["www.example.com"], zone_cache_ttl=0)
+    plugin.get_aaaa_records()
+    plugin.get_aaaa_records()
+
+    assert len(list_zone_calls(fake)) == 2
+
+
+def test_unknown_zone_invalidates_cache(fake):
+    """Tests that the cache is refreshed when a cached zone no longer exists"""
+    create_plugin(fake, []).get_zone_trie()
+    fake.zones["Z4"] = fake.zones.pop("Z2")
+
+    create_plugin(fake, []).upsert_records([ZoneRecord("nas.lab.example.com", "2001:db8::4", 60)])
+
+    assert len(list_zone_calls(fake)) == 2
+    assert fake.get_record("Z4", "nas.lab.example.com") == (60, ["2001:db8::4"])
+    assert create_plugin(fake, []).get_zone_trie().find("lab.example.com")[0] == "Z4"
+
+
+def test_new_zone_refreshes_cache(fake):
+    """Tests that a name without a cached zone lists the zones again"""
+    create_plugin(fake, []).get_zone_trie()
+    fake.add_zone("Z5", "example.net")
+    fake.add_record("Z5", "example.net", "AAAA", 60, "2001:db8::5")
+
+    records = create_plugin(fake, ["example.net"]).get_aaaa_records()
+
+    assert [r.ip_addr for r in records] == ["2001:db8::5"]
+    assert len(list_zone_calls(fake)) == 2
+
+
+def test_every_request_takes_a_token(fake):
+    """Tests that the rate limit counts each API request, including the zone
+    listing and every page of the record sets
+    """
+    clock = SimulatedClock()
+    get_bucket(RateLimit(f"route53:{fake.endpoint}#AKIDEXAMPLE", rate=1, burst=1),
+               clock=clock, sleep=clock.sleep)
+    plugin = create_plugin(fake, ["example.com", "www.example.com", "nas.lab.example.com"],
+                           rate_limit=1)
+
+    plugin.get_aaaa_records()
+
+    assert len(fake.requests) > 3
+    assert len(clock.sleeps) == len(fake.requests) - 1
+    assert clock() - 1000 == pytest.approx(len(fake.requests) - 1)
@@ -0,0 +1,102 @@
+"""
+Tests for the domain entities
+"""
+import copy
+import pickle
+import pytest
+from ipv6ddns.domain import (
+    FirewallEntry,
+    Protocol,
+    ValidationError,
+    ZoneRecord,
+    canonical_address,
+    format_address,
+    pack_address,
+)
+
+
+def test_records_are_values():
+    """Tests that records with the same fields are equal and hash alike"""
+    record = ZoneRecord("example.com", "2001:db8::1", 60)
+
+    assert record == ZoneRecord("example.com", "2001:db8::1", 60)
+    assert record != ZoneRecord("example.com", "2001:db8::1", 300)
+    assert record != ZoneRecord("example.com", "2001:db8::2", 60)
+    assert len({record, ZoneRecord("example.com", "2001:db8::1", 60)}) == 1
+    assert {record: 1}[ZoneRecord("example.com", "2001:db8::1", 60)] == 1
+
+
+def test_entries_are_values():
+    """Tests that firewall entries with the same fields are equal and hash alike"""
+    entry = FirewallEntry("fw:1", "2001:db8::1", 80, Protocol.TCP)
+
+    assert entry == FirewallEntry("fw:1", "2001:db8::1", 80, Protocol.TCP)
+    assert entry != FirewallEntry("fw:1", "2001:db8::1", 80, Protocol.UDP)
+    assert entry != FirewallEntry("fw:2", "2001:db8::1", 80, Protocol.TCP)
+    assert len({entry, FirewallEntry("fw:1", "2001:db8::1", 80, Protocol.TCP)}) == 1
+    assert entry != ZoneRecord("fw:1", "2001:db8::1", 80)
+
+
+def test_values_are_immutable():
+    """Tests that the fields cannot be changed or added"""
+    record = ZoneRecord("example.com", "2001:db8::1", 60)
+    entry = FirewallEntry("fw:1", "2001:db8::1", 80, Protocol.TCP)
+
+    with pytest.raises(AttributeError):
+        record.ttl = 300
+    with pytest.raises(AttributeError):
+        entry.port = 443
+    with pytest.raises(AttributeError):
+        del record.name
+    with pytest.raises(AttributeError):
+        record.extra = 1
+    assert not hasattr(record, "__dict__")
+
+
+def test_addresses_are_packed():
+    """Tests that addresses are stored packed and rendered canonically"""
+    record = ZoneRecord("example.com", "2001:0DB8:0:0::0001", 60)
+
+    assert record.packed == bytes.fromhex("20010db8000000000000000000000001")
+    assert record.ip_addr == "2001:db8::1"
+    assert record == ZoneRecord("example.com", record.packed, 60)
+    assert ZoneRecord("example.com", "", 60).ip_addr == ""
+    assert format_address(pack_address("::ffff:192.0.2.1")) == "::ffff:c000:201"
+
+
+@pytest.mark.parametrize("ip_addr", ["192.0.2.1", "2001:db8::g", "example.com", b"\x01" * 4])
+def test_invalid_addresses_are_rejected(ip_addr):
+    """Tests that only IPV6 addresses are accepted"""
+    with pytest.raises(ValidationError) as err:
+        ZoneRecord("example.com", ip_addr, 60)
+    assert err.value.plugin_name == "domain"
+    assert isinstance(err.value, ValueError)
+
+
+def test_values_can_be_copied_and_pickled():
+    """Tests that copies and pickles are equal to the original"""
+    record = ZoneRecord("example.com", "2001:db8::1", 60)
+    entry = FirewallEntry("fw:1", "2001:db8::1", 80, Protocol.TCP)
+
+    for value in (record, entry):
+        assert copy.copy(value) == value
+        assert copy.deepcopy(value) == value
+        assert pickle.loads(pickle.dumps(value)) == value
+
+
+@pytest.mark.parametrize("ip_addr", [
+    "2001:db8::1", "2001:DB8::1", "2001:0db8:0:0::1", "2001:db8:0:0:0:0:0:1",
+    bytes.fromhex("20010db8000000000000000000000001"),
+])
+def test_canonical_address(ip_addr):
+    """Tests that all the spellings of an address have the same canonical form"""
+    assert canonical_address(ip_addr) == "2001:db8::1"
+
+
+def test_validation_error_is_an_exception():
+    """Tests that validation errors can be returned and raised"""
+    error = ValidationError("route53", "Missing credentials.")
+
+    assert str(error) == "[route53] Missing credentials."
+    with pytest.raises(ValidationError, match="Missing credentials"):
+        raise error
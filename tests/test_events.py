@@ -0,0 +1,138 @@
+"""
+Tests for the timing events of the workflow
+"""
+import asyncio
+import json
+import logging
+import pytest
+from ipv6ddns import events
+from ipv6ddns.aio import AsyncDDNSWorkflow
+from tests.plugins import create_workflow
+
+
+class RecordingListener(events.TimingListener):
+    """Listener keeping the events it receives"""
+
+    def __init__(self) -> None:
+        self.phases = []
+        self.runs = []
+
+    def on_phase(self, timings, phase) -> None:
+        self.phases.append(phase)
+
+    def on_run(self, timings) -> None:
+        self.runs.append(timings)
+
+
+@pytest.fixture(name="listener")
+def fixture_listener():
+    """Listener registered for the test"""
+    listener = RecordingListener()
+    events.add_listener(listener)
+    yield listener
+    events.remove_listener(listener)
+
+
+@pytest.fixture(name="context_args")
+def fixture_context_args():
+    """Contexts with a second domain"""
+    return ["--domain", "site.example.com"]
+
+
+def test_no_listener_records_nothing(context):
+    """Tests that timings are only recorded with listeners"""
+    workflow = create_workflow(context)
+
+    assert workflow.run() == 0
+    assert workflow.timings is None
+    assert events.start_run("nas") is None
+
+
+def test_run_timings(context, listener):
+    """Tests that each phase and plugin call is recorded with its count, and
+    the run summary holds all of them
+    """
+    workflow = create_workflow(context)
+
+    assert workflow.run() == 0
+
+    assert len(listener.runs) == 1
+    timings = listener.runs[0]
+    phases = {phase.name: phase for phase in timings.phases}
+    assert set(phases) == {"ipv6.resolve", "dns.get_aaaa_records", "fw.get_entries", "fetch",
+                           "plan", "dns.upsert_records", "fw.apply_entries", "update"}
+    assert listener.phases == timings.phases
+    assert phases["dns.upsert_records"].plugin == "in-memory"
+    assert phases["dns.upsert_records"].count == 2
+    assert phases["fw.apply_entries"].count == 1
+    assert phases["plan"].count == 3
+    assert phases["update"].count == 3
+    assert all(phase.outcome == events.OUTCOME_OK for phase in timings.phases)
+    assert phases["fetch"].start <= phases["plan"].start <= phases["update"].start
+    assert phases["update"].start <= phases["dns.upsert_records"].start \
+        <= phases["dns.upsert_records"].end <= phases["update"].end
+
+    summary = json.loads(json.dumps(timings.as_dict()))
+    assert summary["ctx_id"] == context.ctx_id
+    assert summary["result"] == 0
+    assert summary["outcome"] == events.OUTCOME_OK
+    assert summary["duration"] >= sum(phase["duration"] for phase in summary["phases"]
+                                      if phase["name"] in ("fetch", "plan", "update"))
+
+
+def test_failed_call(context, listener):
+    """Tests that a failing plugin call fails its phase and the run"""
+    context.common.sequential = True
+    context.common.retries = 0
+    workflow = create_workflow(context)
+
+    def fail():
+        raise ConnectionError("unreachable")
+    workflow.firewall.get_entries = fail
+
+    with pytest.raises(ConnectionError):
+        workflow.run()
+
+    phases = {phase.name: phase for phase in listener.runs[0].phases}
+    assert phases["fw.get_entries"].outcome == events.OUTCOME_ERROR
+    assert phases["fw.get_entries"].error == "ConnectionError"
+    assert phases["fetch"].error == "ConnectionError"
+    assert "plan" not in phases
+    assert listener.runs[0].error == "ConnectionError"
+    assert listener.runs[0].result is None
+
+
+def test_failing_listener_does_not_fail_the_run(context, listener, caplog):
+    """Tests that errors of listeners are logged and ignored"""
+    def fail(timings):
+        raise RuntimeError("broken listener")
+    listener.on_run = fail
+
+    assert create_workflow(context).run() == 0
+    assert "broken listener" in caplog.text
+
+
+def test_async_run_timings(context, listener):
+    """Tests that the async workflow records the same phases"""
+    workflow = create_workflow(context, AsyncDDNSWorkflow)
+
+    assert asyncio.run(workflow.run_async()) == 0
+
+    names = {phase.name for phase in listener.runs[0].phases}
+    assert names == {"ipv6.resolve", "dns.get_aaaa_records", "fw.get_entries", "fetch",
+                     "plan", "dns.upsert_records", "fw.apply_entries", "update"}
+
+
+def test_log_listener(context, caplog):
+    """Tests that the summary is logged as JSON"""
+    listener = events.LogTimingListener()
+    events.add_listener(listener)
+    try:
+        with caplog.at_level(logging.INFO):
+            create_workflow(context).run()
+    finally:
+        events.remove_listener(listener)
+
+    line = next(record.getMessage() for record in caplog.records
+                if record.getMessage().startswith("Timings of"))
+    assert json.loads(line.split(": ", 1)[1])["ctx_id"] == context.ctx_id
@@ -0,0 +1,195 @@
+"""
+Tests for the Asus WRT firewall plugin, run against a local shell stand-in
+of the router
+"""
+import argparse
+import types
+import pytest
+from ipv6ddns import plugin
+from ipv6ddns.context import ArgparseContextParser, CommonContext, FirewallContext
+from ipv6ddns.ddns import DDNSWorkflow
+from ipv6ddns.domain import FirewallEntry, Protocol
+from ipv6ddns_firewall_asuswrt.asuswrt import AsusWrtFirewallPlugin, RULELIST, format_rules, \
+    parse_rules
+from ipv6ddns_firewall_asuswrt.session import SessionError, ShellSession
+from tests.fake_asuswrt import FakeRouter
+
+
+OTHER_RULES = "<ssh>>2001:db8::9>22>TCP<games>>2001:db8::9>27000:27100>UDP"\
+    "<dns>2001:db8:1::/48>2001:db8::9>53>BOTH"
+
+
+@pytest.fixture(name="router")
+def fixture_router(tmp_path):
+    """Router stand-in with rules added by hand"""
+    router = FakeRouter(tmp_path / "router")
+    router.set_nvram(RULELIST, OTHER_RULES)
+    yield router
+
+
+def create_plugin(router, control_persist=0):
+    """Create the plugin for the stand-in"""
+    ctx = FirewallContext()
+    ctx.plugin = AsusWrtFirewallPlugin
+    ctx.host_id = "nas"
+    ctx.host = "router.lan"
+    ctx.port = 22
+    ctx.user = "admin"
+    ctx.identity = None
+    ctx.ssh_command = router.ssh
+    ctx.control_persist = control_persist
+    return AsusWrtFirewallPlugin(CommonContext(), ctx)
+
+
+def test_rules_round_trip():
+    """Tests that rules are written back as they were read"""
+    rules = parse_rules(OTHER_RULES + "\n")
+
+    assert rules[0] == ["ssh", "", "2001:db8::9", "22", "TCP"]
+    assert format_rules(rules) == OTHER_RULES
+    assert not parse_rules("\n")
+
+
+def test_get_entries(router):
+    """Tests that the rules are read with one command, and rules which cannot
+    be managed are skipped
+    """
+    router.set_nvram(RULELIST, OTHER_RULES + "<ipv6ddns-nas-tcp-443>>2001:db8::1>443>TCP")
+    firewall = create_plugin(router)
+
+    entries = firewall.get_entries()
+    firewall.close()
+
+    assert entries == [
+        FirewallEntry("ssh", "2001:db8::9", 22, Protocol.TCP),
+        FirewallEntry("ipv6ddns-nas-tcp-443", "2001:db8::1", 443, Protocol.TCP),
+    ]
+    assert router.calls("nvram") == [f"nvram get {RULELIST}"]
+
+
+def test_apply_entries_commits_once(router):
+    """Tests that all the changes are written with one commit and one restart,
+    keeping the rules of others
+    """
+    router.set_nvram(RULELIST, OTHER_RULES + "<ipv6ddns-nas-tcp-22>>2001:db8::1>22>TCP"
+                     "<ipv6ddns-nas-tcp-80>>2001:db8::1>80>TCP")
+    firewall = create_plugin(router)
+
+    firewall.apply_entries(
+        [FirewallEntry("ipv6ddns-nas-tcp-80", "2001:db8::2", 80, Protocol.TCP),
+         FirewallEntry("ipv6ddns-nas-udp-53", "2001:db8::2", 53, Protocol.UDP)],
+        [FirewallEntry("ipv6ddns-nas-tcp-22", "2001:db8::1", 22, Protocol.TCP)],
+    )
+    firewall.close()
+
+    assert router.get_nvram(RULELIST) == OTHER_RULES + \
+        "<ipv6ddns-nas-tcp-80>>2001:db8::2>80>TCP<ipv6ddns-nas-udp-53>>2001:db8::2>53>UDP"
+    assert len(router.calls("nvram set")) == 1
+    assert len(router.calls("nvram commit")) == 1
+    assert router.calls("service") == ["service restart_firewall"]
+
+
+def test_apply_without_changes_does_not_commit(router):
+    """Tests that the firewall is not restarted when nothing changes"""
+    router.set_nvram(RULELIST, OTHER_RULES + "<ipv6ddns-nas-tcp-80>>2001:db8::1>80>TCP")
+    firewall = create_plugin(router)
+
+    firewall.apply_entries([], [])
+    firewall.save_entries([FirewallEntry("ipv6ddns-nas-tcp-80", "2001:db8::1", 80, Protocol.TCP)])
+    firewall.close()
+
+    assert not router.calls("nvram commit")
+    assert not router.calls("service")
+
+
+def test_workflow_uses_one_session(router):
+    """Tests that the runs of a workflow share one SSH session, and a second
+    run has nothing to write
+    """
+    manager = plugin.PluginManager()
+    manager.discover()
+    manager.register(AsusWrtFirewallPlugin)
+    namespace = argparse.Namespace(
+        assume_yes=True, dry_run=False, force=False, dns="noop", domain=[],
+        firewall="asuswrt", tcp_port=[80, 443], udp_port=[53], host_id="nas", resolver="noop",
+        fw_host="router.lan", fw_port=22, fw_user="admin", fw_identity=None,
+        fw_ssh_command=router.ssh, fw_control_persist=0,
+    )
+    ctx = ArgparseContextParser(manager, namespace).parse()[0]
+    workflow = DDNSWorkflow(ctx)
+    workflow.ipv6.resolve = lambda: "2001:db8::1"
+
+    try:
+        assert workflow.run() == 0
+        assert workflow.run() == 0
+    finally:
+        workflow.close()
+
+    assert len(router.calls("ssh")) == 1
+    assert len(router.calls("nvram commit")) == 1
+    assert router.get_nvram(RULELIST) == OTHER_RULES + \
+        "<ipv6ddns-nas-tcp-80>>2001:db8::1>80>TCP<ipv6ddns-nas-tcp-443>>2001:db8::1>443>TCP"\
+        "<ipv6ddns-nas-udp-53>>2001:db8::1>53>UDP"
+
+
+def test_session_runs_commands():
+    """Tests that commands share one shell, with their output and status"""
+    session = ShellSession(["sh"], timeout=5)
+    try:
+        assert session.run("X=1; echo hello") == "hello\n"
+        assert session.run("printf $X") == "1"
+        assert session.run("echo oops >&2; false", check=False) == "oops\n"
+        with pytest.raises(SessionError) as err:
+            session.run("false")
+        assert err.value.status == 1
+        assert session.started == 1
+    finally:
+        session.close()
+
+
+def test_session_is_restarted():
+    """Tests that a closed session is started again"""
+    session = ShellSession(["sh"], timeout=5)
+    try:
+        session.run("true")
+        session._proc.kill()  # pylint: disable=locally-disabled, protected-access
+        session._proc.wait()  # pylint: disable=locally-disabled, protected-access
+
+        assert session.run("echo back") == "back\n"
+        assert session.started == 2
+    finally:
+        session.close()
+
+
+def test_session_timeout():
+    """Tests that a command without a response fails the session"""
+    session = ShellSession(["sh"], timeout=0.2)
+    with pytest.raises(SessionError, match="No response"):
+        session.run("sleep 5")
+    assert session.run("echo back") == "back\n"
+    session.close()
+
+
+def test_ssh_argv(router, tmp_path, monkeypatch):
+    """Tests the ssh command line"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    firewall = create_plugin(router, control_persist=300)
+    firewall.ctx_plugin.identity = "/keys/router"
+
+    argv = firewall.get_ssh_argv()
+
+    assert argv[0] == router.ssh
+    assert argv[-2:] == ["admin@router.lan", "sh"]
+    assert "/keys/router" in argv
+    assert f"ControlPath={tmp_path / 'cache' / 'ipv6ddns' / 'ssh' / '%C'}" in argv
+    assert "ControlPersist=300" in argv
+
+
+def test_validate():
+    """Tests that the router is required"""
+    context = types.SimpleNamespace(firewall=types.SimpleNamespace(host=None, host_id="a<b"))
+
+    errors = AsusWrtFirewallPlugin.validate(context)
+
+    assert len(errors) == 2
+    assert errors[0].plugin_name == "asuswrt"
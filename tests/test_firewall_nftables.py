@@ -0,0 +1,178 @@
+"""
+Tests for the nftables firewall plugin, run against a fake nft on the PATH
+"""
+import argparse
+import os
+import types
+import pytest
+from ipv6ddns import plugin
+from ipv6ddns.context import ArgparseContextParser, CommonContext, FirewallContext
+from ipv6ddns.ddns import DDNSWorkflow
+from ipv6ddns.domain import FirewallEntry, Protocol
+from ipv6ddns_firewall_nftables.nftables import NftablesFirewallPlugin, NftError, parse_rule, \
+    render_chain
+from tests.fake_nftables import FakeNft
+
+
+CHAIN = "inet filter ipv6ddns"
+
+
+def rule(comment, ip_addr, port, protocol="tcp"):
+    """Rule accepting a port of an address, in the JSON format of nft"""
+    return {"comment": comment, "expr": [
+        {"match": {"op": "==", "left": {"payload": {"protocol": "ip6", "field": "daddr"}},
+                   "right": ip_addr}},
+        {"match": {"op": "==", "left": {"payload": {"protocol": protocol, "field": "dport"}},
+                   "right": port}},
+        {"accept": None},
+    ]}
+
+
+@pytest.fixture(name="nft")
+def fixture_nft(tmp_path, monkeypatch):
+    """Fake nft on the PATH, with a rule of another host"""
+    nft = FakeNft(tmp_path / "nft")
+    nft.set_chains({CHAIN: [rule("ipv6ddns-tv-udp-53", "2001:db8::9", 53, "udp")]})
+    monkeypatch.setenv("PATH", nft.bin + os.pathsep + os.environ["PATH"])
+    yield nft
+
+
+def create_plugin():
+    """Create the plugin with the default chain"""
+    ctx = FirewallContext()
+    ctx.plugin = NftablesFirewallPlugin
+    ctx.host_id = "nas"
+    ctx.nft = "nft"
+    ctx.family = "inet"
+    ctx.table = "filter"
+    ctx.chain = "ipv6ddns"
+    return NftablesFirewallPlugin(CommonContext(), ctx)
+
+
+def test_rules_round_trip(nft):
+    """Tests that rendered rules are read back as the same entries"""
+    entries = [FirewallEntry("ipv6ddns-nas-tcp-443", "2001:db8::1", 443, Protocol.TCP),
+               FirewallEntry("ipv6ddns-nas-udp-53", "2001:db8::1", 53, Protocol.UDP)]
+    firewall = create_plugin()
+
+    firewall.nft("-f", "-", script=render_chain("inet", "filter", "ipv6ddns", entries))
+
+    assert firewall.get_entries() == entries
+    assert parse_rule({"comment": "x", "expr": [{"drop": None}]}) is None
+
+
+def test_get_entries(nft):
+    """Tests that the chain is read with one dump, and rules which cannot be
+    managed are skipped
+    """
+    nft.set_chains({CHAIN: [
+        rule("ipv6ddns-nas-tcp-443", "2001:db8::1", 443),
+        {"comment": "by hand", "expr": [{"drop": None}]},
+    ]})
+
+    entries = create_plugin().get_entries()
+
+    assert entries == [FirewallEntry("ipv6ddns-nas-tcp-443", "2001:db8::1", 443, Protocol.TCP)]
+    assert nft.calls() == [f"nft -j list chain {CHAIN}"]
+
+
+def test_get_entries_without_chain(nft):
+    """Tests that a missing chain has no entries"""
+    nft.set_chains({})
+
+    assert not create_plugin().get_entries()
+
+
+def test_get_entries_without_nft(nft):
+    """Tests that a missing nft command is raised rather than read as an empty
+    chain
+    """
+    firewall = create_plugin()
+    firewall.ctx_plugin.nft = os.path.join(nft.root, "missing", "nft")
+
+    with pytest.raises(FileNotFoundError):
+        firewall.get_entries()
+
+
+def test_apply_entries_in_one_transaction(nft):
+    """Tests that all the changes are applied with one nft transaction, keeping
+    the rules of other hosts
+    """
+    nft.set_chains({CHAIN: [
+        rule("ipv6ddns-tv-udp-53", "2001:db8::9", 53, "udp"),
+        rule("ipv6ddns-nas-tcp-22", "2001:db8::1", 22),
+        rule("ipv6ddns-nas-tcp-80", "2001:db8::1", 80),
+    ]})
+
+    create_plugin().apply_entries(
+        [FirewallEntry("ipv6ddns-nas-tcp-80", "2001:db8::2", 80, Protocol.TCP),
+         FirewallEntry("ipv6ddns-nas-udp-53", "2001:db8::2", 53, Protocol.UDP)],
+        [FirewallEntry("ipv6ddns-nas-tcp-22", "2001:db8::1", 22, Protocol.TCP)],
+    )
+
+    assert nft.get_chains()[CHAIN] == [
+        rule("ipv6ddns-tv-udp-53", "2001:db8::9", 53, "udp"),
+        rule("ipv6ddns-nas-tcp-80", "2001:db8::2", 80),
+        rule("ipv6ddns-nas-udp-53", "2001:db8::2", 53, "udp"),
+    ]
+    assert nft.calls("nft -f") == ["nft -f -"]
+
+
+def test_apply_without_changes_does_not_write(nft):
+    """Tests that nothing is loaded when nothing changes"""
+    firewall = create_plugin()
+
+    firewall.apply_entries([], [])
+    firewall.save_entries([FirewallEntry("ipv6ddns-tv-udp-53", "2001:db8::9", 53, Protocol.UDP)])
+
+    assert not nft.calls("nft -f")
+
+
+def test_failed_transaction_changes_nothing(nft):
+    """Tests that the chain is unchanged when a rule is rejected"""
+    before = nft.get_chains()
+
+    with pytest.raises(NftError, match="syntax error"):
+        create_plugin().save_entries([
+            FirewallEntry("ipv6ddns-nas-tcp-80", "2001:db8::1", 80, Protocol.TCP),
+            FirewallEntry('bad"id', "2001:db8::1", 81, Protocol.TCP),
+        ])
+
+    assert nft.get_chains() == before
+
+
+def test_workflow_creates_chain(nft):
+    """Tests a workflow creating the chain, and a second run with nothing to
+    write
+    """
+    nft.set_chains({})
+    manager = plugin.PluginManager()
+    manager.discover()
+    manager.register(NftablesFirewallPlugin)
+    namespace = argparse.Namespace(
+        assume_yes=True, dry_run=False, force=False, dns="noop", domain=[],
+        firewall="nftables", tcp_port=[443], udp_port=[], host_id="nas", resolver="noop",
+        fw_nft="nft", fw_family="inet", fw_table="filter", fw_chain="ipv6ddns",
+    )
+    ctx = ArgparseContextParser(manager, namespace).parse()[0]
+    workflow = DDNSWorkflow(ctx)
+    workflow.ipv6.resolve = lambda: "2001:db8::1"
+
+    try:
+        assert workflow.run() == 0
+        assert workflow.run() == 0
+    finally:
+        workflow.close()
+
+    assert nft.get_chains() == {CHAIN: [rule("ipv6ddns-nas-tcp-443", "2001:db8::1", 443)]}
+    assert len(nft.calls("nft -f")) == 1
+
+
+def test_validate():
+    """Tests that host ids which cannot be written in a comment are rejected"""
+    context = types.SimpleNamespace(firewall=types.SimpleNamespace(host_id='a"b'))
+
+    errors = NftablesFirewallPlugin.validate(context)
+
+    assert len(errors) == 1
+    assert errors[0].plugin_name == "nftables"
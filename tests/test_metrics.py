@@ -0,0 +1,134 @@
+"""
+Tests for the Prometheus metrics
+"""
+import os
+import stat
+import urllib.error
+import urllib.request
+import pytest
+from ipv6ddns import events
+from ipv6ddns.cli import Cli
+from ipv6ddns.metrics import Counter, Histogram, MetricsListener, start_server, write_textfile
+from tests.plugins import create_workflow
+
+
+@pytest.fixture(name="listener")
+def fixture_listener():
+    """Metrics listener registered for the test"""
+    listener = MetricsListener()
+    events.add_listener(listener)
+    yield listener
+    events.remove_listener(listener)
+
+
+@pytest.fixture(name="context_args")
+def fixture_context_args():
+    """Contexts with a second domain"""
+    return ["--domain", "site.example.com"]
+
+
+@pytest.fixture(name="workflow")
+def fixture_workflow(context):
+    """Workflow with in-memory DNS and firewall plugins"""
+    context.ctx_id = "nas"
+    return create_workflow(context)
+
+
+def test_render_text_format():
+    """Tests the text format of counters and histograms"""
+    counter = Counter("test_total", "Test counter.", ("context",))
+    counter.inc(('say "hi"\n',), 2)
+    histogram = Histogram("test_seconds", "Test histogram.", buckets=(0.1, 1))
+    histogram.observe((), 0.05)
+    histogram.observe((), 0.5)
+    histogram.observe((), 5)
+
+    assert counter.render() == "# HELP test_total Test counter.\n# TYPE test_total counter\n"\
+        'test_total{context="say \\"hi\\"\\n"} 2\n'
+    assert histogram.render().splitlines()[2:] == [
+        'test_seconds_bucket{le="0.1"} 1',
+        'test_seconds_bucket{le="1"} 2',
+        'test_seconds_bucket{le="+Inf"} 3',
+        "test_seconds_sum 5.55",
+        "test_seconds_count 3",
+    ]
+
+
+def test_runs_update_metrics(workflow, listener):
+    """Tests the metrics of a run writing records and of a no-op run"""
+    assert workflow.run() == 0
+    assert workflow.run() == 0
+
+    text = listener.registry.render()
+    assert 'ipv6ddns_runs_total{context="nas",outcome="ok"} 2' in text
+    assert 'ipv6ddns_noop_runs_total{context="nas"} 1' in text
+    assert 'ipv6ddns_last_run_success{context="nas"} 1' in text
+    assert 'ipv6ddns_plugin_writes_total{context="nas",plugin="in-memory",'\
+        'call="dns.upsert_records"} 2' in text
+    assert 'ipv6ddns_plugin_writes_total{context="nas",plugin="in-memory",'\
+        'call="fw.apply_entries"} 1' in text
+    assert 'ipv6ddns_plugin_call_duration_seconds_count{context="nas",plugin="in-memory",'\
+        'call="dns.get_aaaa_records"} 2' in text
+    assert 'ipv6ddns_diff_size_bucket{context="nas",le="0"} 1' in text
+    assert 'ipv6ddns_diff_size_count{context="nas"} 2' in text
+
+
+def test_failures_are_counted(workflow, listener):
+    """Tests that failing plugin calls and runs are counted"""
+    workflow.ctx.common.sequential = True
+    workflow.resilience.policy.retries = 0
+
+    def fail():
+        raise ConnectionError("unreachable")
+    workflow.firewall.get_entries = fail
+
+    with pytest.raises(ConnectionError):
+        workflow.run()
+
+    text = listener.registry.render()
+    assert 'ipv6ddns_plugin_calls_total{context="nas",plugin="in-memory",'\
+        'call="fw.get_entries",outcome="error"} 1' in text
+    assert 'ipv6ddns_runs_total{context="nas",outcome="error"} 1' in text
+    assert 'ipv6ddns_last_run_success{context="nas"} 0' in text
+
+
+def test_write_textfile(workflow, listener, tmp_path):
+    """Tests that the metrics are written readable by the node exporter"""
+    workflow.run()
+    path = tmp_path / "ipv6ddns.prom"
+
+    write_textfile(listener.registry, str(path))
+
+    assert path.read_text() == listener.registry.render()
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+    assert os.listdir(tmp_path) == ["ipv6ddns.prom"]
+
+
+def test_server(workflow, listener):
+    """Tests that the metrics are served on /metrics only"""
+    workflow.run()
+    server = start_server(listener.registry, 0)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=5) as response:
+            assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+            assert response.read().decode() == listener.registry.render()
+        with pytest.raises(urllib.error.HTTPError) as err:
+            # pylint: disable=locally-disabled, consider-using-with
+            urllib.request.urlopen(f"{url}/", timeout=5)
+        assert err.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_cli_writes_textfile(tmp_path):
+    """Tests that a run from the command line writes the textfile"""
+    path = tmp_path / "ipv6ddns.prom"
+    cli = Cli(["--assume-yes", "--host-id", "nas", "--metrics-textfile", str(path)])
+
+    with pytest.raises(SystemExit):
+        cli.execute()
+
+    assert "ipv6ddns_runs_total" in path.read_text()
+    assert not events.start_run("nas")
@@ -0,0 +1,72 @@
+"""
+Tests for the on-disk plugin index
+"""
+import os
+import pytest
+from ipv6ddns import plugin
+from ipv6ddns.plugin import IndexedPluginLookup, PluginManager, PluginType
+from ipv6ddns.plugin_index import PluginIndex, default_index_path, distributions_key
+
+
+def failing_entry_points(group):
+    """entry_points replacement failing the test when called"""
+    pytest.fail(f"entry points of {group} were scanned")
+
+
+def test_index_is_used_on_next_run(monkeypatch):
+    """Tests that a second discovery reads the index instead of scanning"""
+    PluginManager().discover()
+    assert os.path.exists(default_index_path())
+
+    monkeypatch.setattr(plugin, "entry_points", failing_entry_points)
+    plugin_manager = PluginManager()
+    plugin_manager.discover()
+
+    assert "noop" in plugin_manager.get_plugin_names(PluginType.DNS)
+    assert "procfs" in plugin_manager.get_plugin_names(PluginType.IPV6)
+    assert plugin_manager.get_plugin(PluginType.IPV6, "procfs").get_name() == "procfs"
+
+
+def test_index_is_rebuilt_when_distributions_change(monkeypatch):
+    """Tests that a changed key triggers a full scan"""
+    PluginManager().discover()
+    monkeypatch.setattr(plugin, "distributions_key", lambda: "changed")
+    scanned = []
+    monkeypatch.setattr(plugin, "entry_points", lambda group: scanned.append(group) or [])
+
+    plugin_manager = PluginManager()
+    plugin_manager.discover()
+
+    assert scanned == list(IndexedPluginLookup.GROUPS)
+    assert not plugin_manager.get_plugin_names(PluginType.DNS)
+    assert PluginIndex().load("changed") == {group: [] for group in scanned}
+
+
+def test_distributions_key(tmp_path):
+    """Tests that the key changes when distributions are added or changed"""
+    paths = [str(tmp_path), str(tmp_path / "missing")]
+    (tmp_path / "module.py").write_text("", encoding="utf-8")
+    empty = distributions_key(paths)
+
+    dist = tmp_path / "sample-1.0.dist-info"
+    dist.mkdir()
+    added = distributions_key(paths)
+    assert added != empty
+
+    entry_points = dist / "entry_points.txt"
+    entry_points.write_text("[ipv6ddns.plugin.dns]\n", encoding="utf-8")
+    os.utime(entry_points, ns=(1, 1))
+    changed = distributions_key(paths)
+    assert changed != added
+
+    os.utime(entry_points, ns=(2, 2))
+    assert distributions_key(paths) != changed
+    assert distributions_key(paths) == distributions_key(paths)
+
+
+def test_corrupt_index(tmp_path):
+    """Tests that an unreadable index is ignored"""
+    path = tmp_path / "plugins.json"
+    path.write_text("{not json", encoding="utf-8")
+
+    assert PluginIndex(str(path)).load("key") is None
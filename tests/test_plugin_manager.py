@@ -1,6 +1,11 @@
 """
 Tests for PluginManager
 """
+import sys
+from importlib.metadata import EntryPoint
+import pytest
+from ipv6ddns import plugin
+from ipv6ddns.cli import Cli
 from ipv6ddns.plugin import (
     PluginManager,
     DNSPlugin,
@@ -10,19 +15,23 @@ from ipv6ddns.plugin import (
     FirewallPlugin,
     IPResolverPlugin,
 )
+from ipv6ddns.resolver.netlink import NetlinkResolverPlugin
+from ipv6ddns.resolver.procfs import ProcfsResolverPlugin
 
 
 def test_inbuilt_plugins_are_loaded_correctly():
     """test in-built plugins are loaded correctly"""
     plugin_manager = PluginManager()
     plugin_manager.discover()
-    assert len(plugin_manager.plugins) == 3
+    assert len(plugin_manager.plugins) == 5
     assert plugin_manager.firewall_plugins == {
         PluginManager.PLUGIN_NAME_NOOP: FirewallPlugin
     }
     assert plugin_manager.dns_plugins == {PluginManager.PLUGIN_NAME_NOOP: DNSPlugin}
     assert plugin_manager.ipv6_plugins == {
-        PluginManager.PLUGIN_NAME_NOOP: IPResolverPlugin
+        PluginManager.PLUGIN_NAME_NOOP: IPResolverPlugin,
+        NetlinkResolverPlugin.get_name(): NetlinkResolverPlugin,
+        ProcfsResolverPlugin.get_name(): ProcfsResolverPlugin,
     }
 
 
@@ -146,3 +155,100 @@ def test_static_plugin_lookup_returns_correct_plugins():
     assert plugin_lookup.lookup(PluginType.FIREWALL.value) == [PluginWithDuplicateName]
     assert plugin_lookup.lookup(PluginType.IPV6.value) == [IPResolverPluginWithName]
     assert not plugin_lookup.lookup(PluginType.UNKNOWN.value)
+
+
+LAZY_PLUGIN_MODULE = '''
+from ipv6ddns import plugin
+
+class LazyPlugin(plugin.{base}):
+    @staticmethod
+    def get_name():
+        return "{name}"
+'''
+
+
+@pytest.fixture(name="lazy_entry_points")
+def fixture_lazy_entry_points(tmp_path, monkeypatch):
+    """Entry points for plugins in modules that are not imported yet"""
+    groups = {}
+    for plugin_type, base in ((PluginType.DNS, "DNSPlugin"),
+                              (PluginType.FIREWALL, "FirewallPlugin"),
+                              (PluginType.IPV6, "IPResolverPlugin")):
+        for name in ("lazy-one", "lazy-two"):
+            module = f"lazy_{plugin_type.name.lower()}_{name[5:]}"
+            (tmp_path / f"{module}.py").write_text(
+                LAZY_PLUGIN_MODULE.format(base=base, name=name), encoding="utf-8"
+            )
+            groups.setdefault(plugin_type.value, []).append(
+                EntryPoint(name, f"{module}:LazyPlugin", plugin_type.value)
+            )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(plugin, "entry_points", lambda group: groups.get(group, []))
+    yield groups
+    for module in list(sys.modules):
+        if module.startswith("lazy_"):
+            del sys.modules[module]
+
+
+# pylint: disable=locally-disabled, unused-argument
+def test_discovery_does_not_import_plugins(lazy_entry_points):
+    """Tests that discovery only reads the plugin names"""
+    plugin_manager = PluginManager()
+    plugin_manager.discover()
+
+    assert list(plugin_manager.get_plugin_names(PluginType.DNS)) == ["lazy-one", "lazy-two"]
+    assert "lazy-two" in plugin_manager.firewall_plugins
+    assert not [module for module in sys.modules if module.startswith("lazy_")]
+
+    dns_plugin = plugin_manager.get_plugin(PluginType.DNS, "lazy-one")
+    assert dns_plugin.get_name() == "lazy-one"
+    assert [module for module in sys.modules if module.startswith("lazy_")] == ["lazy_dns_one"]
+
+
+# pylint: disable=locally-disabled, unused-argument
+def test_cli_imports_only_selected_plugins(lazy_entry_points):
+    """Tests that a run only imports the selected plugins"""
+    cli = Cli(["--dns", "lazy-two", "--firewall", "lazy-one", "--resolver", "lazy-two",
+               "--assume-yes"])
+    cli.get_contexts()
+
+    assert sorted(module for module in sys.modules if module.startswith("lazy_")) == [
+        "lazy_dns_two", "lazy_firewall_one", "lazy_ipv6_two",
+    ]
+
+
+# pylint: disable=locally-disabled, unused-argument
+def test_lazy_plugin_with_other_name_is_not_loaded(lazy_entry_points):
+    """Tests that a plugin whose name differs from its entry point is rejected"""
+    lazy_entry_points[PluginType.DNS.value].append(
+        EntryPoint("other", "lazy_dns_one:LazyPlugin", PluginType.DNS.value)
+    )
+    plugin_manager = PluginManager()
+    plugin_manager.discover()
+
+    with pytest.raises(KeyError):
+        plugin_manager.get_plugin(PluginType.DNS, "other")
+    assert "other" in plugin_manager.dns_plugins
+    assert len(plugin_manager.plugins) == 6
+
+
+# pylint: disable=locally-disabled, unused-argument
+def test_plugin_failing_to_import_is_reported(lazy_entry_points):
+    """Tests that a plugin which can not be imported fails its lookups with a
+    KeyError, stays registered, and is reported by the command line
+    """
+    lazy_entry_points[PluginType.DNS.value].append(
+        EntryPoint("broken", "lazy_missing:LazyPlugin", PluginType.DNS.value)
+    )
+    plugin_manager = PluginManager()
+    plugin_manager.discover()
+
+    for _ in range(2):
+        with pytest.raises(KeyError):
+            plugin_manager.get_plugin(PluginType.DNS, "broken")
+    assert plugin_manager.get_plugin_names(PluginType.DNS) == ["lazy-one", "lazy-two", "broken"]
+    assert len(plugin_manager.plugins) == 6
+
+    with pytest.raises(SystemExit) as sys_exit:
+        Cli(["--dns", "broken", "--assume-yes"]).parse_args()
+    assert sys_exit.value.code == 2
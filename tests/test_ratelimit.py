@@ -0,0 +1,117 @@
+"""
+Tests for the rate limits of the plugin calls
+"""
+import asyncio
+import time
+import pytest
+from ipv6ddns.aio import AsyncDDNSWorkflow
+from ipv6ddns.context import CommonContext, DNSContext
+from ipv6ddns.ratelimit import RateLimit, TokenBucket, get_bucket
+from ipv6ddns_dns_route53.route53 import Route53DNSPlugin
+from tests.clock import SimulatedClock
+from tests.plugins import InMemoryDNSPlugin, create_workflow
+
+
+LIMIT = RateLimit("in-memory:account", rate=1, burst=2)
+
+
+class ThrottledDNSPlugin(InMemoryDNSPlugin):
+    """In-memory DNS plugin declaring a rate limit"""
+
+    def get_rate_limit(self):
+        return LIMIT
+
+
+@pytest.fixture(name="context_args")
+def fixture_context_args():
+    """Contexts running their calls one at a time"""
+    return ["--sequential"]
+
+
+@pytest.fixture(name="context")
+def fixture_context(context):
+    """Context with the throttled DNS plugin"""
+    context.dns.plugin = ThrottledDNSPlugin
+    return context
+
+
+def test_burst_then_steady_rate():
+    """Tests that a full bucket allows a burst, then one call per 1/rate seconds"""
+    clock = SimulatedClock()
+    bucket = TokenBucket(rate=5, burst=5, clock=clock, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(10)]
+
+    assert waits[:5] == [0] * 5
+    assert waits[5:] == pytest.approx([0.2] * 5)
+    assert clock() - 1000 == pytest.approx(1.0)
+
+
+def test_refill_is_capped_to_burst():
+    """Tests that an idle bucket never holds more than its burst"""
+    clock = SimulatedClock()
+    bucket = TokenBucket(rate=1, burst=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        bucket.acquire()
+
+    clock.advance(100)
+
+    assert [bucket.reserve() for _ in range(4)] == pytest.approx([0, 0, 0, 1])
+
+
+def test_waiting_callers_are_served_in_order():
+    """Tests that reservations made while the bucket is empty are spaced in
+    arrival order, whichever context they come from
+    """
+    clock = SimulatedClock()
+    bucket = TokenBucket(rate=2, burst=1, clock=clock)
+
+    delays = [bucket.reserve() for _ in range(6)]
+
+    assert delays == pytest.approx([0, 0.5, 1, 1.5, 2, 2.5])
+    clock.advance(1)
+    assert bucket.reserve() == pytest.approx(2)
+
+
+def test_contexts_share_the_bucket_of_a_key(context):
+    """Tests that the runs of many contexts take their calls from one bucket"""
+    clock = SimulatedClock()
+    get_bucket(LIMIT, clock=clock, sleep=clock.sleep)
+
+    for _ in range(3):
+        assert create_workflow(context).run() == 0
+
+    # each run reads and writes the records: 6 calls, 2 of them in the burst
+    assert len(clock.sleeps) == 4
+    assert clock() - 1000 == pytest.approx(4)
+
+
+def test_async_workflow_is_rate_limited(context):
+    """Tests that the async workflow waits for the tokens without blocking"""
+    limit = RateLimit("in-memory:account", rate=50, burst=1)
+    get_bucket(limit)
+    workflow = create_workflow(context, AsyncDDNSWorkflow)
+
+    start = time.perf_counter()
+    assert asyncio.run(workflow.run_async()) == 0
+    assert time.perf_counter() - start >= 0.02
+
+
+def test_route53_limit_is_scoped_to_the_credentials():
+    """Tests the rate limit of the requests of the Route53 plugin, which is
+    enforced by its client rather than by the workflow
+    """
+    ctx = DNSContext()
+    ctx.access_key_id = "AKIDEXAMPLE"
+    ctx.endpoint = Route53DNSPlugin.DEFAULT_ENDPOINT
+    ctx.rate_limit = 5
+    ctx.rate_burst = 2
+
+    plugin = Route53DNSPlugin(CommonContext(), ctx)
+    assert plugin.get_rate_limit() is None
+    limit = plugin.get_request_limit()
+    assert limit.key == "route53:https://route53.amazonaws.com#AKIDEXAMPLE"
+    assert (limit.rate, limit.burst) == (5, 2)
+
+    ctx.rate_limit = 0
+    assert Route53DNSPlugin(CommonContext(), ctx).get_request_limit() is None
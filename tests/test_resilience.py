@@ -0,0 +1,191 @@
+"""
+Tests for the retries and circuit breakers of the plugin calls
+"""
+import asyncio
+import pytest
+from ipv6ddns.aio import AsyncDDNSWorkflow
+from ipv6ddns.domain import ValidationError
+from ipv6ddns.resilience import CircuitBreaker, CircuitOpenError, Resilience, RetryableError, \
+    RetryPolicy, get_breaker, is_retryable
+from ipv6ddns_dns_route53.client import Route53Error
+from ipv6ddns_firewall_asuswrt.session import SessionError
+from tests.clock import SimulatedClock
+from tests.plugins import InMemoryDNSPlugin, create_workflow
+
+
+@pytest.fixture(name="context_args")
+def fixture_context_args():
+    """Contexts retrying without delay"""
+    return ["--sequential", "--retry-delay", "0"]
+
+
+def failing(errors, result=None):
+    """Function raising the given errors one per call, then returning the result"""
+    calls = []
+
+    def call(*args):
+        calls.append(args)
+        if errors:
+            raise errors.pop(0)
+        return result
+    call.calls = calls
+    return call
+
+
+def test_is_retryable():
+    """Tests the classification of the errors"""
+    assert is_retryable(RetryableError("busy"))
+    assert is_retryable(TimeoutError())
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(Route53Error(503, "ServiceUnavailable", ""))
+    assert is_retryable(Route53Error(400, "Throttling", "Rate exceeded"))
+    assert is_retryable(SessionError("connection closed"))
+    assert not is_retryable(Route53Error(400, "InvalidChangeBatch", ""))
+    assert not is_retryable(SessionError("nvram failed", status=1))
+    assert not is_retryable(ValidationError("asuswrt", "bad host id"))
+    assert not is_retryable(CircuitOpenError("route53", 60))
+
+
+def test_backoff_is_exponential_with_full_jitter():
+    """Tests that the delays double up to the maximum and are randomized"""
+    assert [RetryPolicy(5, 1, 10, rand=lambda: 0.999).delay(n) for n in range(1, 6)] \
+        == pytest.approx([0.999, 1.998, 3.996, 7.992, 9.99])
+    assert RetryPolicy(rand=lambda: 0).delay(3) == 0
+
+
+def test_retries_transient_errors():
+    """Tests that transient errors are retried after the backoff, and fatal
+    errors and exhausted retries are raised
+    """
+    sleeps = []
+    layer = Resilience(RetryPolicy(2, 1, rand=lambda: 1), threshold=0, sleep=sleeps.append)
+    plugin = InMemoryDNSPlugin(None, None)
+
+    call = failing([TimeoutError(), ConnectionError()], "ok")
+    assert layer.call(plugin, "dns.get_aaaa_records", call) == "ok"
+    assert len(call.calls) == 3
+    assert sleeps == [1, 2]
+
+    call = failing([TimeoutError()] * 3)
+    with pytest.raises(TimeoutError):
+        layer.call(plugin, "dns.get_aaaa_records", call)
+    assert len(call.calls) == 3
+
+    call = failing([ValidationError("in-memory", "bad")])
+    with pytest.raises(ValidationError):
+        layer.call(plugin, "dns.get_aaaa_records", call)
+    assert len(call.calls) == 1
+
+
+def test_circuit_breaker_states():
+    """Tests that the circuit opens after the threshold, lets one trial call
+    through after the reset timeout, and closes when it succeeds
+    """
+    clock = SimulatedClock()
+    breaker = CircuitBreaker("route53", threshold=2, reset_timeout=60, clock=clock)
+
+    breaker.record_failure()
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.advance(60)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.advance(60)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_trial_without_outcome_is_tried_again():
+    """Tests that a trial call which never reports an outcome does not keep the
+    circuit half-open forever
+    """
+    clock = SimulatedClock()
+    breaker = CircuitBreaker("route53", threshold=1, reset_timeout=60, clock=clock)
+    breaker.record_failure()
+    clock.advance(60)
+    breaker.before_call()
+
+    clock.advance(59)
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.advance(1)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_cancelled_trial_reopens_the_circuit():
+    """Tests that a trial call cancelled by the timeout of the async workflow
+    opens the circuit again, and a new trial is let through after the reset
+    timeout
+    """
+    clock = SimulatedClock()
+    breaker = get_breaker("in-memory", 1, 60, clock=clock)
+    breaker.record_failure()
+    clock.advance(60)
+    layer = Resilience(RetryPolicy(0), threshold=1, reset_timeout=60)
+    plugin = InMemoryDNSPlugin(None, None)
+
+    async def hang():
+        await asyncio.sleep(30)
+
+    async def trial():
+        await asyncio.wait_for(layer.call_async(plugin, "dns.get_aaaa_records", hang), 0.01)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(trial())
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    clock.advance(60)
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_open_circuit_fails_other_contexts_fast(context):
+    """Tests that a dead endpoint fails the calls of every context at once
+    once its circuit is open
+    """
+    context.common.retries = 1
+    context.common.breaker_threshold = 2
+    first = create_workflow(context)
+    first.dns.get_aaaa_records = failing([TimeoutError()] * 2)
+    with pytest.raises(TimeoutError):
+        first.run()
+
+    second = create_workflow(context)
+    second.dns.get_aaaa_records = failing([])
+    with pytest.raises(CircuitOpenError):
+        second.run()
+    assert not second.dns.get_aaaa_records.calls
+
+
+def test_workflow_recovers_from_transient_errors(context):
+    """Tests that a run succeeds despite transient failures of reads and writes"""
+    workflow = create_workflow(context)
+    workflow.dns.get_aaaa_records = failing([RetryableError("busy")], [])
+    workflow.dns.upsert_records = failing([TimeoutError()])
+
+    assert workflow.run() == 0
+    assert len(workflow.dns.upsert_records.calls) == 2
+
+
+def test_async_workflow_retries(context):
+    """Tests that the async workflow retries the calls within its timeout"""
+    workflow = create_workflow(context, AsyncDDNSWorkflow)
+    workflow.firewall.get_entries = failing([ConnectionError(), ConnectionError()], [])
+
+    assert asyncio.run(workflow.run_async()) == 0
+    assert len(workflow.firewall.get_entries.calls) == 3
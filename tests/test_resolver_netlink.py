@@ -0,0 +1,136 @@
+"""
+Tests for the rtnetlink IPV6 resolver
+"""
+import socket
+import threading
+import pytest
+from ipv6ddns.context import CommonContext, ResolverContext
+from ipv6ddns.resolver import netlink
+from ipv6ddns.resolver.base import (
+    InterfaceAddress,
+    IFA_F_DEPRECATED,
+    IFA_F_PERMANENT,
+    IFA_F_TEMPORARY,
+    SCOPES,
+)
+from tests.plugins import FakeNetlinkSource
+
+
+def address(text, ifindex=2, scope="global", flags=0):
+    """Build an interface address"""
+    return InterfaceAddress(
+        ifindex, socket.inet_pton(socket.AF_INET6, text), 64, SCOPES[scope], flags
+    )
+
+
+class FakeNetlinkResolverPlugin(netlink.NetlinkResolverPlugin):
+    """Netlink resolver reading from a FakeNetlinkSource"""
+
+    POLL_TIMEOUT = 0.01
+
+    def __init__(self, common_ctx, plugin_ctx, source) -> None:
+        super().__init__(common_ctx, plugin_ctx)
+        self.source = source
+
+    def create_source(self):
+        return self.source
+
+
+@pytest.fixture(name="source")
+def fixture_source():
+    """Source with a link-local, a temporary, a deprecated and a stable address"""
+    yield FakeNetlinkSource([
+        address("fe80::1", scope="link", flags=IFA_F_PERMANENT),
+        address("2001:db8::aaaa", flags=IFA_F_TEMPORARY),
+        address("2001:db8::bbbb", flags=IFA_F_DEPRECATED),
+        address("2001:db8::1"),
+    ])
+
+
+def create_plugin(source, **options):
+    """Create the plugin with the given plugin options"""
+    ctx = ResolverContext()
+    ctx.plugin = FakeNetlinkResolverPlugin
+    for key, value in options.items():
+        setattr(ctx, key, value)
+    return FakeNetlinkResolverPlugin(CommonContext(), ctx, source)
+
+
+def test_messages_round_trip():
+    """Tests that a packed address message is parsed back to the same address"""
+    original = address("2001:db8::1", ifindex=7, flags=IFA_F_PERMANENT | 0x200)
+    data = netlink.pack_message(netlink.RTM_NEWADDR, 0, 1, netlink.pack_address(original))
+    data += netlink.pack_message(netlink.NLMSG_DONE, 0, 1, b"\0" * 4)
+
+    messages = list(netlink.parse_messages(data))
+    assert [msg_type for msg_type, _ in messages] == [netlink.RTM_NEWADDR, netlink.NLMSG_DONE]
+
+    parsed = netlink.parse_address(messages[0][1])
+    assert parsed.ifindex == 7
+    assert parsed.packed == original.packed
+    assert parsed.prefixlen == 64
+    assert parsed.flags == IFA_F_PERMANENT | 0x200
+    assert parsed.text == "2001:db8::1"
+
+
+def test_resolve_selects_stable_global_address(source):
+    """Tests that temporary, deprecated and link-local addresses are skipped"""
+    plugin = create_plugin(source)
+    assert plugin.resolve() == "2001:db8::1"
+    assert source.closed
+
+
+def test_resolve_filters(source):
+    """Tests the scope, temporary and interface filters"""
+    assert create_plugin(source, scope="link").resolve() == "fe80::1"
+    assert create_plugin(source, allow_temporary=True).resolve() == "2001:db8::1"
+    assert create_plugin(source, interface="3").resolve() == ""
+
+    source.addresses.append(address("2001:db8:3::1", ifindex=3))
+    assert create_plugin(source, interface="3").resolve() == "2001:db8:3::1"
+
+
+def test_permanent_address_is_preferred(source):
+    """Tests that a permanent address wins over a dynamic one"""
+    source.addresses.append(address("2001:db8::ffff", ifindex=9, flags=IFA_F_PERMANENT))
+    assert create_plugin(source).resolve() == "2001:db8::ffff"
+
+
+def test_subscribe_dumps_once_and_pushes_changes(source):
+    """Tests that notifications update the addresses and trigger the callback
+    only when the selected address changes
+    """
+    changed = threading.Event()
+    plugin = create_plugin(source)
+    assert plugin.subscribe(changed.set)
+    assert source.groups == netlink.RTMGRP_IPV6_IFADDR
+    assert plugin.resolve() == "2001:db8::1"
+
+    # a new temporary address does not change the selection
+    source.notify(netlink.RTM_NEWADDR, address("2001:db8::cccc", flags=IFA_F_TEMPORARY))
+    assert not changed.wait(0.2)
+
+    source.notify(netlink.RTM_DELADDR, address("2001:db8::1"))
+    source.notify(netlink.RTM_NEWADDR, address("2001:db8:1::1"))
+    assert changed.wait(5)
+    assert plugin.resolve() == "2001:db8:1::1"
+    assert source.dumps == 1
+
+    # once closed, every resolve dumps the addresses again
+    plugin.close()
+    assert plugin.resolve() == "2001:db8:1::1"
+    assert source.dumps == 2
+
+
+def test_validate():
+    """Tests validation of the scope"""
+    ctx = ResolverContext()
+    ctx.plugin = netlink.NetlinkResolverPlugin
+    ctx.scope = "universe"
+
+    # pylint: disable=too-few-public-methods
+    class Context:
+        """DDNS context with the resolver context only"""
+        ipv6 = ctx
+
+    assert len(netlink.NetlinkResolverPlugin.validate(Context)) >= 1
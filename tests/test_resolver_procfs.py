@@ -0,0 +1,82 @@
+"""
+Tests for the /proc/net/if_inet6 IPV6 resolver
+"""
+import pytest
+from ipv6ddns.context import CommonContext, ResolverContext
+from ipv6ddns.resolver import procfs
+from ipv6ddns.resolver.base import SCOPES
+
+
+IF_INET6 = b"""\
+00000000000000000000000000000001 01 80 10 80       lo
+fe800000000000000000000000000001 02 40 20 80     eth0
+20010db8000000000000000000000aaa 02 40 00 01     eth0
+20010db8000000000000000000000bbb 02 40 00 20     eth0
+20010db8000000000000000000000ccc 02 40 00 40     eth0
+20010db8000000000000000000000001 02 40 00 00     eth0
+20010db8000000010000000000000001 03 40 00 80    wlan0
+"""
+
+
+@pytest.fixture(name="if_inet6")
+def fixture_if_inet6(tmp_path, monkeypatch):
+    """Point the plugin at a copy of IF_INET6"""
+    path = tmp_path / "if_inet6"
+    path.write_bytes(IF_INET6)
+    monkeypatch.setattr(procfs.ProcfsResolverPlugin, "PROC_PATH", str(path))
+    yield path
+
+
+def create_plugin(**options):
+    """Create the plugin with the given plugin options"""
+    ctx = ResolverContext()
+    ctx.plugin = procfs.ProcfsResolverPlugin
+    for key, value in options.items():
+        setattr(ctx, key, value)
+    return procfs.ProcfsResolverPlugin(CommonContext(), ctx)
+
+
+def test_parse_if_inet6():
+    """Tests that each line is parsed to a packed address"""
+    addresses = procfs.parse_if_inet6(IF_INET6 + b"garbage\n")
+
+    assert len(addresses) == 7
+    assert addresses[1].packed == bytes.fromhex("fe800000000000000000000000000001")
+    assert addresses[1].ifindex == 2
+    assert addresses[1].ifname == "eth0"
+    assert addresses[1].prefixlen == 64
+    assert addresses[1].scope == SCOPES["link"]
+    assert addresses[0].scope == SCOPES["host"]
+    assert addresses[2].flags == 0x01
+
+
+# pylint: disable=locally-disabled, unused-argument
+def test_resolve_selects_address(if_inet6):
+    """Tests that the permanent global address is preferred, and the filters"""
+    assert create_plugin().resolve() == "2001:db8:0:1::1"
+    assert create_plugin(interface="eth0").resolve() == "2001:db8::1"
+    assert create_plugin(interface="eth0", allow_temporary=True).resolve() == "2001:db8::1"
+    assert create_plugin(interface="eth0", scope="link").resolve() == "fe80::1"
+    assert create_plugin(interface="eth1").resolve() == ""
+
+
+def test_selection_is_cached_until_file_changes(if_inet6, monkeypatch):
+    """Tests that the file is only parsed again when its contents change"""
+    calls = []
+    parse = procfs.parse_if_inet6
+
+    def counting_parse(data):
+        calls.append(data)
+        return parse(data)
+
+    monkeypatch.setattr(procfs, "parse_if_inet6", counting_parse)
+    plugin = create_plugin(interface="eth0")
+
+    assert plugin.resolve() == "2001:db8::1"
+    assert plugin.resolve() == "2001:db8::1"
+    assert len(calls) == 1
+
+    if_inet6.write_bytes(IF_INET6.replace(b"20010db8000000000000000000000001",
+                                          b"20010db8000000020000000000000001"))
+    assert plugin.resolve() == "2001:db8:0:2::1"
+    assert len(calls) == 2
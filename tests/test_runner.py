@@ -0,0 +1,139 @@
+"""
+Tests for running the workflow over many contexts
+"""
+import logging
+import threading
+import time
+import pytest
+from ipv6ddns.cli import Cli
+from ipv6ddns.runner import ContextRunner, EXIT_DEADLINE, EXIT_FAILED
+
+
+# pylint: disable=too-few-public-methods
+class FakeContext:
+    """Context with an id, how long the run takes and what it returns"""
+
+    def __init__(self, ctx_id, delay=0.0, result=0) -> None:
+        self.ctx_id = ctx_id
+        self.delay = delay
+        self.result = result
+
+
+# pylint: disable=too-few-public-methods
+class FakeWorkflow:
+    """Workflow which logs, sleeps and returns as told by the context"""
+
+    running = 0
+    max_running = 0
+    closed = []
+    lock = threading.Lock()
+
+    def __init__(self, ctx) -> None:
+        self.ctx = ctx
+
+    def run(self):
+        """Run the fake workflow"""
+        with FakeWorkflow.lock:
+            FakeWorkflow.running += 1
+            FakeWorkflow.max_running = max(FakeWorkflow.max_running, FakeWorkflow.running)
+        try:
+            logging.warning("%s start", self.ctx.ctx_id)
+            time.sleep(self.ctx.delay)
+            if isinstance(self.ctx.result, Exception):
+                raise self.ctx.result
+            logging.warning("%s end", self.ctx.ctx_id)
+            return self.ctx.result
+        finally:
+            with FakeWorkflow.lock:
+                FakeWorkflow.running -= 1
+
+    def close(self):
+        """Record that the workflow was closed"""
+        with FakeWorkflow.lock:
+            FakeWorkflow.closed.append(self.ctx.ctx_id)
+
+
+@pytest.fixture(autouse=True)
+def reset_counters():
+    """Reset the concurrency counters of the fake workflow"""
+    FakeWorkflow.running = 0
+    FakeWorkflow.max_running = 0
+    FakeWorkflow.closed = []
+
+
+def test_parallel_results_and_logs_are_in_context_order(caplog):
+    """Tests that return codes and log records keep the order of the contexts"""
+    contexts = [
+        FakeContext("a", delay=0.2),
+        FakeContext("b", delay=0.0, result=4),
+        FakeContext("c", delay=0.1),
+    ]
+    runner = ContextRunner(jobs=3, workflow=FakeWorkflow)
+
+    start = time.monotonic()
+    assert runner.run(contexts) == [0, 4, 0]
+    assert time.monotonic() - start < 0.3
+    assert [r.getMessage() for r in caplog.records] == [
+        "a start", "a end", "b start", "b end", "c start", "c end"
+    ]
+
+
+def test_pool_is_bounded():
+    """Tests that no more than `jobs` contexts run at the same time"""
+    contexts = [FakeContext(str(i), delay=0.05) for i in range(6)]
+    assert ContextRunner(jobs=2, workflow=FakeWorkflow).run(contexts) == [0] * 6
+    assert FakeWorkflow.max_running == 2
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_failure_does_not_stop_other_contexts(jobs, caplog):
+    """Tests that an exception fails only its own context, serial or not, and
+    every workflow is closed
+    """
+    contexts = [FakeContext("a", result=RuntimeError("boom")), FakeContext("b")]
+
+    assert ContextRunner(jobs=jobs, workflow=FakeWorkflow).run(contexts) == [EXIT_FAILED, 0]
+    assert "Run of a failed" in caplog.text
+    assert sorted(FakeWorkflow.closed) == ["a", "b"]
+
+
+def test_deadline(caplog):
+    """Tests that a context exceeding the deadline fails with EXIT_DEADLINE"""
+    contexts = [FakeContext("slow", delay=1.0), FakeContext("fast")]
+    runner = ContextRunner(jobs=2, deadline=0.1, workflow=FakeWorkflow)
+
+    start = time.monotonic()
+    assert runner.run(contexts) == [EXIT_DEADLINE, 0]
+    assert time.monotonic() - start < 0.5
+    assert "slow did not complete within 0.1s" in caplog.text
+
+
+def test_hung_context_does_not_stall_the_queue():
+    """Tests that the contexts queued behind a context passing its deadline
+    still run, on a worker replacing the hung one
+    """
+    contexts = [FakeContext("hung", delay=30), FakeContext("next"), FakeContext("last")]
+    runner = ContextRunner(jobs=1, deadline=0.5, workflow=FakeWorkflow)
+
+    start = time.monotonic()
+    assert runner.run(contexts) == [EXIT_DEADLINE, 0, 0]
+    assert time.monotonic() - start < 1.5
+
+
+def test_jobs_requires_assume_yes():
+    """Tests that parallel runs can not ask for confirmations"""
+    cli = Cli(cli_args=["--jobs", "4", "--domain", "example.com"])
+
+    with pytest.raises(SystemExit) as sys_exit:
+        cli.execute()
+    assert sys_exit.value.code == 3
+
+
+def test_cli_with_jobs():
+    """Tests that the cli runs with a worker pool"""
+    cli = Cli(cli_args=["--jobs", "4", "--deadline", "30", "--assume-yes",
+                        "--domain", "example.com"])
+
+    with pytest.raises(SystemExit) as sys_exit:
+        cli.execute()
+    assert sys_exit.value.code == 0
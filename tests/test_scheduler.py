@@ -0,0 +1,146 @@
+"""
+Tests for the daemon mode scheduler
+"""
+import threading
+import pytest
+from ipv6ddns.cli import Cli
+from ipv6ddns.scheduler import Job, Scheduler
+
+
+class FakeClock:
+    """Clock which only moves when asked to"""
+
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_jobs_run_in_order_of_due_time():
+    """Tests that jobs run when they are due, earliest first"""
+    clock = FakeClock()
+    scheduler = Scheduler(jitter=0, clock=clock)
+    calls = []
+    fast = Job("fast", lambda: calls.append("fast"), 10)
+    slow = Job("slow", lambda: calls.append("slow"), 30)
+    scheduler.add(slow, 5)
+    scheduler.add(fast)
+
+    assert scheduler.run_pending() == 5
+    assert calls == ["fast"]
+
+    clock.now = 10
+    assert scheduler.run_pending() == 10
+    assert calls == ["fast", "slow", "fast"]
+
+    clock.now = 20
+    scheduler.run_pending()
+    assert calls == ["fast", "slow", "fast", "fast"]
+
+
+def test_failures_back_off_exponentially():
+    """Tests that a failing job is retried with a doubling delay, up to max_backoff"""
+    clock = FakeClock()
+    scheduler = Scheduler(jitter=0, max_backoff=35, clock=clock)
+
+    def fail():
+        raise RuntimeError("boom")
+
+    job = Job("failing", fail, 10)
+    scheduler.add(job)
+
+    assert scheduler.run_pending() == 20
+    clock.now = 20
+    assert scheduler.run_pending() == 35
+    clock.now = 55
+    assert scheduler.run_pending() == 35
+    assert job.failures == 3
+
+    job.func = lambda: 0
+    clock.now = 90
+    assert scheduler.run_pending() == 10
+    assert job.failures == 0
+
+
+def test_non_zero_result_is_failure():
+    """Tests that a non-zero return value counts as failure"""
+    clock = FakeClock()
+    scheduler = Scheduler(jitter=0, clock=clock)
+    job = Job("aborted", lambda: 4, 10)
+    scheduler.add(job)
+
+    scheduler.run_pending()
+    assert job.failures == 1
+
+
+def test_jitter_is_added_to_the_delay():
+    """Tests that the jitter delays the next run by a fraction of the interval"""
+    scheduler = Scheduler(jitter=0.5, rand=lambda: 1.0)
+    assert scheduler.next_delay(Job("job", lambda: 0, 10)) == 15
+
+
+def test_trigger_runs_job_immediately():
+    """Tests that triggering a job moves it to the front of the queue"""
+    clock = FakeClock()
+    scheduler = Scheduler(jitter=0, clock=clock)
+    calls = []
+    job = Job("job", lambda: calls.append(clock.now), 60)
+    scheduler.add(job)
+    scheduler.run_pending()
+
+    clock.now = 5
+    scheduler.trigger(job)
+    assert scheduler.run_pending() == 60
+    assert calls == [0, 5]
+
+    clock.now = 65
+    scheduler.run_pending()
+    assert calls == [0, 5, 65]
+
+
+def test_run_sleeps_until_stopped():
+    """Tests that run() wakes up for triggers and returns after stop()"""
+    scheduler = Scheduler(jitter=0)
+    ran = threading.Event()
+    job = Job("job", ran.set, 3600)
+    scheduler.add(job, 3600)
+
+    thread = threading.Thread(target=scheduler.run)
+    thread.start()
+    scheduler.trigger(job)
+    assert ran.wait(5)
+    scheduler.stop()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert job.runs == 1
+
+
+def test_watch_requires_assume_yes():
+    """Tests that watch mode can not ask for confirmations"""
+    cli = Cli(cli_args=["watch", "--domain", "example.com"])
+
+    with pytest.raises(SystemExit) as sys_exit:
+        cli.execute()
+    assert sys_exit.value.code == 3
+
+
+def test_watch_runs_contexts(monkeypatch):
+    """Tests that watch mode schedules the workflow for each context"""
+    jobs = []
+
+    def run_once(scheduler):
+        jobs.extend(entry[2] for entry in scheduler._heap)  # pylint: disable=protected-access
+        scheduler.run_pending()
+
+    monkeypatch.setattr(Scheduler, "run", run_once)
+    cli = Cli(cli_args=["watch", "--assume-yes", "--interval", "30", "--domain", "example.com"])
+
+    with pytest.raises(SystemExit) as sys_exit:
+        cli.execute()
+    assert sys_exit.value.code == 0
+    assert len(jobs) == 1
+    assert jobs[0].interval == 30
+    assert jobs[0].runs == 1
+    assert jobs[0].failures == 0
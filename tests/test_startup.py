@@ -0,0 +1,87 @@
+"""
+Tests for the import time budget of the command line
+"""
+import subprocess
+import sys
+import pytest
+
+
+# runs need an address, which the noop resolver does not have. ipv6ddns.plugin is
+# imported by ipv6ddns.main already, so patching it does not change the timings.
+ENTRY = "import sys; from ipv6ddns.main import main;"\
+    " from ipv6ddns.plugin import IPResolverPlugin;"\
+    " IPResolverPlugin.resolve = lambda self: '2001:db8::1'; main(sys.argv[1:])"
+
+# watch mode with a resolver pushing one address change: the scheduler runs the
+# due jobs, the change triggers them again, and the runs of each job are printed
+WATCH_ENTRY = """
+import sys
+from ipv6ddns.main import main
+from ipv6ddns import plugin, scheduler
+callbacks = []
+plugin.IPResolverPlugin.resolve = lambda self: '2001:db8::1'
+plugin.IPResolverPlugin.subscribe = lambda self, callback: callbacks.append(callback) or True
+def run(self):
+    self.run_pending()
+    for callback in callbacks:
+        callback()
+    self.run_pending()
+    print(*[callback.args[0].runs for callback in callbacks])
+scheduler.Scheduler.run = run
+main(sys.argv[1:])
+"""
+
+# plugins of the index which are not used by the default contexts
+PLUGIN_MODULES = {"ipv6ddns.resolver.netlink", "ipv6ddns.resolver.procfs"}
+
+# modules that are only needed by some commands or when a cache is rebuilt
+HEAVY_MODULES = {"asyncio", "ssl", "inspect", "tempfile", "importlib.metadata", "tomllib",
+                 "socket"}
+
+# generous, the cold import takes about 45ms on a laptop
+IMPORT_BUDGET_US = 200_000
+
+
+def run_cli(*args, entry=ENTRY):
+    """Run the command line in a new interpreter and return its exit code and
+    output, and the modules imported along with their cumulative import time in
+    microseconds.
+    """
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", entry, *args],
+                          capture_output=True, text=True, check=False)
+    imports = {}
+    for line in proc.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            imports[name.strip()] = int(cumulative)
+    return proc.returncode, proc.stdout, imports
+
+
+# the host name is read with socket when no --host-id is given, and a run
+# needs socket to parse the resolved address, but nothing else
+@pytest.mark.parametrize("args, needed", [(["--help"], set()),
+                                          (["--dry-run", "--host-id", "host"], {"socket"})])
+def test_startup_does_not_import_heavy_modules(args, needed):
+    """Tests that the command line stays off the slow imports once the
+    plugin index is built
+    """
+    run_cli(*args)
+    returncode, _, imports = run_cli(*args)
+
+    assert returncode == 0
+    assert not (HEAVY_MODULES - needed) & set(imports)
+    assert imports["ipv6ddns.main"] < IMPORT_BUDGET_US
+
+
+def test_watch_trigger_does_not_import_unused_plugins():
+    """Tests that the runs of watch mode, including the runs triggered by an
+    address change, only import the plugins of the contexts from the index
+    """
+    args = ["watch", "--assume-yes", "--host-id", "host"]
+    run_cli(*args, entry=WATCH_ENTRY)
+    returncode, stdout, imports = run_cli(*args, entry=WATCH_ENTRY)
+
+    assert returncode == 0
+    assert stdout.split() == ["2"]
+    assert not PLUGIN_MODULES & set(imports)
+    assert not (HEAVY_MODULES - {"socket"}) & set(imports)
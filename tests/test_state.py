@@ -0,0 +1,92 @@
+"""
+Tests for the last applied state and the no-op fast path of the workflow
+"""
+import pytest
+from ipv6ddns.state import StateStore, fingerprint
+from tests import plugins
+
+
+@pytest.fixture(name="context_factory")
+def fixture_context_factory(context_factory, tmp_path):
+    """Return a function creating contexts which record their state in a temp dir"""
+    state_file = str(tmp_path / "state.json")
+    return lambda *args: context_factory("--state-file", state_file, *args)
+
+
+def create_workflow(ctx, ip_addr, calls):
+    """Create a workflow resolving ip_addr and counting the remote calls"""
+    workflow = plugins.create_workflow(ctx, ip_addr=ip_addr)
+    workflow.dns.get_aaaa_records = lambda: calls.append("get_aaaa_records") or []
+    workflow.firewall.get_entries = lambda: calls.append("get_entries") or []
+    workflow.dns.upsert_records = lambda records: calls.append("upsert_records")
+    return workflow
+
+
+def test_fingerprint(context_factory):
+    """Test that the fingerprint covers the ip address and the configuration"""
+    ctx = context_factory()
+    digest = fingerprint(ctx, "2001:db8::1")
+
+    assert fingerprint(context_factory(), "2001:db8::1") == digest
+    assert fingerprint(ctx, "2001:db8::2") != digest
+    assert fingerprint(context_factory("--udp-port", "53"), "2001:db8::1") != digest
+    assert fingerprint(context_factory("--domain", "www.example.com"), "2001:db8::1") != digest
+
+
+def test_state_store_max_age(tmp_path):
+    """Test that recorded state is trusted up to its maximum age"""
+    now = [1000.0]
+    store = StateStore(str(tmp_path / "state" / "state.json"), clock=lambda: now[0])
+    store.save("nas", "abc")
+
+    assert store.is_current("nas", "abc", 60)
+    assert not store.is_current("nas", "def", 60)
+    assert not store.is_current("web", "abc", 60)
+    assert not store.is_current("nas", "abc", 0)
+    now[0] += 61
+    assert not store.is_current("nas", "abc", 60)
+
+
+def test_unchanged_run_skips_remote_calls(context_factory):
+    """Test that a run with the same ip and configuration only resolves"""
+    calls = []
+    assert create_workflow(context_factory(), "2001:db8::1", calls).run() == 0
+    assert calls == ["get_aaaa_records", "get_entries", "upsert_records"]
+
+    calls.clear()
+    assert create_workflow(context_factory(), "2001:db8::1", calls).run() == 0
+    assert not calls
+
+
+def test_changed_ip_runs(context_factory):
+    """Test that a new ip address reads and writes the remote state"""
+    calls = []
+    create_workflow(context_factory(), "2001:db8::1", calls).run()
+
+    calls.clear()
+    create_workflow(context_factory(), "2001:db8::2", calls).run()
+    assert "upsert_records" in calls
+
+
+def test_max_age_and_force_verify(context_factory):
+    """Test that an expired state and --force read the remote state again"""
+    calls = []
+    create_workflow(context_factory(), "2001:db8::1", calls).run()
+
+    calls.clear()
+    create_workflow(context_factory("--state-max-age", "0"), "2001:db8::1", calls).run()
+    assert "get_aaaa_records" in calls
+
+    calls.clear()
+    create_workflow(context_factory("--force"), "2001:db8::1", calls).run()
+    assert "get_aaaa_records" in calls
+
+
+def test_dry_run_does_not_record_state(context_factory):
+    """Test that a dry run leaves the state untouched"""
+    calls = []
+    create_workflow(context_factory("--dry-run"), "2001:db8::1", calls).run()
+
+    calls.clear()
+    create_workflow(context_factory(), "2001:db8::1", calls).run()
+    assert "get_aaaa_records" in calls
@@ -0,0 +1,51 @@
+"""
+Tests for running plugin calls concurrently
+"""
+import threading
+import time
+import pytest
+from ipv6ddns.tasks import Task, gather
+
+
+def test_gather_returns_results_in_order():
+    """Tests that results are returned in the order of the calls"""
+    results = gather([
+        ("slow", lambda: time.sleep(0.1) or "slow"),
+        ("fast", lambda: "fast"),
+    ])
+    assert results == ["slow", "fast"]
+
+
+def test_gather_runs_calls_concurrently():
+    """Tests that the calls overlap instead of running one after another"""
+    barrier = threading.Barrier(3, timeout=5)
+    results = gather([(str(i), barrier.wait) for i in range(3)], timeout=5)
+    assert sorted(results) == [0, 1, 2]
+
+
+def test_gather_raises_first_error_without_waiting():
+    """Tests that an error is raised without waiting for slow calls"""
+    def fail():
+        raise ValueError("boom")
+
+    blocked = threading.Event()
+    start = time.monotonic()
+    with pytest.raises(ValueError, match="boom"):
+        gather([("blocked", blocked.wait), ("fail", fail)], timeout=5)
+    assert time.monotonic() - start < 5
+    blocked.set()
+
+
+def test_gather_timeout():
+    """Tests that a call exceeding the timeout raises TimeoutError naming the call"""
+    blocked = threading.Event()
+    with pytest.raises(TimeoutError, match="blocked"):
+        gather([("blocked", blocked.wait), ("fast", lambda: 1)], timeout=0.1)
+    blocked.set()
+
+
+def test_task_wait():
+    """Tests waiting on a single task"""
+    task = Task("answer", lambda: 42).start()
+    assert task.wait(5) == 42
+    assert task.completed